@@ -1,133 +1,166 @@
 import os
-from flask import Flask, jsonify, request, render_template
+import click
+from flask import Flask, request
 from database import db, init_db, seed_data
-from services.categories import CategoryService
-from services.attributes import AttributeService
-from services.products import ProductService
+from services.stats import init_stats_cache
+from schema_registry import init_schema_registry
+from serializers import init_json_provider
+from http_cache import init_http_cache
+from instrumentation import init_instrumentation
+from config import env_flag, env_float, env_int, init_engines, load_database_config
+from jobs import init_jobs, get_jobs
+from concurrency import init_concurrency
+from idempotency import init_idempotency
+from routes import register_blueprints
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Formats of import-products and export-products, as in services.imports; the services
+# themselves are imported by the commands, which keeps them out of `import app`
+FILE_FORMATS = ('ndjson', 'csv')
+
+def _use_replica_for_reads():
+    # Every read of a GET request (cache versions, ETag, query) comes from the replica
+    if request.method in ('GET', 'HEAD'):
+        db.session.info['replica'] = True
+
 def create_app():
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    load_database_config(app.config)
+    app.config['USE_ORJSON'] = env_flag('USE_ORJSON')
+    app.config['PRODUCT_DOCUMENTS'] = env_flag('PRODUCT_DOCUMENTS')
+    app.config['RESPONSE_CACHE_SIZE'] = env_int('RESPONSE_CACHE_SIZE', 0)
+    app.config['RESPONSE_CACHE_TTL'] = env_float('RESPONSE_CACHE_TTL', 30)
+    app.config['INSTRUMENTATION_ENABLED'] = env_flag('INSTRUMENTATION_ENABLED', True)
+    app.config['N_PLUS_ONE_THRESHOLD'] = env_int('N_PLUS_ONE_THRESHOLD', 10)
+    app.config['SLOW_REQUEST_MS'] = env_float('SLOW_REQUEST_MS', 500)
+    app.config['PROFILING_ENABLED'] = env_flag('PROFILING_ENABLED')
+    app.config['SCHEMA_CACHE_SHARED'] = env_flag('SCHEMA_CACHE_SHARED', True)
+    app.config['SCHEMA_CACHE_CHECK_INTERVAL'] = env_float('SCHEMA_CACHE_CHECK_INTERVAL', 1.0)
+    # Categories whose stats and facets are kept in memory per process
+    app.config['STATS_CACHE_SIZE'] = env_int('STATS_CACHE_SIZE', 256)
+    # Worker threads per process; 0 leaves the jobs to `flask run-jobs`
+    app.config['JOB_WORKERS'] = env_int('JOB_WORKERS', 2)
+    app.config['JOB_POLL_INTERVAL'] = env_float('JOB_POLL_INTERVAL', 1.0)
+    app.config['JOB_STALE_SECONDS'] = env_int('JOB_STALE_SECONDS', 600)
+    app.config['JOB_RETENTION_HOURS'] = env_int('JOB_RETENTION_HOURS', 168)
+    # Change feed (GET /api/changes): long-poll/stream polling and flask compact-changes defaults
+    app.config['CHANGES_POLL_INTERVAL'] = env_float('CHANGES_POLL_INTERVAL', 0.5)
+    app.config['CHANGES_STREAM_SECONDS'] = env_int('CHANGES_STREAM_SECONDS', 300)
+    app.config['CHANGES_KEEPALIVE_SECONDS'] = env_int('CHANGES_KEEPALIVE_SECONDS', 15)
+    app.config['CHANGE_LOG_COMPACT_HOURS'] = env_int('CHANGE_LOG_COMPACT_HOURS', 24)
+    app.config['CHANGE_LOG_RETENTION_HOURS'] = env_int('CHANGE_LOG_RETENTION_HOURS', 720)
+    # auto (FTS5 on SQLite, FULLTEXT on MySQL, term table elsewhere), terms or off
+    app.config['SEARCH_INDEX'] = os.environ.get('SEARCH_INDEX', 'auto').lower()
+    # Reject writes to versioned resources that do not send If-Match (428)
+    app.config['REQUIRE_IF_MATCH'] = env_flag('REQUIRE_IF_MATCH')
+    app.config['IDEMPOTENCY_TTL'] = env_int('IDEMPOTENCY_TTL', 86400)
+    # After this long a key still pending (its request died) can be claimed again
+    app.config['IDEMPOTENCY_PENDING_TIMEOUT'] = env_int('IDEMPOTENCY_PENDING_TIMEOUT', 300)
+    # ASGI mode (asgi.py): threads per process for the requests passed on to the Flask app.
+    # Each open change stream or long-poll holds one
+    app.config['ASGI_WSGI_THREADS'] = env_int('ASGI_WSGI_THREADS', 32)
+    # Run warm_up() before serving: pool connections, schema cache, compiled read statements
+    app.config['WARMUP'] = env_flag('WARMUP')
 
     db.init_app(app)
+    init_engines(app, db)
+    if app.config['DATABASE_REPLICA_URL']:
+        app.before_request(_use_replica_for_reads)
+    init_json_provider(app)
+    init_schema_registry(app)
+    init_http_cache(app)
+    init_stats_cache(app)
+    init_jobs(app)
+    init_concurrency(app)
+    init_idempotency(app)
+    if app.config['INSTRUMENTATION_ENABLED']:
+        init_instrumentation(app)
 
     @app.cli.command('db-init')
     def db_init():
+        from services.search_index import SearchIndexService
         with app.app_context():
             init_db()
             seed_data()
+            SearchIndexService.rebuild()
             print('Database initialized and seeded.')
 
-    # -----------------------------
-    # Health check
-    # -----------------------------
-    @app.get('/')
-    def root():
-        return jsonify({'status': 'ok'})
-
-    # -----------------------------
-    # UI Routes
-    # -----------------------------
-    @app.get('/categories')
-    def categories_ui():
-        return render_template('categories.html')
-
-    @app.get('/attributes')
-    def attributes_ui():
-        return render_template('attributes.html')
-
-    @app.get('/products')
-    def products_ui():
-        return render_template('products.html')
-
-    # -----------------------------
-    # Categories API
-    # -----------------------------
-    @app.post('/api/categories')
-    def create_category():
-        data = request.get_json(force=True)
-        cat = CategoryService.create(data)
-        return jsonify(cat), 201
-
-    @app.get('/api/categories')
-    def list_categories():
-        return jsonify(CategoryService.list())
-
-    @app.get('/api/categories/<int:cid>')
-    def get_category(cid):
-        return jsonify(CategoryService.get(cid))
-
-    @app.put('/api/categories/<int:cid>')
-    def update_category(cid):
-        data = request.get_json(force=True)
-        return jsonify(CategoryService.update(cid, data))
-
-    @app.delete('/api/categories/<int:cid>')
-    def delete_category(cid):
-        CategoryService.delete(cid)
-        return '', 204
-
-    # -----------------------------
-    # Attributes API
-    # -----------------------------
-    @app.post('/api/categories/<int:cid>/attributes')
-    def create_attribute(cid):
-        data = request.get_json(force=True)
-        return jsonify(AttributeService.create(cid, data)), 201
-
-    @app.get('/api/categories/<int:cid>/attributes')
-    def list_attributes(cid):
-        return jsonify(AttributeService.list(cid))
-
-    @app.put('/api/categories/<int:cid>/attributes/<int:aid>')
-    def update_attribute(cid, aid):
-        data = request.get_json(force=True)
-        return jsonify(AttributeService.update(cid, aid, data))
-
-    @app.delete('/api/categories/<int:cid>/attributes/<int:aid>')
-    def delete_attribute(cid, aid):
-        AttributeService.delete(cid, aid)
-        return '', 204
-
-    # -----------------------------
-    # Products API
-    # -----------------------------
-    @app.post('/api/products')
-    def create_product():
-        data = request.get_json(force=True)
-        return jsonify(ProductService.create(data)), 201
-
-    @app.get('/api/products')
-    def list_products():
-        return jsonify(ProductService.list())
-
-    @app.get('/api/products/<int:pid>')
-    def get_product(pid):
-        return jsonify(ProductService.get(pid))
-
-    @app.put('/api/products/<int:pid>')
-    def update_product(pid):
-        data = request.get_json(force=True)
-        return jsonify(ProductService.update(pid, data))
-
-    @app.post('/api/products/<int:pid>/attributes')
-    def set_product_attributes(pid):
-        data = request.get_json(force=True)
-        return jsonify(ProductService.set_attributes(pid, data.get('attributes', {})))
-
-    @app.delete('/api/products/<int:pid>')
-    def delete_product(pid):
-        ProductService.delete(pid)
-        return '', 204
-
+    @app.cli.command('import-products')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'fmt', type=click.Choice(FILE_FORMATS), default=None,
+                  help='Input format; guessed from the file extension when omitted.')
+    @click.option('--chunk-size', type=int, default=None,
+                  help='Rows validated and committed per transaction; 500 when omitted.')
+    def import_products(source, fmt, chunk_size):
+        from services.imports import ImportService, DEFAULT_CHUNK_SIZE
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        fmt = fmt or ('csv' if source.name.lower().endswith('.csv') else 'ndjson')
+        report = ImportService.run(source, fmt, chunk_size)
+        print(f"Processed {report['processed']}, imported {report['imported']}, failed {report['failed']}.")
+        for err in report['errors']:
+            print(f"  row {err['row']} ({err['sku']}): {err['error']}")
+
+    @app.cli.command('rebuild-documents')
+    @click.option('--chunk-size', default=500, show_default=True)
+    def rebuild_documents(chunk_size):
+        from services.documents import DocumentService
+        total = DocumentService.rebuild(chunk_size)
+        print(f'Rebuilt {total} product documents.')
+
+    @app.cli.command('rebuild-search-index')
+    @click.option('--chunk-size', default=500, show_default=True)
+    def rebuild_search_index(chunk_size):
+        from services.search_index import SearchIndexService
+        backend = SearchIndexService.backend()
+        if backend is None:
+            print('Full-text search is disabled (SEARCH_INDEX=off).')
+            return
+        total = SearchIndexService.rebuild(chunk_size)
+        print(f'Indexed {total} products ({backend}).')
+
+    @app.cli.command('run-jobs')
+    @click.option('--workers', default=2, show_default=True)
+    def run_jobs(workers):
+        # Dedicated job process; web processes can then run with JOB_WORKERS=0
+        runner = get_jobs()
+        runner.workers = workers
+        print(f'Running jobs with {workers} workers. Press Ctrl+C to stop.')
+        runner.run_forever()
+
+    @app.cli.command('compact-changes')
+    @click.option('--compact-hours', type=int, default=None,
+                  help='Drop superseded entries older than this. Defaults to CHANGE_LOG_COMPACT_HOURS.')
+    @click.option('--retention-hours', type=int, default=None,
+                  help='Drop all entries older than this. Defaults to CHANGE_LOG_RETENTION_HOURS.')
+    def compact_changes(compact_hours, retention_hours):
+        from datetime import timedelta
+        from services.changes import ChangeService
+        result = ChangeService.compact(
+            timedelta(hours=compact_hours if compact_hours is not None else app.config['CHANGE_LOG_COMPACT_HOURS']),
+            timedelta(hours=retention_hours if retention_hours is not None else app.config['CHANGE_LOG_RETENTION_HOURS'])
+        )
+        print(f"Removed {result['superseded']} superseded and {result['expired']} expired change log entries.")
+
+    @app.cli.command('export-products')
+    @click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+    @click.option('--format', 'fmt', type=click.Choice(FILE_FORMATS), default='ndjson', show_default=True)
+    @click.option('--category-id', type=int, default=None, help='Only export this category.')
+    def export_products(target, fmt, category_id):
+        from services.exports import ExportService
+        db.session.info['replica'] = True
+        for chunk in ExportService.stream(fmt, category_id):
+            target.write(chunk)
+
+    register_blueprints(app)
+    if app.config['WARMUP']:
+        from warmup import warm_up
+        warm_up(app)
     return app
 
 
-app = create_app()
-
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,156 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qsl
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import http_date, parse_date, parse_etags
+from werkzeug.routing import Map, Rule
+from app import create_app
+from async_database import create_read_engine, create_sessionmaker
+from http_cache import is_not_modified, validators_for
+from services.async_catalog import AsyncCatalogService
+from services.search_index import SearchIndexService
+
+# Catalog reads served on the event loop. Everything else, writes included, is passed to
+# the Flask app. Paths and response bodies match the routes of the same name in routes/
+ROUTES = Map([
+    Rule('/api/categories', endpoint='list_categories'),
+    Rule('/api/categories/<int:cid>', endpoint='get_category'),
+    Rule('/api/categories/<int:cid>/attributes', endpoint='list_attributes'),
+    Rule('/api/products', endpoint='list_products'),
+    Rule('/api/products/search', endpoint='search_products'),
+    Rule('/api/products/<int:pid>', endpoint='get_product'),
+])
+# Change counters behind each route's ETag, as in the @conditional_get decorators
+ETAG_TABLES = {
+    'list_categories': ('categories',),
+    'get_category': ('categories',),
+    'list_attributes': ('categories', 'attribute_definitions'),
+    'list_products': ('products', 'attribute_definitions'),
+    'search_products': ('products', 'attribute_definitions'),
+    'get_product': ('products', 'attribute_definitions'),
+}
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    # asgiref runs every WSGI request on one shared thread (sync_to_async with
+    # thread_sensitive=True), so a single change stream, long-poll or export would hold up
+    # all other Flask requests. Here each request gets a thread of its own from a pool
+    def __init__(self, wsgi_application, threads):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        # The undecorated method of the base class, run in the pool instead of the shared thread
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+        self._run = sync_to_async(partial(run, self), thread_sensitive=False, executor=executor)
+
+    async def run_wsgi_app(self, body):
+        await self._run(body)
+
+class CatalogASGI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = PooledWsgiToAsgi(flask_app, flask_app.config['ASGI_WSGI_THREADS'])
+        self.routes = ROUTES.bind('localhost')
+        self.engine = create_read_engine(flask_app.config)
+        self.sessions = create_sessionmaker(self.engine)
+        self.documents = flask_app.config['PRODUCT_DOCUMENTS']
+        self.search_backend = None
+        self._search_resolved = False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            try:
+                endpoint, values = self.routes.match(scope['path'], method='GET')
+            except HTTPException:
+                endpoint = None
+            if endpoint is not None:
+                await self._serve(scope, send, endpoint, values)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def _serve(self, scope, send, endpoint, values):
+        request_headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+        args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        try:
+            async with self.sessions() as session:
+                etag, last_modified = validators_for(await AsyncCatalogService.versions(session, ETAG_TABLES[endpoint]))
+                headers = [('ETag', f'W/"{etag}"'), ('Cache-Control', 'no-cache')]
+                if last_modified is not None:
+                    headers.append(('Last-Modified', http_date(last_modified)))
+                if is_not_modified(etag, last_modified, parse_etags(request_headers.get('If-None-Match')),
+                                   parse_date(request_headers.get('If-Modified-Since'))):
+                    await self._respond(scope, send, 304, headers, b'')
+                    return
+                body = await getattr(self, '_' + endpoint)(session, args, **values)
+        except HTTPException as e:
+            await self._respond(scope, send, e.code, e.get_headers(), e.get_body().encode())
+            return
+        await self._respond(scope, send, 200, headers + [('Content-Type', 'application/json')], body)
+
+    async def _list_categories(self, session, args):
+        return self._json(await AsyncCatalogService.list_categories(session, args))
+
+    async def _get_category(self, session, args, cid):
+        return self._json(await AsyncCatalogService.get_category(session, cid))
+
+    async def _list_attributes(self, session, args, cid):
+        return self._json(await AsyncCatalogService.list_attributes(session, cid))
+
+    async def _list_products(self, session, args):
+        return self._json(await AsyncCatalogService.list_products(session, args, self.documents))
+
+    async def _search_products(self, session, args):
+        if not self._search_resolved:
+            configured = self.flask_app.config['SEARCH_INDEX']
+            self.search_backend = await session.run_sync(
+                lambda sync_session: SearchIndexService.resolve_backend(configured, sync_session.connection())
+            )
+            self._search_resolved = True
+        return self._json(await AsyncCatalogService.search_products(session, args, self.search_backend, self.documents))
+
+    async def _get_product(self, session, args, pid):
+        if self.documents:
+            # Stored body, returned as is
+            body = await AsyncCatalogService.get_product_document(session, pid)
+            if body is not None:
+                return body.encode()
+        return self._json(await AsyncCatalogService.get_product(session, pid))
+
+    def _json(self, obj):
+        # Same encoder and trailing newline as jsonify
+        return (self.flask_app.json.dumps(obj) + '\n').encode()
+
+    async def _respond(self, scope, send, status, headers, body):
+        headers = list(headers) + [('Content-Length', str(len(body)))]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        })
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.wsgi.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+def create_asgi_app():
+    # uvicorn --factory asgi:create_asgi_app
+    return CatalogASGI(create_app())
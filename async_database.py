@@ -0,0 +1,23 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from config import configure_engine, engine_options
+
+# asyncio driver used in ASGI mode for each database backend
+ASYNC_DRIVERS = {'mysql': 'aiomysql', 'sqlite': 'aiosqlite'}
+
+def async_url(url):
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'ASGI mode supports {sorted(ASYNC_DRIVERS)} databases, not {backend}')
+    return parsed.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+def create_read_engine(config):
+    # The async path only reads, so it uses the replica when one is configured
+    url = config['DATABASE_REPLICA_URL'] or config['SQLALCHEMY_DATABASE_URI']
+    engine = create_async_engine(async_url(url), **engine_options(url, config))
+    configure_engine(engine.sync_engine, config)
+    return engine
+
+def create_sessionmaker(engine):
+    return async_sessionmaker(engine, expire_on_commit=False)
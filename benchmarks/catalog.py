@@ -0,0 +1,94 @@
+"""Synthetic catalog generator used by the benchmark scenarios."""
+import json
+import random
+from datetime import date, datetime, timedelta
+from database import db, bump_version
+from models import AttributeDefinition, Category, Product, ProductAttributeValue
+from services.search_index import SearchIndexService
+
+DATA_TYPES = ('int', 'decimal', 'string', 'enum', 'bool', 'date')
+ENUM_OPTIONS = ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo', 'Foxtrot']
+WORDS = ['red', 'blue', 'steel', 'carbon', 'classic', 'sport', 'ultra', 'mini', 'pro', 'lite']
+INSERT_BATCH = 5000
+
+class CatalogSpec:
+    def __init__(self, categories=10, attributes_per_category=8, products=10000, seed=42):
+        self.categories = categories
+        self.attributes_per_category = attributes_per_category
+        self.products = products
+        self.seed = seed
+
+    def to_dict(self):
+        return {
+            'categories': self.categories,
+            'attributes_per_category': self.attributes_per_category,
+            'products': self.products,
+            'seed': self.seed
+        }
+
+def random_value(rng, data_type):
+    if data_type == 'int':
+        return rng.randint(1, 64)
+    if data_type == 'decimal':
+        return round(rng.uniform(1, 1000), 2)
+    if data_type == 'string':
+        return f'{rng.choice(WORDS)} {rng.choice(WORDS)}'
+    if data_type == 'enum':
+        return rng.choice(ENUM_OPTIONS)
+    if data_type == 'bool':
+        return rng.random() < 0.5
+    return (date(2020, 1, 1) + timedelta(days=rng.randint(0, 2000))).isoformat()
+
+def generate_catalog(spec):
+    # Loads the catalog with executemany Core inserts; call inside an app context on an empty database
+    rng = random.Random(spec.seed)
+    now = datetime.utcnow()
+    db.session.execute(db.insert(Category), [
+        {'id': c, 'name': f'Category {c}', 'description': 'benchmark', 'created_at': now, 'updated_at': now}
+        for c in range(1, spec.categories + 1)
+    ])
+    attr_rows = []
+    for c in range(1, spec.categories + 1):
+        for a in range(spec.attributes_per_category):
+            data_type = DATA_TYPES[a % len(DATA_TYPES)]
+            attr_rows.append({
+                'id': len(attr_rows) + 1, 'category_id': c, 'name': f'{data_type}_{a}', 'data_type': data_type,
+                'is_required': False, 'is_unique': False, 'unit': None,
+                'options_json': json.dumps(ENUM_OPTIONS) if data_type == 'enum' else None,
+                'created_at': now, 'updated_at': now
+            })
+    db.session.execute(db.insert(AttributeDefinition), attr_rows)
+    attrs_by_category = {}
+    for row in attr_rows:
+        attrs_by_category.setdefault(row['category_id'], []).append(row)
+
+    products, values, product_categories = [], [], []
+    for pid in range(1, spec.products + 1):
+        category_id = rng.randint(1, spec.categories)
+        product_categories.append(category_id)
+        created = now - timedelta(seconds=spec.products - pid)
+        products.append({
+            'id': pid, 'category_id': category_id, 'name': f'{rng.choice(WORDS).title()} product {pid}',
+            'sku': f'BENCH-{pid:08d}', 'description': ' '.join(rng.choice(WORDS) for _ in range(8)),
+            'price': round(rng.uniform(5, 2000), 2), 'currency': 'USD', 'created_at': created, 'updated_at': created
+        })
+        for attr in attrs_by_category[category_id]:
+            row = ProductAttributeValue.typed_columns(attr['data_type'], random_value(rng, attr['data_type']))
+            row.update(product_id=pid, attribute_definition_id=attr['id'], created_at=created, updated_at=created)
+            values.append(row)
+        if len(values) >= INSERT_BATCH:
+            _flush(products, values)
+            products, values = [], []
+    _flush(products, values)
+    # Rows were inserted around the services, so index them in one pass
+    SearchIndexService.rebuild()
+    for name in ('categories', 'attribute_definitions', 'products'):
+        bump_version(name)
+    db.session.commit()
+    return {'attributes': attr_rows, 'product_categories': product_categories}
+
+def _flush(products, values):
+    if products:
+        db.session.execute(db.insert(Product), products)
+    if values:
+        db.session.execute(db.insert(ProductAttributeValue), values)
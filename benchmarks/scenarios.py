@@ -0,0 +1,177 @@
+"""Repeatable API scenarios run against the Flask test client or a live server."""
+import json
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from benchmarks.catalog import WORDS, random_value
+
+class TestClientTarget:
+    name = 'test-client'
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, content_type='application/json'):
+        start = time.perf_counter()
+        resp = self.client.open(path, method=method, data=body, content_type=content_type)
+        data = resp.get_data()
+        return resp.status_code, time.perf_counter() - start, resp.headers.get('X-SQL-Count'), data
+
+class HttpTarget:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.name = self.base_url
+
+    def request(self, method, path, body=None, content_type='application/json'):
+        req = urllib.request.Request(self.base_url + path, data=body, method=method,
+                                     headers={'Content-Type': content_type} if body is not None else {})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as resp:
+                data = resp.read()
+                status, sql = resp.status, resp.headers.get('X-SQL-Count')
+        except urllib.error.HTTPError as e:
+            data = e.read()
+            status, sql = e.code, e.headers.get('X-SQL-Count')
+        return status, time.perf_counter() - start, sql, data
+
+class Scenario:
+    # Subclasses implement next_request(rng) -> (method, path, body, content_type) and may
+    # override observe(status, body) to build the next request from the previous response
+    name = None
+
+    def __init__(self, spec, catalog):
+        self.spec = spec
+        self.catalog = catalog
+
+    def run(self, target, iterations, warmup, seed):
+        rng = random.Random(seed)
+        for _ in range(warmup):
+            status, _, _, body = target.request(*self.next_request(rng))
+            self.observe(status, body)
+        latencies, sql_counts, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            status, elapsed, sql, body = target.request(*self.next_request(rng))
+            self.observe(status, body)
+            latencies.append(elapsed)
+            if sql is not None:
+                sql_counts.append(int(sql))
+            if status >= 400:
+                errors += 1
+        total = time.perf_counter() - started
+        return summarize(latencies, sql_counts, errors, total)
+
+    def observe(self, status, body):
+        pass
+
+    def random_product(self, rng):
+        return rng.randint(1, self.spec.products)
+
+class ListScenario(Scenario):
+    name = 'list'
+
+    def next_request(self, rng):
+        return 'GET', '/api/products?limit=50&expand=attributes', None, None
+
+class DeepListScenario(Scenario):
+    # Walks the listing by next_cursor, PAGES pages deep before starting over, so pages
+    # far from the first are measured too
+    name = 'list_deep'
+    PAGES = 20
+
+    def __init__(self, spec, catalog):
+        super().__init__(spec, catalog)
+        self.cursor = None
+        self.depth = 0
+
+    def next_request(self, rng):
+        path = '/api/products?limit=50&expand=attributes'
+        if self.cursor:
+            path += f'&cursor={urllib.parse.quote(self.cursor)}'
+        return 'GET', path, None, None
+
+    def observe(self, status, body):
+        self.depth += 1
+        self.cursor = json.loads(body)['next_cursor'] if status == 200 else None
+        if self.cursor is None or self.depth >= self.PAGES:
+            self.cursor, self.depth = None, 0
+
+class GetScenario(Scenario):
+    name = 'get'
+
+    def next_request(self, rng):
+        return 'GET', f'/api/products/{self.random_product(rng)}', None, None
+
+class SearchScenario(Scenario):
+    name = 'search'
+
+    def next_request(self, rng):
+        category_id = rng.randint(1, self.spec.categories)
+        int_attrs = [a for a in self.catalog['attributes']
+                     if a['category_id'] == category_id and a['data_type'] == 'int']
+        path = f'/api/products/search?category_id={category_id}&limit=50'
+        if int_attrs:
+            path += f"&attr.{int_attrs[0]['name']}[gte]={rng.randint(1, 64)}"
+        return 'GET', path, None, None
+
+class TextSearchScenario(Scenario):
+    name = 'text_search'
+
+    def next_request(self, rng):
+        words = rng.sample(WORDS, rng.randint(1, 2))
+        # Mix whole words with typed-ahead prefixes
+        q = ' '.join(w if rng.random() < 0.5 else w[:3] for w in words)
+        return 'GET', f'/api/products/search?q={q.replace(" ", "+")}&limit=50', None, None
+
+class SetAttributesScenario(Scenario):
+    name = 'set_attributes'
+
+    def next_request(self, rng):
+        pid = self.random_product(rng)
+        category_id = self.catalog['product_categories'][pid - 1]
+        attrs = [a for a in self.catalog['attributes'] if a['category_id'] == category_id]
+        body = {'attributes': {a['name']: random_value(rng, a['data_type']) for a in attrs}}
+        return 'POST', f'/api/products/{pid}/attributes', json.dumps(body), 'application/json'
+
+class BulkImportScenario(Scenario):
+    name = 'bulk_import'
+    ROWS_PER_REQUEST = 200
+
+    def next_request(self, rng):
+        lines = []
+        for _ in range(self.ROWS_PER_REQUEST):
+            category_id = rng.randint(1, self.spec.categories)
+            attrs = [a for a in self.catalog['attributes'] if a['category_id'] == category_id]
+            lines.append(json.dumps({
+                'sku': f'IMPORT-{rng.randint(1, self.spec.products * 2):08d}', 'name': 'Imported',
+                'category_id': category_id, 'price': round(rng.uniform(5, 2000), 2),
+                'attributes': {a['name']: random_value(rng, a['data_type']) for a in attrs}
+            }))
+        return 'POST', '/api/products/bulk', '\n'.join(lines).encode(), 'application/x-ndjson'
+
+SCENARIOS = {cls.name: cls for cls in (ListScenario, DeepListScenario, GetScenario, SearchScenario, TextSearchScenario,
+                                        SetAttributesScenario, BulkImportScenario)}
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(latencies, sql_counts, errors, total):
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'iterations': len(latencies),
+        'errors': errors,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'throughput_rps': round(len(latencies) / total, 2) if total else None,
+        'sql_statements_mean': round(sum(sql_counts) / len(sql_counts), 2) if sql_counts else None
+    }
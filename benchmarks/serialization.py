@@ -0,0 +1,85 @@
+"""Micro-benchmark: reflection-based to_dict vs compiled serializers vs column-only rows.
+
+    python -m benchmarks.serialization --rows 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def legacy_to_dict(model):
+    # The reflection path utils.to_dict used before serializers.py
+    data = {}
+    for col in model.__table__.columns:
+        data[col.name] = getattr(model, col.name)
+    return data
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = 'sqlite://'
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app
+    from database import db, init_db
+    from models import Category, Product
+    from serializers import OrjsonProvider, orjson, projected_columns, rows_to_dicts, serializer_for
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        db.session.add(Category(id=1, name='Bench'))
+        now = datetime.utcnow()
+        db.session.execute(db.insert(Product), [
+            {'name': f'Product {i}', 'sku': f'SKU-{i:08d}', 'category_id': 1, 'price': i * 1.5,
+             'currency': 'USD', 'description': 'x' * 40, 'created_at': now, 'updated_at': now}
+            for i in range(args.rows)
+        ])
+        db.session.commit()
+
+        def load_objects():
+            db.session.expunge_all()
+            return Product.query.all()
+
+        serialize = serializer_for(Product)
+        names, columns = projected_columns(Product)
+        loaded = load_objects()
+        results = {
+            'to_dict only (legacy reflection)': timed(lambda: [legacy_to_dict(p) for p in loaded], args.repeat),
+            'to_dict only (compiled serializer)': timed(lambda: [serialize(p) for p in loaded], args.repeat),
+            'orm + legacy to_dict': timed(lambda: [legacy_to_dict(p) for p in load_objects()], args.repeat),
+            'orm + compiled serializer': timed(lambda: [serialize(p) for p in load_objects()], args.repeat),
+            'column rows + rows_to_dicts': timed(
+                lambda: rows_to_dicts(names, db.session.execute(db.select(*columns)).all()), args.repeat),
+        }
+
+        payload = rows_to_dicts(names, db.session.execute(db.select(*columns)).all())
+        default_provider = DefaultJSONProvider(app)
+        results['json encode (default provider)'] = timed(lambda: default_provider.dumps(payload), args.repeat)
+        if orjson is not None:
+            orjson_provider = OrjsonProvider(app)
+            results['json encode (orjson provider)'] = timed(lambda: orjson_provider.dumps(payload), args.repeat)
+            assert json.loads(default_provider.dumps(payload)) == json.loads(orjson_provider.dumps(payload))
+
+    width = max(len(k) for k in results)
+    print(f'{args.rows} rows, best of {args.repeat}')
+    for name, seconds in results.items():
+        print(f'  {name:<{width}}  {seconds * 1000:8.1f} ms  {args.rows / seconds:12,.0f} rows/s')
+
+if __name__ == '__main__':
+    main()
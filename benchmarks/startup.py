@@ -0,0 +1,142 @@
+"""Cold start profile: import time, app creation and first requests, with and without warm-up.
+
+    python -m benchmarks.startup --repeat 5 --output startup.json
+    python -m benchmarks.startup --compare startup.json
+
+Each measurement runs in a fresh interpreter. The slowest direct imports of app.py come from
+one `python -X importtime` run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Runs in the child interpreter; prints one JSON line of milliseconds
+PROBE = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+client = flask_app.test_client()
+requests = []
+for path in {paths!r}:
+    before = time.perf_counter()
+    assert client.get(path).status_code == 200, path
+    requests.append((time.perf_counter() - before) * 1000)
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_requests_ms': sum(requests[:len(requests) // 2]),
+    'repeat_requests_ms': sum(requests[len(requests) // 2:]),
+}}))
+'''
+# One of each hot read, then the same again to show what the first round paid for
+PATHS = ('/api/categories', '/api/products?limit=20', '/api/products?limit=20&expand=attributes',
+         '/api/products/search?q=alpha&limit=20')
+TOP_IMPORTS = 15
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Defaults to a fresh SQLite file in a temp directory')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Previous results JSON to compare against')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+    load_catalog(database_url, args.products)
+
+    results = {'meta': {'python': sys.version.split()[0], 'products': args.products, 'repeat': args.repeat},
+               'modes': {}, 'imports': import_profile(database_url)}
+    for mode, warmup in (('cold', '0'), ('warmup', '1')):
+        runs = [probe(database_url, warmup) for _ in range(args.repeat)]
+        results['modes'][mode] = {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]}
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as fh:
+            previous = json.load(fh)
+    report(results, previous)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+def load_catalog(database_url, products):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['JOB_WORKERS'] = '0'
+    from app import create_app
+    from database import db, init_db
+    from benchmarks.catalog import CatalogSpec, generate_catalog
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        init_db()
+        generate_catalog(CatalogSpec(4, 8, products, 42))
+
+def child_env(database_url, warmup):
+    return dict(os.environ, DATABASE_URL=database_url, WARMUP=warmup, JOB_WORKERS='0',
+                SLOW_REQUEST_MS='100000', PYTHONPATH=ROOT)
+
+def probe(database_url, warmup):
+    code = PROBE.format(paths=PATHS + PATHS)
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=child_env(database_url, warmup),
+                         capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+def import_profile(database_url):
+    # Direct imports of app.py by cumulative time. importtime prints children before their
+    # parent, indented two more spaces per level
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT,
+                         env=child_env(database_url, '0'), capture_output=True, text=True, check=True)
+    direct = []
+    pending = []
+    total = None
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        depth = len(name) - len(name.lstrip())
+        if depth == 1:
+            if name.strip() == 'app':
+                total = round(int(cumulative) / 1000, 1)
+                direct = pending
+            pending = []
+        elif depth == 3:
+            pending.append((int(cumulative) / 1000, name.strip()))
+    direct.sort(reverse=True)
+    return {'app_ms': total, 'direct': {name: round(ms, 1) for ms, name in direct[:TOP_IMPORTS]}}
+
+def report(results, previous=None):
+    before = (previous or {}).get('modes', {})
+    keys = ('process_ms', 'import_ms', 'create_app_ms', 'first_requests_ms', 'repeat_requests_ms')
+    print(f"{'mode':<10}" + ''.join(f'{k:>20}' for k in keys))
+    for mode, r in results['modes'].items():
+        print(f'{mode:<10}' + ''.join(f'{r[k]:>20}' for k in keys))
+        old = before.get(mode)
+        if old:
+            print(f"{'':<10}" + ''.join(f'{(r[k] - old[k]) / old[k] * 100:>+19.1f}%' if old.get(k) else f"{'':>20}"
+                                        for k in keys))
+    imports = results['imports']
+    print(f"\nimport app: {imports['app_ms']} ms (-X importtime, includes its overhead); slowest direct imports:")
+    for name, ms in imports['direct'].items():
+        print(f'  {name:<40}{ms:>10} ms')
+
+if __name__ == '__main__':
+    main()
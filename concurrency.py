@@ -0,0 +1,42 @@
+from flask import abort, current_app, jsonify, request
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.exceptions import Conflict
+from database import db
+
+# Optimistic concurrency for products, categories and attribute definitions. Each row carries
+# a version (models: version_id_col); writes may send the version they last read in If-Match
+
+def expected_version():
+    # Accepted versions from If-Match, or None when the header is absent or "*". The entity tag
+    # is the resource's version, e.g. If-Match: "3"; the weak ETags of GET responses are cache
+    # validators for whole tables and do not apply here
+    if 'If-Match' not in request.headers:
+        if current_app.config.get('REQUIRE_IF_MATCH'):
+            abort(428, 'Send If-Match with the version of the resource being changed')
+        return None
+    etags = request.if_match
+    if etags.star_tag:
+        return None
+    try:
+        versions = {int(tag) for tag in etags}
+    except ValueError:
+        versions = None
+    if not versions:
+        abort(400, 'If-Match takes the resource version as a quoted entity tag, e.g. If-Match: "3"')
+    return versions
+
+def check_version(obj, expected):
+    if expected is not None and obj.version not in expected:
+        abort(412, f'The resource is at version {obj.version}')
+
+def versioned(data, status=200):
+    # Write response with the new version as a strong ETag, to send back as If-Match
+    return jsonify(data), status, {'ETag': f'"{data["version"]}"'}
+
+def init_concurrency(app):
+    app.register_error_handler(StaleDataError, _modified_concurrently)
+
+def _modified_concurrently(e):
+    # Another request updated the row between this request's read and its flush
+    db.session.rollback()
+    return Conflict('The resource was modified concurrently; read it again and retry')
@@ -0,0 +1,90 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+def env_flag(name, default=False):
+    return os.environ.get(name, '1' if default else '').lower() in TRUE_VALUES
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+def load_database_config(config):
+    # Engine and pool settings; SQLALCHEMY_ENGINE_OPTIONS is built from them in engine_options()
+    config['DB_POOL_SIZE'] = env_int('DB_POOL_SIZE', 10)
+    config['DB_MAX_OVERFLOW'] = env_int('DB_MAX_OVERFLOW', 20)
+    config['DB_POOL_TIMEOUT'] = env_float('DB_POOL_TIMEOUT', 30)
+    # Below MySQL's wait_timeout and typical proxy idle limits
+    config['DB_POOL_RECYCLE'] = env_int('DB_POOL_RECYCLE', 1800)
+    config['DB_POOL_PRE_PING'] = env_flag('DB_POOL_PRE_PING', True)
+    config['DB_STATEMENT_TIMEOUT_MS'] = env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+    config['SQLITE_BUSY_TIMEOUT_MS'] = env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    config['SQLITE_WAL'] = env_flag('SQLITE_WAL', True)
+    config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL') or None
+
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(config['SQLALCHEMY_DATABASE_URI'], config)
+    if config['DATABASE_REPLICA_URL']:
+        replica = config['DATABASE_REPLICA_URL']
+        config['SQLALCHEMY_BINDS'] = {'replica': dict(engine_options(replica, config), url=replica)}
+
+def engine_options(url, config):
+    if not url:
+        return {}
+    backend = make_url(url).get_backend_name()
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if backend == 'sqlite':
+        # SQLite pools hold file handles, not server connections; PRAGMAs are set in init_engines
+        return options
+    options.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE']
+    )
+    timeout = config['DB_STATEMENT_TIMEOUT_MS']
+    if timeout and backend == 'postgresql':
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout}'}
+    return options
+
+def init_engines(app, db):
+    # Per-connection session settings, applied to the primary and the replica engine
+    with app.app_context():
+        engines = db.engines.values()
+    for engine in engines:
+        configure_engine(engine, app.config)
+
+def configure_engine(engine, config):
+    # engine is a sync Engine; for an AsyncEngine pass its sync_engine
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _sqlite_pragmas(config))
+    elif engine.dialect.name == 'mysql' and config['DB_STATEMENT_TIMEOUT_MS']:
+        event.listen(engine, 'connect', _mysql_statement_timeout(config['DB_STATEMENT_TIMEOUT_MS']))
+
+def _sqlite_pragmas(config):
+    busy_timeout = config['SQLITE_BUSY_TIMEOUT_MS']
+    wal = config['SQLITE_WAL']
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers run alongside the single writer; in-memory databases ignore it
+        if wal:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        # Wait for the write lock instead of failing with "database is locked"
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        # Off by default in SQLite; needed for ON DELETE CASCADE
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+    return on_connect
+
+def _mysql_statement_timeout(timeout_ms):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Applies to SELECT statements only
+        cursor.execute(f'SET SESSION max_execution_time={int(timeout_ms)}')
+        cursor.close()
+    return on_connect
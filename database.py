@@ -1,14 +1,132 @@
 
 
+import importlib
 import os
+from contextlib import contextmanager
+from datetime import datetime
+from flask import abort
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select
+from sqlalchemy.exc import IntegrityError
 
-db = SQLAlchemy()
+class RoutingSession(Session):
+    # SELECTs go to the 'replica' bind while session.info['replica'] is set (GET requests);
+    # flushes, writes and SELECT ... FOR UPDATE stay on the primary
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and self.info.get('replica') and not self._flushing
+                and isinstance(clause, Select) and clause._for_update_arg is None):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def upsert(table, rows, key_columns, update_columns, increment_columns=(), merge_columns=None):
+    # INSERT that updates update_columns when key_columns already exist, adding 1 to
+    # increment_columns (row versions). merge_columns maps a column to fn(stored, new) giving
+    # its updated value, e.g. a sum. Run as executemany so the statement is compiled
+    # once and cached; the driver batches the rows
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in ('mysql', 'sqlite', 'postgresql'):
+        raise NotImplementedError(f'upsert is not supported on {dialect}')
+    stmt = _dialect_insert(dialect)(table)
+    new = stmt.inserted if dialect == 'mysql' else stmt.excluded
+    increments = {c: table.c[c] + 1 for c in increment_columns}
+    values = {**{c: new[c] for c in update_columns}, **increments,
+              **{c: fn(table.c[c], new[c]) for c, fn in (merge_columns or {}).items()}}
+    if dialect == 'mysql':
+        stmt = stmt.on_duplicate_key_update(values)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=key_columns, set_=values)
+    db.session.execute(stmt, rows)
+
+def _dialect_insert(dialect):
+    # Imported on first use: loading every dialect package up front adds tens of ms to startup
+    return importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert
+
+@contextmanager
+def unique_violation(message):
+    # 409 instead of a 500 when a flush in the block hits a unique constraint, e.g. two
+    # requests creating the same SKU at once
+    try:
+        yield
+    except IntegrityError:
+        db.session.rollback()
+        abort(409, message)
+
+@contextmanager
+def primary_reads():
+    # SELECTs in the block go to the primary, also while serving a GET request
+    info = db.session.info
+    replica = info.pop('replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None:
+            info['replica'] = replica
+
+def id_chunks(column, chunk_size, *criteria):
+    # Keyset walk over an integer key: lists of up to chunk_size values matching criteria.
+    # Safe to use while deleting the rows it yields
+    last_id = 0
+    while True:
+        ids = list(db.session.scalars(
+            db.select(column).where(column > last_id, *criteria).order_by(column).limit(chunk_size)
+        ))
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
 
 def init_db():
-    from models import Category, AttributeDefinition, Product, ProductAttributeValue  # noqa
+    from models import Category, AttributeDefinition, Product, ProductAttributeValue, ProductDocument, CacheVersion, ProductSearchText, ProductSearchTerm, Job, ChangeLogEntry, IdempotencyKey, CategoryStats, AttributeStats, AttributeValueCount  # noqa
     db.create_all()
 
+# Callbacks invoked with the counter name whenever bump_version is called
+_version_listeners = []
+
+def on_version_bump(callback):
+    _version_listeners.append(callback)
+
+def bump_version(name):
+    # Increments a shared change counter inside the current transaction
+    from models import CacheVersion
+    for callback in _version_listeners:
+        callback(name)
+    # One upsert: two transactions creating the same counter cannot both try to insert it
+    upsert(CacheVersion.__table__, [{'name': name, 'version': 1, 'updated_at': datetime.utcnow()}],
+           ['name'], ['updated_at'], increment_columns=['version'])
+
+def category_key(category_id):
+    # Change counter of one category: its products, their attribute values and its attribute definitions
+    return f'category:{category_id}'
+
+def bump_category_versions(category_ids):
+    # Sorted, so concurrent writers lock the counters in the same order
+    for category_id in sorted(set(category_ids)):
+        bump_version(category_key(category_id))
+
+def get_version(name):
+    from models import CacheVersion
+    return db.session.scalar(db.select(CacheVersion.version).where(CacheVersion.name == name)) or 0
+
+def get_versions(names):
+    # {name: (version, updated_at)} for several counters in one query; missing ones are (0, None)
+    return fold_versions(names, db.session.execute(versions_statement(names)))
+
+def versions_statement(names):
+    from models import CacheVersion
+    return (db.select(CacheVersion.name, CacheVersion.version, CacheVersion.updated_at)
+            .where(CacheVersion.name.in_(names)))
+
+def fold_versions(names, rows):
+    found = {name: (version, updated_at) for name, version, updated_at in rows}
+    return {name: found.get(name, (0, None)) for name in names}
+
 def seed_data():
     # Create initial categories and attributes for demo
     from models import Category, AttributeDefinition, Product
@@ -38,4 +156,6 @@ def seed_data():
             Product(name='Pixel X', sku='PX-001', category_id=smartphones.id, price=699.0, currency='USD'),
             Product(name='Classic Watch', sku='CW-001', category_id=watches.id, price=199.0, currency='USD')
         ])
+        for name in ('categories', 'attribute_definitions', 'products'):
+            bump_version(name)
         db.session.commit()
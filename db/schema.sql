@@ -5,6 +5,7 @@ CREATE TABLE IF NOT EXISTS categories (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL UNIQUE,
     description TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -18,6 +19,7 @@ CREATE TABLE IF NOT EXISTS attribute_definitions (
     is_unique BOOLEAN NOT NULL DEFAULT 0,
     unit TEXT,
     options_json TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(category_id, name),
@@ -32,11 +34,16 @@ CREATE TABLE IF NOT EXISTS products (
     description TEXT,
     price NUMERIC,
     currency TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (category_id) REFERENCES categories(id)
 );
 
+-- Keyset pagination on (created_at, id), optionally scoped to a category
+CREATE INDEX IF NOT EXISTS ix_products_created_id ON products (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_products_category_created_id ON products (category_id, created_at, id);
+
 CREATE TABLE IF NOT EXISTS product_attribute_values (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     product_id INTEGER NOT NULL,
@@ -53,3 +60,129 @@ CREATE TABLE IF NOT EXISTS product_attribute_values (
     FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
     FOREIGN KEY (attribute_definition_id) REFERENCES attribute_definitions(id) ON DELETE CASCADE
 );
+
+-- Attribute filtering: seek on (attribute, typed value) and read product_id from the index
+CREATE INDEX IF NOT EXISTS ix_pav_attr_string ON product_attribute_values (attribute_definition_id, string_value, product_id);
+CREATE INDEX IF NOT EXISTS ix_pav_attr_int ON product_attribute_values (attribute_definition_id, int_value, product_id);
+CREATE INDEX IF NOT EXISTS ix_pav_attr_decimal ON product_attribute_values (attribute_definition_id, decimal_value, product_id);
+CREATE INDEX IF NOT EXISTS ix_pav_attr_bool ON product_attribute_values (attribute_definition_id, bool_value, product_id);
+CREATE INDEX IF NOT EXISTS ix_pav_attr_date ON product_attribute_values (attribute_definition_id, date_value, product_id);
+
+-- Denormalized read model: each product as served by the API, attributes resolved
+CREATE TABLE IF NOT EXISTS product_documents (
+    product_id INTEGER PRIMARY KEY,
+    body TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- Change counters shared by all worker processes for cache invalidation
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Background jobs, claimed by the worker threads of the app processes
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    total INTEGER,
+    done INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at);
+
+-- Catalog writes in commit order, for incremental sync (GET /api/changes)
+CREATE TABLE IF NOT EXISTS change_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    category_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_change_log_entity ON change_log (entity, entity_id, id);
+
+-- Category stats and facets, changed by every product write (services/stats.py)
+CREATE TABLE IF NOT EXISTS category_stats (
+    category_id INTEGER PRIMARY KEY,
+    products INTEGER NOT NULL DEFAULT 0,
+    price_count INTEGER NOT NULL DEFAULT 0,
+    price_sum REAL NOT NULL DEFAULT 0,
+    price_min REAL,
+    price_max REAL,
+    stale BOOLEAN NOT NULL DEFAULT 0,
+    minmax_stale BOOLEAN NOT NULL DEFAULT 0,
+    generation INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS attribute_stats (
+    attribute_definition_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    true_count INTEGER NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    min_number REAL,
+    max_number REAL,
+    min_date TEXT,
+    max_date TEXT,
+    minmax_stale BOOLEAN NOT NULL DEFAULT 0,
+    FOREIGN KEY (attribute_definition_id) REFERENCES attribute_definitions(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS attribute_value_counts (
+    attribute_definition_id INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (attribute_definition_id, value),
+    FOREIGN KEY (attribute_definition_id) REFERENCES attribute_definitions(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_attribute_value_counts_count ON attribute_value_counts (attribute_definition_id, count);
+
+-- Responses of completed writes by Idempotency-Key, until expires_at
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key_hash TEXT PRIMARY KEY,
+    request_hash TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    response_status INTEGER,
+    response_headers TEXT,
+    response_body BLOB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires ON idempotency_keys (expires_at);
+
+-- Full-text search (SEARCH_INDEX). SQLite: FTS5 table, rowid = product id
+CREATE VIRTUAL TABLE IF NOT EXISTS product_search_fts USING fts5(
+    name, description, sku, attributes, tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+-- MySQL: the same text in a regular table with FULLTEXT (name, description, sku, attributes)
+CREATE TABLE IF NOT EXISTS product_search_text (
+    product_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    sku TEXT NOT NULL,
+    attributes TEXT,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+-- Other databases: weighted inverted index, prefix lookups on the primary key
+CREATE TABLE IF NOT EXISTS product_search_terms (
+    term TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (term, product_id),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS ix_product_search_terms_product ON product_search_terms (product_id);
@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+from flask import current_app, make_response, request
+from database import get_versions, on_version_bump
+
+class ResponseCache:
+    # LRU of rendered GET responses keyed by (path, query string), valid for one ETag and ttl seconds
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def put(self, key, etag, body, mimetype, tables):
+        with self._lock:
+            self._entries[key] = (etag, time.monotonic() + self.ttl, body, mimetype, frozenset(tables))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if table in entry[4]]:
+                del self._entries[key]
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+def init_http_cache(app):
+    size = app.config.get('RESPONSE_CACHE_SIZE', 0)
+    cache = ResponseCache(size, app.config.get('RESPONSE_CACHE_TTL', 30.0)) if size > 0 else None
+    app.extensions['response_cache'] = cache
+    if cache is not None:
+        # Writes in this process drop dependent entries right away; other
+        # processes notice the new counter through the ETag comparison
+        on_version_bump(cache.invalidate)
+
+def conditional_get(*tables):
+    # ETag / Last-Modified from the change counters of the tables a view reads. An entry may be
+    # a callable, called with the view arguments, returning a counter name (e.g. one category's)
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            names = [table(**kwargs) if callable(table) else table for table in tables]
+            etag, last_modified = validators_for(get_versions(names))
+            if is_not_modified(etag, last_modified, request.if_none_match, request.if_modified_since):
+                return _tag(current_app.response_class(status=304), etag, last_modified)
+
+            cache = current_app.extensions.get('response_cache')
+            key = (request.path, request.query_string)
+            cached = cache.get(key, etag) if cache is not None else None
+            if cached is not None:
+                body, mimetype = cached
+                return _tag(current_app.response_class(body, mimetype=mimetype), etag, last_modified)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed and cache is not None:
+                cache.put(key, etag, response.get_data(), response.mimetype, names)
+            return _tag(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+def validators_for(versions):
+    # (weak ETag, Last-Modified) for {name: (version, updated_at)}
+    etag = hashlib.sha1(repr(sorted(versions.items())).encode()).hexdigest()[:20]
+    stamps = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+    last_modified = max(stamps).replace(tzinfo=timezone.utc, microsecond=0) if stamps else None
+    return etag, last_modified
+
+def is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+    # If-None-Match takes precedence over If-Modified-Since
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    return bool(if_modified_since and last_modified and last_modified <= if_modified_since)
+
+def _tag(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Clients may keep the body but must revalidate before using it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,172 @@
+import hashlib
+import io
+import json
+import time
+import zlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import abort, current_app, request
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import IdempotencyKey
+
+# Idempotency-Key for create and bulk writes: the first request with a key stores its response,
+# retries with the same key and body get that response back without running the write again.
+# Keys are claimed with a plain INSERT, so a concurrent retry fails fast instead of waiting
+MAX_KEY_LENGTH = 255
+# Headers kept with the stored response; the rest are produced again on replay
+REPLAYED_HEADERS = ('Content-Type', 'Location', 'ETag')
+SWEEP_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+
+class _HashingInput(io.RawIOBase):
+    # Stands in for wsgi.input and hashes the request body as the view reads it, so streamed
+    # uploads are fingerprinted without being buffered
+    def __init__(self, stream):
+        self._stream = stream
+        self.sha = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.sha.update(data)
+        return n
+
+class IdempotencyStore:
+    def __init__(self, ttl=86400, pending_timeout=300, sweep_interval=60):
+        self.ttl = timedelta(seconds=ttl)
+        self.pending_timeout = timedelta(seconds=pending_timeout)
+        self.sweep_interval = sweep_interval
+        self._swept_at = 0.0
+
+    def claim(self, key_hash):
+        # None when this request owns the key, else the stored entry of a completed request
+        now = datetime.utcnow()
+        db.session.add(IdempotencyKey(key_hash=key_hash, status='pending', created_at=now,
+                                      expires_at=now + self.pending_timeout))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+        entry = db.session.get(IdempotencyKey, key_hash)
+        if entry is not None and entry.expires_at < now:
+            # Past its TTL, or pending for a request that died: take it over, unless another
+            # retry got there first
+            taken = db.session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key_hash == key_hash, IdempotencyKey.expires_at == entry.expires_at)
+                .values(status='pending', request_hash=None, response_status=None, response_headers=None,
+                        response_body=None, created_at=now, expires_at=now + self.pending_timeout),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            db.session.commit()
+            if taken:
+                return None
+            entry = None
+        if entry is None or entry.status == 'pending':
+            abort(409, 'A request with this Idempotency-Key is still in progress; retry later')
+        return entry
+
+    def complete(self, key_hash, request_hash, response):
+        now = datetime.utcnow()
+        headers = {name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers}
+        db.session.execute(
+            update(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash).values(
+                status='done',
+                request_hash=request_hash,
+                response_status=response.status_code,
+                response_headers=json.dumps(headers),
+                response_body=zlib.compress(response.get_data(), 1),
+                expires_at=now + self.ttl
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        self.sweep()
+
+    def release(self, key_hash):
+        # Failed requests store nothing; the client may retry them with the same key
+        db.session.rollback()
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash),
+                           execution_options={'synchronize_session': False})
+        db.session.commit()
+
+    def replay(self, entry, request_hash):
+        if entry.request_hash != request_hash:
+            abort(422, 'Idempotency-Key was already used with a different request')
+        response = current_app.response_class(zlib.decompress(entry.response_body), status=entry.response_status,
+                                              headers=json.loads(entry.response_headers))
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    def sweep(self, force=False):
+        # Deletes a bounded batch of expired keys, at most once per sweep_interval per process
+        if not force and time.monotonic() - self._swept_at < self.sweep_interval:
+            return 0
+        self._swept_at = time.monotonic()
+        expired = db.session.scalars(
+            select(IdempotencyKey.key_hash)
+            .where(IdempotencyKey.expires_at < datetime.utcnow())
+            .limit(SWEEP_BATCH_SIZE)
+        ).all()
+        if expired:
+            db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.key_hash.in_(expired)),
+                               execution_options={'synchronize_session': False})
+            db.session.commit()
+        return len(expired)
+
+def idempotent(view):
+    # Requests without an Idempotency-Key header run as before
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            abort(400, f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters')
+        store = get_idempotency_store()
+        key_hash = hashlib.sha256(f'{request.method} {request.path}\n{key}'.encode()).hexdigest()
+        body = _HashingInput(request.environ['wsgi.input'])
+        request.environ['wsgi.input'] = body
+
+        entry = store.claim(key_hash)
+        if entry is not None:
+            _drain(request.stream)
+            return store.replay(entry, _request_hash(body))
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+            _drain(request.stream)
+        except BaseException:
+            store.release(key_hash)
+            raise
+        if response.status_code >= 400 or response.is_streamed:
+            store.release(key_hash)
+        else:
+            store.complete(key_hash, _request_hash(body), response)
+        return response
+    return wrapper
+
+def _request_hash(body):
+    # The query string selects format and options of the bulk endpoints, so it is part of the request
+    sha = body.sha.copy()
+    sha.update(b'\n' + request.query_string)
+    return sha.hexdigest()
+
+def _drain(stream):
+    while stream.read(READ_CHUNK_SIZE):
+        pass
+
+def init_idempotency(app):
+    app.extensions['idempotency'] = IdempotencyStore(
+        ttl=app.config.get('IDEMPOTENCY_TTL', 86400),
+        pending_timeout=app.config.get('IDEMPOTENCY_PENDING_TIMEOUT', 300)
+    )
+
+def get_idempotency_store():
+    return current_app.extensions['idempotency']
@@ -0,0 +1,213 @@
+import heapq
+import io
+import logging
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500)
+SLOWEST_KEPT = 5
+PROFILE_LINES = 40
+# Statement text is cut to this length in log lines (multi-row INSERTs can be huge)
+LOGGED_STATEMENT_CHARS = 300
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def samples(self, name, labels):
+        # Prometheus buckets are cumulative
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f'{name}_bucket{_labels(labels, le=bound)} {cumulative}'
+        yield f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}'
+        yield f'{name}_sum{_labels(labels)} {self.total}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+class Metrics:
+    # Per-process aggregates, exported at /api/_metrics
+    HISTOGRAMS = {
+        'pm_request_duration_seconds': ('Request wall time', DURATION_BUCKETS),
+        'pm_request_sql_seconds': ('Time spent in SQL per request', DURATION_BUCKETS),
+        'pm_request_sql_statements': ('SQL statements per request', QUERY_COUNT_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name in self.HISTOGRAMS}
+        self._requests = Counter()
+        self._n_plus_one = Counter()
+
+    def record(self, route, method, status, wall, sql_time, sql_count, n_plus_one):
+        with self._lock:
+            for name, value in (('pm_request_duration_seconds', wall),
+                                ('pm_request_sql_seconds', sql_time),
+                                ('pm_request_sql_statements', sql_count)):
+                per_route = self._histograms[name]
+                if route not in per_route:
+                    per_route[route] = Histogram(self.HISTOGRAMS[name][1])
+                per_route[route].observe(value)
+            self._requests[(route, method, status)] += 1
+            if n_plus_one:
+                self._n_plus_one[route] += 1
+
+    def render(self, gauges=()):
+        lines = []
+        with self._lock:
+            lines += ['# HELP pm_requests_total Requests served',
+                      '# TYPE pm_requests_total counter']
+            for (route, method, status), n in sorted(self._requests.items()):
+                lines.append(f'pm_requests_total{_labels({"route": route, "method": method, "status": status})} {n}')
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for route, hist in sorted(self._histograms[name].items()):
+                    lines.extend(hist.samples(name, {'route': route}))
+            lines += ['# HELP pm_n_plus_one_requests_total Requests that repeated one statement shape too often',
+                      '# TYPE pm_n_plus_one_requests_total counter']
+            for route, n in sorted(self._n_plus_one.items()):
+                lines.append(f'pm_n_plus_one_requests_total{_labels({"route": route})} {n}')
+        for name, help_text, value in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+def _labels(labels, **extra):
+    items = dict(labels, **extra)
+    if not items:
+        return ''
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+               for k, v in items.items())
+    return '{' + ','.join(escaped) + '}'
+
+class RequestStats:
+    __slots__ = ('started', 'sql_count', 'sql_time', 'shapes', 'slowest')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        # Statements are already parameterized, so the SQL text is the statement shape
+        self.shapes = Counter()
+        self.slowest = []
+
+    def add(self, statement, elapsed):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        self.shapes[statement] += 1
+        entry = (elapsed, self.sql_count, statement)
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which goes away with the statement: after_cursor_execute
+    # does not fire for a statement that raises, so state on the pooled connection would leak
+    if has_request_context() and 'request_stats' in g:
+        context._query_start_time = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_start_time', None)
+    if started is None or not has_request_context() or 'request_stats' not in g:
+        return
+    g.request_stats.add(statement, time.perf_counter() - started)
+
+_listening = False
+
+def init_instrumentation(app):
+    global _listening
+    app.extensions['metrics'] = Metrics()
+    if not _listening:
+        # Class-level listeners cover every engine, including read replicas
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listening = True
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    @app.get('/api/_metrics')
+    def metrics():
+        gauges = []
+        registry = app.extensions.get('schema_registry')
+        if registry is not None:
+            stats = registry.stats()
+            gauges += [('pm_schema_cache_hits', 'Schema registry hits', stats['hits']),
+                       ('pm_schema_cache_misses', 'Schema registry misses', stats['misses'])]
+        cache = app.extensions.get('response_cache')
+        if cache is not None:
+            stats = cache.stats()
+            gauges += [('pm_response_cache_hits', 'Response cache hits', stats['hits']),
+                       ('pm_response_cache_misses', 'Response cache misses', stats['misses']),
+                       ('pm_response_cache_entries', 'Response cache entries', stats['entries'])]
+        body = app.extensions['metrics'].render(gauges)
+        return app.response_class(body, mimetype='text/plain; version=0.0.4')
+
+def mark_long_poll():
+    # The request waits on purpose (long-poll): its repeated polls are not an N+1, nor is it slow
+    g.long_poll = True
+
+def _start_request():
+    g.request_stats = RequestStats()
+    if current_app.config.get('PROFILING_ENABLED') and request.args.get('_profile') == '1':
+        import cProfile  # only for ?_profile=1, kept off the startup path
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+def _finish_request(response):
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    wall = time.perf_counter() - stats.started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    long_poll = g.pop('long_poll', False)
+
+    threshold = current_app.config.get('N_PLUS_ONE_THRESHOLD', 10)
+    repeated = [] if long_poll else [(n, shape) for shape, n in stats.shapes.items() if n > threshold]
+    if repeated:
+        n, shape = max(repeated)
+        log.warning('Possible N+1 on %s %s: statement ran %d times: %s',
+                    request.method, route, n, shape[:LOGGED_STATEMENT_CHARS])
+        response.headers['X-N-Plus-One'] = str(n)
+    slow_ms = current_app.config.get('SLOW_REQUEST_MS', 500)
+    if wall * 1000 >= slow_ms and not long_poll:
+        slowest = sorted(stats.slowest, reverse=True)
+        log.warning('Slow request %s %s: %.1f ms, %d statements, %.1f ms in SQL; slowest: %s',
+                    request.method, route, wall * 1000, stats.sql_count, stats.sql_time * 1000,
+                    [(round(t * 1000, 1), s[:LOGGED_STATEMENT_CHARS]) for t, _, s in slowest])
+
+    current_app.extensions['metrics'].record(
+        route, request.method, response.status_code, wall, stats.sql_time, stats.sql_count, bool(repeated)
+    )
+    response.headers['X-SQL-Count'] = str(stats.sql_count)
+    response.headers['Server-Timing'] = f'app;dur={wall * 1000:.1f}, db;dur={stats.sql_time * 1000:.1f}'
+
+    if profiler is not None:
+        import pstats
+        out = io.StringIO()
+        out.write(f'{request.method} {request.full_path}: {wall * 1000:.1f} ms, '
+                  f'{stats.sql_count} SQL statements, {stats.sql_time * 1000:.1f} ms in SQL\n\n')
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        return current_app.response_class(out.getvalue(), mimetype='text/plain')
+    return response
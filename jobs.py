@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import abort, current_app
+from sqlalchemy import delete, select, update
+from database import db
+from models import Job
+
+log = logging.getLogger(__name__)
+
+# Job functions by kind, registered with @job_handler. Each is called as fn(**params, job=progress)
+JOB_HANDLERS = {}
+MAX_ATTEMPTS = 3
+
+def job_handler(kind):
+    def decorator(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+class JobProgress:
+    # Passed to job functions as job=. Updates join the function's current transaction, so
+    # progress is committed together with the chunk it describes
+    def __init__(self, job_id):
+        self.id = job_id
+        self._total = None
+
+    @property
+    def total(self):
+        return self._total
+
+    @total.setter
+    def total(self, value):
+        self._total = value
+        self._update(total=value)
+
+    def advance(self, n):
+        self._update(done=Job.done + n)
+
+    def _update(self, **values):
+        db.session.execute(
+            update(Job).where(Job.id == self.id).values(heartbeat_at=datetime.utcnow(), **values),
+            execution_options={'synchronize_session': False}
+        )
+
+def enqueue(kind, **params):
+    # Adds the job to the current transaction; workers see it once the caller commits
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'unknown job kind {kind}')
+    job = Job(id=uuid.uuid4().hex, kind=kind, params=json.dumps(params), status='queued', done=0, attempts=0)
+    db.session.add(job)
+    return job
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'status': job.status,
+        'total': job.total,
+        'done': job.done,
+        'progress': round(job.done / job.total, 4) if job.total else None,
+        'result': json.loads(job.result) if job.result is not None else None,
+        'error': job.error,
+        'attempts': job.attempts,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at
+    }
+
+class JobRunner:
+    # Worker threads polling the jobs table. Every app process may run them; a job is claimed
+    # with a conditional UPDATE, so each one runs in exactly one worker
+    def __init__(self, app, workers=2, poll_interval=1.0, stale_after=600, retention=timedelta(days=7)):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._maintained_at = 0.0
+
+    def submit(self, kind, **params):
+        job = enqueue(kind, **params)
+        db.session.commit()
+        self.notify()
+        return job
+
+    def get(self, job_id):
+        return db.session.get(Job, job_id)
+
+    def notify(self):
+        self._wake.set()
+
+    def ensure_started(self):
+        # Threads do not survive fork, so a pre-forking server starts them in each worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._loop, name=f'job-{i}', daemon=True) for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def run_forever(self):
+        # Foreground worker process (flask run-jobs) until interrupted
+        self.ensure_started()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _loop(self):
+        name = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+        while not self._stop.is_set():
+            ran = False
+            with self.app.app_context():
+                try:
+                    self._maintain()
+                    ran = self.run_next(name)
+                except Exception:
+                    log.exception('Job worker %s failed to poll', name)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_next(self, worker):
+        # Claims and runs the oldest queued job; False when there was none
+        job_id = self._claim(worker)
+        if job_id is None:
+            return False
+        job = db.session.get(Job, job_id)
+        handler = JOB_HANDLERS.get(job.kind)
+        try:
+            if handler is None:
+                raise ValueError(f'unknown job kind {job.kind}')
+            result = handler(**json.loads(job.params), job=JobProgress(job_id))
+        except Exception as e:
+            db.session.rollback()
+            log.exception('Job %s (%s) failed', job_id, job.kind)
+            self._finish(job_id, 'failed', error=str(e) or e.__class__.__name__)
+        else:
+            self._finish(job_id, 'succeeded', result=result)
+        return True
+
+    def _claim(self, worker):
+        candidates = db.session.scalars(
+            select(Job.id).where(Job.status == 'queued').order_by(Job.created_at).limit(self.workers + 1)
+        ).all()
+        for job_id in candidates:
+            now = datetime.utcnow()
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+                    status='running', worker=worker, attempts=Job.attempts + 1, started_at=now, heartbeat_at=now
+                ),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return job_id
+        return None
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = datetime.utcnow()
+        db.session.execute(
+            update(Job).where(Job.id == job_id).values(
+                status=status,
+                result=json.dumps(result) if result is not None else None,
+                error=error,
+                heartbeat_at=now,
+                finished_at=now
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+    def _maintain(self):
+        # Requeues jobs whose worker died mid-run and drops old finished jobs. Job functions
+        # work in committed, restartable chunks, so running one again is safe
+        if time.monotonic() - self._maintained_at < self.stale_after / 4:
+            return
+        self._maintained_at = time.monotonic()
+        now = datetime.utcnow()
+        stale = [Job.status == 'running', Job.heartbeat_at < now - timedelta(seconds=self.stale_after)]
+        db.session.execute(
+            update(Job).where(*stale, Job.attempts >= MAX_ATTEMPTS).values(
+                status='failed', error='worker lost', finished_at=now
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.execute(
+            update(Job).where(*stale).values(status='queued', worker=None),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.execute(
+            delete(Job).where(Job.finished_at < now - self.retention),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+def init_jobs(app):
+    runner = JobRunner(
+        app,
+        workers=app.config.get('JOB_WORKERS', 2),
+        poll_interval=app.config.get('JOB_POLL_INTERVAL', 1.0),
+        stale_after=app.config.get('JOB_STALE_SECONDS', 600),
+        retention=timedelta(hours=app.config.get('JOB_RETENTION_HOURS', 168))
+    )
+    app.extensions['jobs'] = runner
+    if runner.workers:
+        # Started on the first request rather than at import, so CLI commands and
+        # pre-fork servers do not spawn threads they cannot use
+        app.before_request(runner.ensure_started)
+
+def get_jobs():
+    return current_app.extensions['jobs']
+
+def require_job(job_id):
+    job = get_jobs().get(job_id)
+    if job is None:
+        abort(404)
+    return job
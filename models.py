@@ -1,17 +1,42 @@
+import json
 from datetime import datetime
-from sqlalchemy import CheckConstraint, UniqueConstraint, ForeignKey
+from sqlalchemy import DDL, CheckConstraint, UniqueConstraint, ForeignKey, Index, event
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from database import db
 
+# Typed column of product_attribute_values that holds each attribute data type
+VALUE_COLUMNS = {
+    'string': 'string_value',
+    'enum': 'string_value',
+    'int': 'int_value',
+    'decimal': 'decimal_value',
+    'bool': 'bool_value',
+    'date': 'date_value',
+    'json': 'json_value',
+}
+TYPED_VALUE_COLUMNS = ('string_value', 'int_value', 'decimal_value', 'bool_value', 'date_value', 'json_value')
+
+def typed_value(data_type, row):
+    # Reads the value for data_type from an ORM object or a Row carrying the value columns
+    value = getattr(row, VALUE_COLUMNS[data_type])
+    if data_type == 'json' and value is not None:
+        return json.loads(value)
+    return value
+
 class Category(db.Model):
     __tablename__ = 'categories'
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(db.String(100), unique=True, nullable=False)
     description: Mapped[str | None] = mapped_column(db.String(255), nullable=True)
+    version: Mapped[int] = mapped_column(db.Integer, nullable=False, default=1)
     created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    attributes = relationship('AttributeDefinition', back_populates='category', cascade='all, delete-orphan')
+    # Optimistic locking: every ORM UPDATE/DELETE checks and increments version (StaleDataError on mismatch)
+    __mapper_args__ = {'version_id_col': version}
+
+    # passive_deletes: children are removed by ON DELETE CASCADE instead of being loaded and deleted one by one
+    attributes = relationship('AttributeDefinition', back_populates='category', cascade='all, delete-orphan', passive_deletes=True)
     products = relationship('Product', back_populates='category')
 
 class AttributeDefinition(db.Model):
@@ -24,13 +49,15 @@ class AttributeDefinition(db.Model):
     is_unique: Mapped[bool] = mapped_column(db.Boolean, default=False, nullable=False)
     unit: Mapped[str | None] = mapped_column(db.String(50), nullable=True)
     options_json: Mapped[str | None] = mapped_column(db.Text, nullable=True)
+    version: Mapped[int] = mapped_column(db.Integer, nullable=False, default=1)
     created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     __table_args__ = (UniqueConstraint('category_id','name', name='uq_attr_name_per_category'),)
+    __mapper_args__ = {'version_id_col': version}
 
     category = relationship('Category', back_populates='attributes')
-    values = relationship('ProductAttributeValue', back_populates='attribute', cascade='all, delete-orphan')
+    values = relationship('ProductAttributeValue', back_populates='attribute', cascade='all, delete-orphan', passive_deletes=True)
 
 class Product(db.Model):
     __tablename__ = 'products'
@@ -41,11 +68,19 @@ class Product(db.Model):
     description: Mapped[str | None] = mapped_column(db.String(255), nullable=True)
     price: Mapped[float | None] = mapped_column(db.Float, nullable=True)
     currency: Mapped[str | None] = mapped_column(db.String(10), nullable=True)
+    # Also incremented when the product's attribute values change
+    version: Mapped[int] = mapped_column(db.Integer, nullable=False, default=1)
     created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        Index('ix_products_created_id', 'created_at', 'id'),
+        Index('ix_products_category_created_id', 'category_id', 'created_at', 'id'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
     category = relationship('Category', back_populates='products')
-    attributes = relationship('ProductAttributeValue', back_populates='product', cascade='all, delete-orphan')
+    attributes = relationship('ProductAttributeValue', back_populates='product', cascade='all, delete-orphan', passive_deletes=True)
 
 class ProductAttributeValue(db.Model):
     __tablename__ = 'product_attribute_values'
@@ -61,7 +96,15 @@ class ProductAttributeValue(db.Model):
     created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint('product_id','attribute_definition_id', name='uq_product_attr'),)
+    __table_args__ = (
+        UniqueConstraint('product_id','attribute_definition_id', name='uq_product_attr'),
+        # Covering indexes for attribute predicates: seek on (attribute, value), read product_id
+        Index('ix_pav_attr_string', 'attribute_definition_id', 'string_value', 'product_id'),
+        Index('ix_pav_attr_int', 'attribute_definition_id', 'int_value', 'product_id'),
+        Index('ix_pav_attr_decimal', 'attribute_definition_id', 'decimal_value', 'product_id'),
+        Index('ix_pav_attr_bool', 'attribute_definition_id', 'bool_value', 'product_id'),
+        Index('ix_pav_attr_date', 'attribute_definition_id', 'date_value', 'product_id'),
+    )
 
     product = relationship('Product', back_populates='attributes')
     attribute = relationship('AttributeDefinition', back_populates='values')
@@ -75,22 +118,175 @@ class ProductAttributeValue(db.Model):
         self.json_value = None
 
     def set_typed_value(self, data_type, value):
-        self.clear_values()
+        for column, column_value in self.typed_columns(data_type, value).items():
+            setattr(self, column, column_value)
+
+    @staticmethod
+    def typed_columns(data_type, value):
+        # All value columns for a row holding value, only the one for data_type set
+        columns = dict.fromkeys(TYPED_VALUE_COLUMNS)
         if data_type == 'string' or data_type == 'enum':
-            self.string_value = str(value)
+            columns['string_value'] = str(value)
         elif data_type == 'int':
-            self.int_value = int(value)
+            columns['int_value'] = int(value)
         elif data_type == 'decimal':
-            self.decimal_value = float(value)
+            columns['decimal_value'] = float(value)
         elif data_type == 'bool':
-            self.bool_value = bool(value)
+            columns['bool_value'] = bool(value)
         elif data_type == 'date':
-            self.date_value = str(value)
+            columns['date_value'] = str(value)
         elif data_type == 'json':
-            from json import dumps
-            self.json_value = dumps(value)
+            columns['json_value'] = json.dumps(value)
         else:
             raise ValueError('Unsupported data type')
+        return columns
 
     def best_value(self):
-        return self.string_value or self.int_value or self.decimal_value or self.bool_value or self.date_value or self.json_value
+        # First populated column; falsy values such as 0 or False are real values
+        for column in TYPED_VALUE_COLUMNS:
+            value = getattr(self, column)
+            if value is not None:
+                return value
+        return None
+
+class ProductDocument(db.Model):
+    # Denormalized read model: the product as served by GET /api/products/<id>, attributes resolved
+    __tablename__ = 'product_documents'
+    product_id: Mapped[int] = mapped_column(ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    body: Mapped[str] = mapped_column(db.Text, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CacheVersion(db.Model):
+    # Change counters shared by all worker processes for cache invalidation
+    __tablename__ = 'cache_versions'
+    name: Mapped[str] = mapped_column(db.String(100), primary_key=True)
+    version: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Job(db.Model):
+    # Background job queue, claimed by the worker threads of any app process (jobs.py)
+    __tablename__ = 'jobs'
+    id: Mapped[str] = mapped_column(db.String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(db.String(50), nullable=False)
+    params: Mapped[str] = mapped_column(db.Text, nullable=False, default='{}')  # JSON
+    status: Mapped[str] = mapped_column(db.String(20), nullable=False, default='queued')  # queued,running,succeeded,failed
+    total: Mapped[int | None] = mapped_column(db.Integer, nullable=True)
+    done: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    result: Mapped[str | None] = mapped_column(db.Text, nullable=True)  # JSON
+    error: Mapped[str | None] = mapped_column(db.Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    worker: Mapped[str | None] = mapped_column(db.String(100), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
+    # Refreshed with every progress update; running jobs that stop beating are requeued
+    heartbeat_at: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
+
+    __table_args__ = (Index('ix_jobs_status_created', 'status', 'created_at'),)
+
+class ChangeLogEntry(db.Model):
+    # Append-only feed of catalog writes for incremental sync; id is the consumers' cursor
+    __tablename__ = 'change_log'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    entity: Mapped[str] = mapped_column(db.String(20), nullable=False)  # product,category,attribute
+    entity_id: Mapped[int] = mapped_column(db.Integer, nullable=False)
+    op: Mapped[str] = mapped_column(db.String(10), nullable=False)  # create,update,delete
+    category_id: Mapped[int | None] = mapped_column(db.Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow)
+
+    # Compaction looks for later entries of the same entity. Ids are never reused (AUTOINCREMENT)
+    __table_args__ = (
+        Index('ix_change_log_entity', 'entity', 'entity_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+class CategoryStats(db.Model):
+    # Aggregates behind GET /categories/<id>/stats and /products/facets, changed by every
+    # product write in its own transaction (services/stats.py)
+    __tablename__ = 'category_stats'
+    category_id: Mapped[int] = mapped_column(ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True)
+    products: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    price_count: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    price_sum: Mapped[float] = mapped_column(db.Float, nullable=False, default=0)
+    price_min: Mapped[float | None] = mapped_column(db.Float, nullable=True)
+    price_max: Mapped[float | None] = mapped_column(db.Float, nullable=True)
+    # stale: recompute everything on the next read; minmax_stale: only the minimums and maximums
+    stale: Mapped[bool] = mapped_column(db.Boolean, nullable=False, default=False)
+    minmax_stale: Mapped[bool] = mapped_column(db.Boolean, nullable=False, default=False)
+    # Incremented by every write; a recompute is only stored when it is unchanged
+    generation: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+
+class AttributeStats(db.Model):
+    # Per attribute: values stored in the column of its data_type, their sum, range and true count
+    __tablename__ = 'attribute_stats'
+    attribute_definition_id: Mapped[int] = mapped_column(ForeignKey('attribute_definitions.id', ondelete='CASCADE'), primary_key=True)
+    count: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    true_count: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    total: Mapped[float] = mapped_column(db.Float, nullable=False, default=0)
+    min_number: Mapped[float | None] = mapped_column(db.Float, nullable=True)
+    max_number: Mapped[float | None] = mapped_column(db.Float, nullable=True)
+    min_date: Mapped[str | None] = mapped_column(db.String(20), nullable=True)
+    max_date: Mapped[str | None] = mapped_column(db.String(20), nullable=True)
+    minmax_stale: Mapped[bool] = mapped_column(db.Boolean, nullable=False, default=False)
+
+class AttributeValueCount(db.Model):
+    # Products per value of string and enum attributes; rows at 0 stay until the next recompute
+    __tablename__ = 'attribute_value_counts'
+    attribute_definition_id: Mapped[int] = mapped_column(ForeignKey('attribute_definitions.id', ondelete='CASCADE'), primary_key=True)
+    value: Mapped[str] = mapped_column(db.String(255), primary_key=True)
+    count: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (Index('ix_attribute_value_counts_count', 'attribute_definition_id', 'count'),)
+
+class IdempotencyKey(db.Model):
+    # Responses of completed writes by Idempotency-Key, replayed to retries until expires_at
+    __tablename__ = 'idempotency_keys'
+    key_hash: Mapped[str] = mapped_column(db.String(64), primary_key=True)  # sha256 of method, path and key
+    request_hash: Mapped[str | None] = mapped_column(db.String(64), nullable=True)  # sha256 of the body
+    status: Mapped[str] = mapped_column(db.String(10), nullable=False, default='pending')  # pending,done
+    response_status: Mapped[int | None] = mapped_column(db.Integer, nullable=True)
+    response_headers: Mapped[str | None] = mapped_column(db.Text, nullable=True)  # JSON
+    response_body: Mapped[bytes | None] = mapped_column(db.LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(db.DateTime, nullable=False)
+
+    __table_args__ = (Index('ix_idempotency_keys_expires', 'expires_at'),)
+
+class ProductSearchText(db.Model):
+    # Searchable text per product, indexed with FULLTEXT on MySQL
+    __tablename__ = 'product_search_text'
+    product_id: Mapped[int] = mapped_column(ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    name: Mapped[str] = mapped_column(db.String(100), nullable=False)
+    description: Mapped[str | None] = mapped_column(db.String(255), nullable=True)
+    sku: Mapped[str] = mapped_column(db.String(50), nullable=False)
+    attributes: Mapped[str | None] = mapped_column(db.Text, nullable=True)
+
+    __table_args__ = (
+        Index('ft_product_search_text', 'name', 'description', 'sku', 'attributes',
+              mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
+class ProductSearchTerm(db.Model):
+    # Portable inverted index: one row per (term, product), weighted by the fields containing the term
+    __tablename__ = 'product_search_terms'
+    term: Mapped[str] = mapped_column(db.String(64), primary_key=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    weight: Mapped[int] = mapped_column(db.Integer, nullable=False)
+
+    __table_args__ = (Index('ix_product_search_terms_product', 'product_id'),)
+
+# SQLite FTS5 index; rowid is the product id. Created and dropped along with the models
+FTS5_TABLE = 'product_search_fts'
+
+def fts5_available(connection):
+    return (connection.dialect.name == 'sqlite'
+            and connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar() == 1)
+
+def _fts5_ddl(ddl, target, bind, **kw):
+    return fts5_available(bind)
+
+event.listen(db.metadata, 'after_create', DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS5_TABLE} USING fts5("
+    "name, description, sku, attributes, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+).execute_if(callable_=_fts5_ddl))
+event.listen(db.metadata, 'before_drop', DDL(f'DROP TABLE IF EXISTS {FTS5_TABLE}').execute_if(callable_=_fts5_ddl))
@@ -0,0 +1,9 @@
+import importlib
+
+# Route modules, one blueprint each, imported when an app is created rather than when
+# app.py is imported
+BLUEPRINTS = ('health', 'ui', 'categories', 'attributes', 'products', 'jobs', 'changes')
+
+def register_blueprints(app):
+    for name in BLUEPRINTS:
+        app.register_blueprint(importlib.import_module(f'routes.{name}').bp)
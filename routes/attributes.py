@@ -0,0 +1,37 @@
+from flask import Blueprint, abort, jsonify, request
+from concurrency import expected_version, versioned
+from http_cache import conditional_get
+from idempotency import idempotent
+from jobs import get_jobs
+from routes.jobs import job_accepted
+from schema_registry import get_registry
+from services.attributes import AttributeService
+from utils import parse_bool_arg
+
+bp = Blueprint('attributes', __name__, url_prefix='/api/categories/<int:cid>/attributes')
+
+@bp.post('')
+@idempotent
+def create_attribute(cid):
+    data = request.get_json(force=True)
+    return versioned(AttributeService.create(cid, data), 201)
+
+@bp.get('')
+@conditional_get('categories', 'attribute_definitions')
+def list_attributes(cid):
+    return jsonify(AttributeService.list(cid))
+
+@bp.put('/<int:aid>')
+def update_attribute(cid, aid):
+    data = request.get_json(force=True)
+    return versioned(AttributeService.update(cid, aid, data, expected_version()))
+
+@bp.delete('/<int:aid>')
+def delete_attribute(cid, aid):
+    if parse_bool_arg(request.args, 'async'):
+        # Attributes with very many values: chunked purge in the background
+        if aid not in get_registry().require(cid).by_id:
+            abort(404)
+        return job_accepted(get_jobs().submit('purge_attribute', category_id=cid, attr_id=aid))
+    AttributeService.delete(cid, aid, expected_version())
+    return '', 204
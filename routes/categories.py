@@ -0,0 +1,58 @@
+from flask import Blueprint, jsonify, request
+from concurrency import expected_version, versioned
+from database import category_key
+from http_cache import conditional_get
+from idempotency import idempotent
+from jobs import get_jobs
+from routes.jobs import job_accepted
+from schema_registry import get_registry
+from services.categories import CategoryService
+from services.products import ProductService
+from services.stats import StatsService
+from utils import parse_bool_arg
+
+bp = Blueprint('categories', __name__, url_prefix='/api/categories')
+
+@bp.post('')
+@idempotent
+def create_category():
+    data = request.get_json(force=True)
+    cat = CategoryService.create(data)
+    return versioned(cat, 201)
+
+@bp.get('')
+@conditional_get('categories')
+def list_categories():
+    return jsonify(CategoryService.list(request.args))
+
+@bp.get('/<int:cid>')
+@conditional_get('categories')
+def get_category(cid):
+    return jsonify(CategoryService.get(cid))
+
+@bp.get('/<int:cid>/stats')
+@conditional_get(lambda cid: category_key(cid))
+def category_stats(cid):
+    return jsonify(StatsService.category_stats(cid))
+
+@bp.put('/<int:cid>')
+def update_category(cid):
+    data = request.get_json(force=True)
+    return versioned(CategoryService.update(cid, data, expected_version()))
+
+@bp.delete('/<int:cid>')
+def delete_category(cid):
+    CategoryService.delete(cid, expected_version())
+    return '', 204
+
+@bp.delete('/<int:cid>/products')
+def purge_category_products(cid):
+    if parse_bool_arg(request.args, 'async'):
+        get_registry().require(cid)
+        return job_accepted(get_jobs().submit('purge_category_products', category_id=cid))
+    return jsonify(ProductService.purge_category(cid))
+
+@bp.post('/<int:cid>/revalidate')
+def revalidate_category(cid):
+    get_registry().require(cid)
+    return job_accepted(get_jobs().submit('revalidate_category', category_id=cid))
@@ -0,0 +1,20 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from instrumentation import mark_long_poll
+from services.changes import ChangeService
+
+bp = Blueprint('changes', __name__, url_prefix='/api/changes')
+
+@bp.get('')
+def list_changes():
+    if request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream':
+        # EventSource resumes from the id of the last event it received
+        since = ChangeService.cursor_arg(request.headers.get('Last-Event-ID') or request.args.get('since'))
+        return Response(stream_with_context(ChangeService.stream(since)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    if request.args.get('wait'):
+        mark_long_poll()
+    return jsonify(ChangeService.list(request.args))
+
+@bp.get('/cursor')
+def current_change_cursor():
+    return jsonify(ChangeService.current_cursor())
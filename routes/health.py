@@ -0,0 +1,21 @@
+from flask import Blueprint, current_app, jsonify
+from schema_registry import get_registry
+
+bp = Blueprint('health', __name__)
+
+@bp.get('/')
+def root():
+    return jsonify({'status': 'ok'})
+
+@bp.get('/api/_stats/schema-cache')
+def schema_cache_stats():
+    return jsonify(get_registry().stats())
+
+@bp.get('/api/_stats/stats-cache')
+def stats_cache_stats():
+    return jsonify(current_app.extensions['stats_cache'].stats())
+
+@bp.get('/api/_stats/response-cache')
+def response_cache_stats():
+    cache = current_app.extensions['response_cache']
+    return jsonify(cache.stats() if cache is not None else {'enabled': False})
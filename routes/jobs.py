@@ -0,0 +1,12 @@
+from flask import Blueprint, jsonify
+from jobs import job_to_dict, require_job
+
+bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+def job_accepted(job):
+    # 202 response for an operation handed to the job queue
+    return jsonify(job_to_dict(job)), 202, {'Location': f'/api/jobs/{job.id}'}
+
+@bp.get('/<job_id>')
+def get_job(job_id):
+    return jsonify(job_to_dict(require_job(job_id)))
@@ -0,0 +1,94 @@
+import io
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+from concurrency import expected_version, versioned
+from database import category_key
+from http_cache import conditional_get
+from idempotency import idempotent
+from services.documents import DocumentService
+from services.exports import ExportService, MIMETYPES
+from services.imports import ImportService, DEFAULT_CHUNK_SIZE, FORMATS
+from services.products import ProductService, MAX_BATCH_SIZE
+from services.search import SearchService
+from services.stats import StatsService
+from utils import parse_id_list, parse_int_arg
+
+bp = Blueprint('products', __name__, url_prefix='/api/products')
+
+@bp.post('')
+@idempotent
+def create_product():
+    data = request.get_json(force=True)
+    return versioned(ProductService.create(data), 201)
+
+@bp.get('')
+@conditional_get('products', 'attribute_definitions')
+def list_products():
+    return jsonify(ProductService.list(request.args))
+
+@bp.post('/bulk')
+@idempotent
+def bulk_import_products():
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in FORMATS:
+        abort(400, f'Unsupported format. Allowed: {list(FORMATS)}')
+    chunk_size = parse_int_arg(request.args, 'chunk_size', DEFAULT_CHUNK_SIZE, minimum=1, maximum=10000)
+    # Stream the body line by line instead of buffering the whole upload
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    return jsonify(ImportService.run(lines, fmt, chunk_size))
+
+@bp.get('/export')
+def export_products_api():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        abort(400, f'Unsupported format. Allowed: {list(FORMATS)}')
+    category_id = parse_int_arg(request.args, 'category_id')
+    body = stream_with_context(ExportService.stream(fmt, category_id))
+    return Response(body, mimetype=MIMETYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename=products.{fmt}'
+    })
+
+@bp.get('/search')
+@conditional_get('products', 'attribute_definitions')
+def search_products():
+    return jsonify(SearchService.search(request.args))
+
+@bp.get('/facets')
+@conditional_get(lambda: category_key(request.args.get('category_id')))
+def product_facets():
+    return jsonify(StatsService.facets(request.args))
+
+@bp.get('/<int:pid>')
+@conditional_get('products', 'attribute_definitions')
+def get_product(pid):
+    if DocumentService.enabled():
+        # Single primary-key lookup, returned as stored
+        body = DocumentService.get(pid)
+        if body is not None:
+            return current_app.response_class(body, mimetype='application/json')
+    return jsonify(ProductService.get(pid))
+
+@bp.put('/<int:pid>')
+def update_product(pid):
+    data = request.get_json(force=True)
+    return versioned(ProductService.update(pid, data, expected_version()))
+
+@bp.post('/<int:pid>/attributes')
+def set_product_attributes(pid):
+    data = request.get_json(force=True)
+    return versioned(ProductService.set_attributes(pid, data.get('attributes', {}), expected_version()))
+
+@bp.post('/attributes')
+@idempotent
+def set_attributes_batch():
+    data = request.get_json(force=True)
+    return jsonify({'items': ProductService.set_attributes_batch(data.get('items'))})
+
+@bp.delete('/<int:pid>')
+def delete_product(pid):
+    ProductService.delete(pid, expected_version())
+    return '', 204
+
+@bp.delete('')
+def delete_products():
+    ids = parse_id_list(request.args, 'ids', MAX_BATCH_SIZE)
+    return jsonify(ProductService.delete_many(ids))
@@ -0,0 +1,15 @@
+from flask import Blueprint, render_template
+
+bp = Blueprint('ui', __name__)
+
+@bp.get('/categories')
+def categories_ui():
+    return render_template('categories.html')
+
+@bp.get('/attributes')
+def attributes_ui():
+    return render_template('attributes.html')
+
+@bp.get('/products')
+def products_ui():
+    return render_template('products.html')
@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from flask import abort, current_app
+from database import db, get_versions, primary_reads
+from utils import to_dict, build_validator
+
+# Counters bumped in the same transaction as every category and attribute write
+VERSION_KEYS = ('categories', 'attribute_definitions')
+
+class AttributeSchema:
+    # Read-only compiled view of an AttributeDefinition
+    __slots__ = ('id', 'category_id', 'name', 'data_type', 'is_required', 'is_unique',
+                 'unit', 'options', 'validate', 'row')
+
+    def __init__(self, attr):
+        self.id = attr.id
+        self.category_id = attr.category_id
+        self.name = attr.name
+        self.data_type = attr.data_type
+        self.is_required = attr.is_required
+        self.is_unique = attr.is_unique
+        self.unit = attr.unit
+        option_list = json.loads(attr.options_json or '[]') if attr.data_type == 'enum' else []
+        self.options = frozenset(option_list) if attr.data_type == 'enum' else None
+        self.validate = build_validator(attr.data_type, option_list)
+        self.row = to_dict(attr)
+
+class CategorySchema:
+    __slots__ = ('id', 'name', 'attributes', 'by_id')
+
+    def __init__(self, category, attrs):
+        self.id = category.id
+        self.name = category.name
+        compiled = [AttributeSchema(a) for a in sorted(attrs, key=lambda a: a.name)]
+        self.attributes = {a.name: a for a in compiled}
+        self.by_id = {a.id: a for a in compiled}
+
+    def attribute_rows(self):
+        return [dict(a.row) for a in self.attributes.values()]
+
+class SchemaRegistry:
+    def __init__(self, shared=True, check_interval=1.0):
+        self.shared = shared
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._schemas = {}
+        # Bumped on every local invalidation so loads racing a write are not cached
+        self._generation = 0
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, category_id):
+        # Returns the CategorySchema, or None when the category does not exist
+        self._sync_shared_version()
+        try:
+            schema = self._schemas[category_id]
+            self.hits += 1
+            return schema
+        except KeyError:
+            self.misses += 1
+        generation = self._generation
+        with primary_reads():
+            schema = self._load(category_id)
+        with self._lock:
+            if generation == self._generation:
+                self._schemas[category_id] = schema
+        return schema
+
+    def require(self, category_id):
+        schema = self.get(category_id)
+        if schema is None:
+            abort(404)
+        return schema
+
+    def preload(self):
+        # Compiles every category with two queries instead of one miss each; returns the count
+        from models import Category, AttributeDefinition
+        self._sync_shared_version()
+        generation = self._generation
+        attrs = {}
+        with primary_reads():
+            for attr in AttributeDefinition.query.all():
+                attrs.setdefault(attr.category_id, []).append(attr)
+            schemas = {c.id: CategorySchema(c, attrs.get(c.id, ())) for c in Category.query.all()}
+        with self._lock:
+            if generation == self._generation:
+                self._schemas.update(schemas)
+        return len(schemas)
+
+    def invalidate(self, category_id=None):
+        # Call after the write has been committed
+        with self._lock:
+            self._generation += 1
+            if category_id is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(category_id, None)
+            self.invalidations += 1
+
+    def sync(self):
+        # Checks the shared version now instead of after check_interval. Call before validating
+        # a write, or before serving schema data under an ETag read from the same counters
+        self._sync_shared_version(force=True)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'invalidations': self.invalidations,
+            'cached_categories': len(self._schemas),
+            'shared': self.shared,
+            'version': self._version
+        }
+
+    def _load(self, category_id):
+        from models import Category, AttributeDefinition
+        category = db.session.get(Category, category_id)
+        if category is None:
+            return None
+        attrs = AttributeDefinition.query.filter_by(category_id=category_id).all()
+        return CategorySchema(category, attrs)
+
+    def _sync_shared_version(self, force=False):
+        # Writes in any process bump the counters in the database; poll them at most every
+        # check_interval. Read from the primary: a lagging replica would bring back old schemas
+        if not self.shared:
+            return
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        with primary_reads():
+            version = tuple(v for v, _ in get_versions(VERSION_KEYS).values())
+        if version != self._version:
+            with self._lock:
+                if self._version is not None:
+                    self._generation += 1
+                    self._schemas.clear()
+                self._version = version
+
+def init_schema_registry(app):
+    app.extensions['schema_registry'] = SchemaRegistry(
+        shared=app.config.get('SCHEMA_CACHE_SHARED', True),
+        check_interval=app.config.get('SCHEMA_CACHE_CHECK_INTERVAL', 1.0)
+    )
+
+def get_registry():
+    return current_app.extensions['schema_registry']
@@ -0,0 +1,80 @@
+import operator
+from flask import abort
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# (model, fields) -> compiled row-to-dict function
+_serializers = {}
+
+def column_names(model):
+    return tuple(c.name for c in model.__table__.columns)
+
+def serializer_for(model, fields=None):
+    # Built once per model and projection; later calls are a dict lookup
+    key = (model, fields)
+    fn = _serializers.get(key)
+    if fn is None:
+        names = column_names(model)
+        if fields is not None:
+            names = tuple(n for n in names if n in fields)
+        getter = operator.attrgetter(*names)
+        if len(names) == 1:
+            name = names[0]
+            fn = lambda obj: {name: getter(obj)}
+        else:
+            fn = lambda obj: dict(zip(names, getter(obj)))
+        _serializers[key] = fn
+    return fn
+
+def parse_fields(args, model):
+    # ?fields=id,sku,price -> frozenset of column names, None when absent
+    raw = args.get('fields')
+    if not raw:
+        return None
+    fields = frozenset(f.strip() for f in raw.split(',') if f.strip())
+    known = column_names(model)
+    unknown = sorted(fields - set(known))
+    if unknown or not fields:
+        abort(400, f'Unknown fields: {unknown}. Allowed: {list(known)}')
+    return fields
+
+def projected_columns(model, fields=None, required=()):
+    # Table columns for a column-only select(): requested fields first (in table
+    # order), then any columns the caller needs internally but did not ask for
+    table = model.__table__
+    names = [n for n in column_names(model) if fields is None or n in fields]
+    extra = [n for n in required if n not in names]
+    return names, [table.c[n] for n in names + extra]
+
+def rows_to_dicts(names, rows):
+    # Rows from a column-only select(); zip stops at names, dropping trailing extras
+    return [dict(zip(names, row)) for row in rows]
+
+class OrjsonProvider(DefaultJSONProvider):
+    # Datetimes are passed back to DefaultJSONProvider.default so they keep Flask's format.
+    # Unlike it, non-ASCII is written as UTF-8 rather than \uXXXX escapes and integers beyond
+    # 64 bits raise TypeError, so it is only used when USE_ORJSON is set
+    def _options(self):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def init_json_provider(app):
+    if app.config.get('USE_ORJSON', False) and orjson is not None:
+        app.json = OrjsonProvider(app)
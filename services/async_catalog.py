@@ -0,0 +1,105 @@
+import json
+from flask import abort
+from sqlalchemy import select
+from database import fold_versions, versions_statement
+from models import AttributeDefinition, Category, Product, ProductDocument
+from serializers import parse_fields, projected_columns, rows_to_dicts
+from services.products import ProductService
+from services.search import SearchService
+from services.search_index import SearchIndexService
+from utils import parse_int_arg, to_dict
+
+class AsyncCatalogService:
+    # Catalog reads on an AsyncSession for the ASGI entry point. Statements, validation and
+    # response shapes come from the sync services; only the I/O differs
+    @staticmethod
+    async def versions(session, tables):
+        return fold_versions(tables, await session.execute(versions_statement(tables)))
+
+    @staticmethod
+    async def list_categories(session, args):
+        names, columns = projected_columns(Category, parse_fields(args, Category))
+        rows = (await session.execute(select(*columns).order_by(Category.name))).all()
+        return rows_to_dicts(names, rows)
+
+    @staticmethod
+    async def get_category(session, cid):
+        return to_dict(await AsyncCatalogService._get_or_404(session, Category, cid))
+
+    @staticmethod
+    async def list_attributes(session, cid):
+        await AsyncCatalogService._get_or_404(session, Category, cid)
+        attrs = await session.scalars(
+            select(AttributeDefinition).where(AttributeDefinition.category_id == cid).order_by(AttributeDefinition.name)
+        )
+        return [to_dict(attr) for attr in attrs]
+
+    @staticmethod
+    async def list_products(session, args, documents=False):
+        return await AsyncCatalogService._paginate(session, ProductService.filtered_statement(args), args, None, documents)
+
+    @staticmethod
+    async def search_products(session, args, search_backend, documents=False):
+        predicates = SearchService.parse_attribute_filters(args)
+        attrs = {}
+        if predicates:
+            attrs = await AsyncCatalogService._resolve_attributes(session, predicates, parse_int_arg(args, 'category_id'))
+        q = (args.get('q') or '').strip()
+        matches = SearchIndexService.match(q, search_backend) if q else None
+        stmt, rank = SearchService.statement(args, predicates, attrs, matches)
+        return await AsyncCatalogService._paginate(session, stmt, args, rank, documents)
+
+    @staticmethod
+    async def get_product(session, pid):
+        prod = await AsyncCatalogService._get_or_404(session, Product, pid)
+        data = to_dict(prod)
+        data['attributes'] = (await AsyncCatalogService._attributes_for(session, [pid]))[pid]
+        return data
+
+    @staticmethod
+    async def get_product_document(session, pid):
+        return await session.scalar(select(ProductDocument.body).where(ProductDocument.product_id == pid))
+
+    @staticmethod
+    async def _paginate(session, stmt, args, rank, documents):
+        names, limit, stmt = ProductService.page_statement(stmt, args, rank)
+        page, rows = ProductService.page_result(names, limit, (await session.execute(stmt)).all(), rank)
+        if ProductService.expands_attributes(args):
+            ids = [row.id for row in rows]
+            resolved = {}
+            if documents and ids:
+                docs = await session.execute(
+                    select(ProductDocument.product_id, ProductDocument.body).where(ProductDocument.product_id.in_(ids))
+                )
+                resolved = {pid: json.loads(body)['attributes'] for pid, body in docs}
+            missing = [pid for pid in ids if pid not in resolved]
+            resolved.update(await AsyncCatalogService._attributes_for(session, missing))
+            for item, row in zip(page['items'], rows):
+                item['attributes'] = resolved[row.id]
+        return page
+
+    @staticmethod
+    async def _attributes_for(session, product_ids):
+        if not product_ids:
+            return {}
+        rows = await session.execute(ProductService.attributes_statement(product_ids))
+        return ProductService.fold_attributes(product_ids, rows)
+
+    @staticmethod
+    async def _resolve_attributes(session, predicates, category_id):
+        # Same result as SearchService.resolve_attributes, read without the sync schema registry
+        stmt = select(AttributeDefinition).where(AttributeDefinition.name.in_(list(predicates)))
+        if category_id is not None:
+            await AsyncCatalogService._get_or_404(session, Category, category_id)
+            stmt = stmt.where(AttributeDefinition.category_id == category_id)
+        by_name = {}
+        for attr in await session.scalars(stmt):
+            by_name.setdefault(attr.name, []).append(attr)
+        return by_name
+
+    @staticmethod
+    async def _get_or_404(session, model, pk):
+        obj = await session.get(model, pk)
+        if obj is None:
+            abort(404)
+        return obj
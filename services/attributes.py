@@ -1,14 +1,28 @@
 
 import json
+from datetime import datetime
 from flask import abort
-from database import db
-from models import Category, AttributeDefinition
-from utils import to_dict, DATATYPES
+from sqlalchemy import delete, exists, func, select, update
+from concurrency import check_version
+from database import db, bump_category_versions, bump_version, id_chunks, unique_violation
+from jobs import enqueue, get_jobs, job_handler
+from models import AttributeDefinition, Category, Product, ProductAttributeValue, TYPED_VALUE_COLUMNS, VALUE_COLUMNS, typed_value
+from utils import to_dict, normalize_value_by_type, DATATYPES
+from schema_registry import AttributeSchema, get_registry
+from services.changes import ChangeService
+from services.documents import DocumentService, DEFAULT_CHUNK_SIZE as DOCUMENT_CHUNK_SIZE
+from services.products import DELETE_CHUNK_SIZE
+from services.search_index import SearchIndexService, SEARCHABLE_TYPES
+from services.stats import StatsService
+
+MIGRATE_CHUNK_SIZE = 1000
+# Invalid values listed in a job result; the count covers all of them
+MAX_REPORTED_INVALID = 100
 
 class AttributeService:
     @staticmethod
     def create(category_id, data):
-        Category.query.get_or_404(category_id)
+        get_registry().require(category_id)
         name = (data.get('name') or '').strip()
         dtype = (data.get('data_type') or '').strip()
         if not name:
@@ -29,28 +43,38 @@ class AttributeService:
                 abort(400, 'Enum attributes require a non-empty "options" list')
             attr.options_json = json.dumps(options)
         db.session.add(attr)
+        with unique_violation(f'Attribute {name} already exists in this category'):
+            db.session.flush()
+        bump_version('attribute_definitions')
+        bump_category_versions([category_id])
+        ChangeService.record('attribute', 'create', [(attr.id, category_id)])
         db.session.commit()
+        get_registry().invalidate(category_id)
         return to_dict(attr)
 
     @staticmethod
     def list(category_id):
-        Category.query.get_or_404(category_id)
-        attrs = AttributeDefinition.query.filter_by(category_id=category_id).order_by(AttributeDefinition.name).all()
-        return [to_dict(a) for a in attrs]
+        registry = get_registry()
+        registry.sync()
+        return registry.require(category_id).attribute_rows()
 
     @staticmethod
-    def update(category_id, attr_id, data):
-        Category.query.get_or_404(category_id)
+    def update(category_id, attr_id, data, expected_version=None):
+        get_registry().require(category_id)
         attr = AttributeDefinition.query.filter_by(id=attr_id, category_id=category_id).first_or_404()
+        check_version(attr, expected_version)
+        before = (attr.name, attr.data_type, attr.options_json)
         if 'name' in data:
             name = (data.get('name') or '').strip()
             if not name:
                 abort(400, 'Attribute name cannot be empty')
             attr.name = name
+        migrate = False
         if 'data_type' in data:
             dtype = (data.get('data_type') or '').strip()
             if dtype not in DATATYPES:
                 abort(400, f'Invalid data_type. Allowed: {sorted(DATATYPES)}')
+            migrate = VALUE_COLUMNS[dtype] != VALUE_COLUMNS[attr.data_type]
             attr.data_type = dtype
         if 'is_required' in data:
             attr.is_required = bool(data.get('is_required'))
@@ -63,18 +87,240 @@ class AttributeService:
             if not isinstance(options, list) or not options:
                 abort(400, 'Enum attributes require a non-empty "options" list')
             attr.options_json = json.dumps(options)
+        if attr.data_type == 'enum' and not attr.options_json:
+            abort(400, 'Enum attributes require a non-empty "options" list')
+        job = None
+        if migrate:
+            # Existing values stay in the old typed column until the job has moved them;
+            # it refreshes documents and the search index when done
+            job = enqueue('migrate_attribute_values', category_id=category_id, attr_id=attr_id)
+        elif (attr.name, attr.data_type, attr.options_json) != before:
+            # Only these show up in product documents and the search index; unit and the
+            # flags change nothing stored per product
+            searchable = {before[1], attr.data_type} & set(SEARCHABLE_TYPES)
+            job = AttributeService._enqueue_refresh(category_id, search=bool(searchable) and before[1] != attr.data_type)
+        with unique_violation(f'Attribute {attr.name} already exists in this category'):
+            db.session.flush()
+        if attr.data_type != before[1]:
+            # Stats count the values in the column of the current data_type
+            StatsService.invalidate([category_id])
+        bump_version('attribute_definitions')
+        bump_version('products')
+        bump_category_versions([category_id])
+        ChangeService.record('attribute', 'update', [(attr_id, category_id)])
         db.session.commit()
-        return to_dict(attr)
+        get_registry().invalidate(category_id)
+        result = to_dict(attr)
+        if job is not None:
+            get_jobs().notify()
+            result['migration_job' if migrate else 'refresh_job'] = job.id
+        return result
 
     @staticmethod
-    def delete(category_id, attr_id):
-        Category.query.get_or_404(category_id)
+    def delete(category_id, attr_id, expected_version=None):
+        get_registry().require(category_id)
         attr = AttributeDefinition.query.filter_by(id=attr_id, category_id=category_id).first_or_404()
+        check_version(attr, expected_version)
+        job = AttributeService._enqueue_refresh(category_id, search=attr.data_type in SEARCHABLE_TYPES)
         db.session.delete(attr)
+        db.session.flush()
+        bump_version('attribute_definitions')
+        bump_version('products')
+        bump_category_versions([category_id])
+        ChangeService.record('attribute', 'delete', [(attr_id, category_id)])
+        db.session.commit()
+        get_registry().invalidate(category_id)
+        if job is not None:
+            get_jobs().notify()
+
+    @staticmethod
+    def _enqueue_refresh(category_id, search):
+        # Queues refresh_category_views for whichever read models are on; None when nothing to do
+        documents = DocumentService.enabled()
+        search = search and SearchIndexService.backend() is not None
+        if not documents and not search:
+            return None
+        return enqueue('refresh_category_views', category_id=category_id, documents=documents, search=search)
+
+    @staticmethod
+    @job_handler('refresh_category_views')
+    def refresh_views(category_id, documents=True, search=True, chunk_size=DOCUMENT_CHUNK_SIZE, job=None):
+        # Rewrites product documents and search rows of a category after an attribute rename,
+        # type change or delete, one commit per chunk of products
+        criteria = Product.category_id == category_id
+        if job is not None:
+            job.total = db.session.scalar(select(func.count(Product.id)).where(criteria))
+        refreshed = 0
+        for ids in id_chunks(Product.id, chunk_size, criteria):
+            if documents:
+                DocumentService.refresh(ids)
+            if search:
+                SearchIndexService.refresh(ids)
+            # Documents are served under the products ETag, so it moves with every chunk
+            bump_version('products')
+            if job is not None:
+                job.advance(len(ids))
+            db.session.commit()
+            refreshed += len(ids)
+        return {'refreshed': refreshed}
+
+    @staticmethod
+    @job_handler('purge_attribute')
+    def purge(category_id, attr_id, chunk_size=DELETE_CHUNK_SIZE, job=None):
+        # For attributes with very many values: delete the values in committed chunks,
+        # then the definition itself through delete()
+        get_registry().require(category_id)
+        AttributeDefinition.query.filter_by(id=attr_id, category_id=category_id).first_or_404()
+        criteria = ProductAttributeValue.attribute_definition_id == attr_id
+        if job is not None:
+            job.total = db.session.scalar(select(func.count(ProductAttributeValue.id)).where(criteria))
+        deleted = 0
+        for ids in id_chunks(ProductAttributeValue.id, chunk_size, criteria):
+            product_ids = db.session.scalars(
+                select(ProductAttributeValue.product_id).where(ProductAttributeValue.id.in_(ids))
+            ).all()
+            db.session.execute(
+                delete(ProductAttributeValue).where(ProductAttributeValue.id.in_(ids)),
+                execution_options={'synchronize_session': False}
+            )
+            StatsService.invalidate([category_id])
+            bump_version('products')
+            bump_category_versions([category_id])
+            ChangeService.record('product', 'update', [(pid, category_id) for pid in product_ids])
+            if job is not None:
+                job.advance(len(ids))
+            db.session.commit()
+            deleted += len(ids)
+        AttributeService.delete(category_id, attr_id)
+        return {'deleted_values': deleted}
+
+    @staticmethod
+    @job_handler('migrate_attribute_values')
+    def migrate_values(category_id, attr_id, chunk_size=MIGRATE_CHUNK_SIZE, job=None):
+        # Moves values stored under an earlier data_type into the column of the current one,
+        # converted as if they were submitted again. Values that do not convert stay where they are
+        attr = AttributeDefinition.query.filter_by(id=attr_id, category_id=category_id).first_or_404()
+        schema = AttributeSchema(attr)
+        criteria = (
+            ProductAttributeValue.attribute_definition_id == attr_id,
+            getattr(ProductAttributeValue, VALUE_COLUMNS[schema.data_type]).is_(None)
+        )
+        if job is not None:
+            job.total = db.session.scalar(select(func.count(ProductAttributeValue.id)).where(*criteria))
+        migrated = 0
+        invalid = 0
+        reported = []
+        for ids in id_chunks(ProductAttributeValue.id, chunk_size, *criteria):
+            now = datetime.utcnow()
+            updates = []
+            changed = []
+            for row in db.session.execute(AttributeService._values_statement(ids)):
+                try:
+                    value = schema.validate(_stored_value(row, schema.data_type))
+                except (TypeError, ValueError) as e:
+                    invalid += 1
+                    if len(reported) < MAX_REPORTED_INVALID:
+                        reported.append(_invalid_value(row, schema, e))
+                    continue
+                updates.append({'id': row.id, 'updated_at': now, **ProductAttributeValue.typed_columns(schema.data_type, value)})
+                changed.append((row.product_id, category_id))
+            if updates:
+                # Bulk UPDATE by primary key, one executemany per chunk
+                db.session.execute(update(ProductAttributeValue), updates)
+                migrated += len(updates)
+                StatsService.invalidate([category_id])
+            bump_version('products')
+            bump_category_versions([category_id])
+            ChangeService.record('product', 'update', changed)
+            if job is not None:
+                job.advance(len(ids))
+            db.session.commit()
+        DocumentService.refresh_category(category_id)
+        SearchIndexService.refresh_category(category_id)
+        bump_version('products')
         db.session.commit()
+        return {'migrated': migrated, 'invalid': invalid, 'invalid_values': reported}
+
+    @staticmethod
+    @job_handler('revalidate_category')
+    def revalidate_category(category_id, chunk_size=MIGRATE_CHUNK_SIZE, job=None):
+        # Checks every stored value of the category against the current definitions, and
+        # counts products missing required attributes. Reports only; nothing is changed
+        Category.query.get_or_404(category_id)
+        schemas = {a.id: AttributeSchema(a) for a in AttributeDefinition.query.filter_by(category_id=category_id)}
+        criteria = ProductAttributeValue.attribute_definition_id.in_(list(schemas))
+        if job is not None:
+            job.total = db.session.scalar(select(func.count(ProductAttributeValue.id)).where(criteria))
+        checked = 0
+        invalid = 0
+        reported = []
+        for ids in id_chunks(ProductAttributeValue.id, chunk_size, criteria):
+            for row in db.session.execute(AttributeService._values_statement(ids)):
+                schema = schemas[row.attribute_definition_id]
+                try:
+                    value = typed_value(schema.data_type, row)
+                    if value is None:
+                        raise ValueError(f'no {schema.data_type} value stored')
+                    schema.validate(value)
+                except (TypeError, ValueError) as e:
+                    invalid += 1
+                    if len(reported) < MAX_REPORTED_INVALID:
+                        reported.append(_invalid_value(row, schema, e))
+            checked += len(ids)
+            if job is not None:
+                job.advance(len(ids))
+                db.session.commit()
+        missing_required = {}
+        for schema in schemas.values():
+            if not schema.is_required:
+                continue
+            missing = db.session.scalar(
+                select(func.count(Product.id)).where(
+                    Product.category_id == category_id,
+                    ~exists().where(
+                        ProductAttributeValue.product_id == Product.id,
+                        ProductAttributeValue.attribute_definition_id == schema.id
+                    )
+                )
+            )
+            if missing:
+                missing_required[schema.name] = missing
+        return {
+            'checked': checked,
+            'invalid': invalid,
+            'invalid_values': reported,
+            'missing_required': missing_required
+        }
+
+    @staticmethod
+    def _values_statement(ids):
+        return select(
+            ProductAttributeValue.id,
+            ProductAttributeValue.product_id,
+            ProductAttributeValue.attribute_definition_id,
+            *[getattr(ProductAttributeValue, column) for column in TYPED_VALUE_COLUMNS]
+        ).where(ProductAttributeValue.id.in_(ids)).order_by(ProductAttributeValue.id)
 
     @staticmethod
     def validate_value(attr, value):
         # Returns normalized value per data type, raises 400 on invalid
-        from utils import normalize_value_by_type
         return normalize_value_by_type(attr, value)
+
+def _stored_value(row, data_type):
+    # The value in whichever typed column holds it. JSON text is kept as is for string targets
+    for column in TYPED_VALUE_COLUMNS:
+        value = getattr(row, column)
+        if value is None:
+            continue
+        if column == 'json_value' and data_type not in ('string', 'enum'):
+            return json.loads(value)
+        return value
+    raise ValueError('no value stored')
+
+def _invalid_value(row, schema, error):
+    return {
+        'product_id': row.product_id,
+        'attribute': schema.name,
+        'value': next((getattr(row, c) for c in TYPED_VALUE_COLUMNS if getattr(row, c) is not None), None),
+        'error': str(error)
+    }
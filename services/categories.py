@@ -1,8 +1,12 @@
 
 from flask import abort
-from database import db
-from models import Category
+from concurrency import check_version
+from database import db, bump_version, unique_violation
+from models import Category, Product
+from services.changes import ChangeService
 from utils import to_dict
+from schema_registry import get_registry
+from serializers import parse_fields, projected_columns, rows_to_dicts
 
 class CategoryService:
     @staticmethod
@@ -12,12 +16,19 @@ class CategoryService:
             abort(400, 'Category name is required')
         cat = Category(name=name, description=data.get('description'))
         db.session.add(cat)
+        with unique_violation(f'Category {name} already exists'):
+            db.session.flush()
+        bump_version('categories')
+        ChangeService.record('category', 'create', [(cat.id, cat.id)])
         db.session.commit()
+        get_registry().invalidate(cat.id)
         return to_dict(cat)
 
     @staticmethod
-    def list():
-        return [to_dict(c) for c in Category.query.order_by(Category.name).all()]
+    def list(args=None):
+        names, columns = projected_columns(Category, parse_fields(args or {}, Category))
+        rows = db.session.execute(db.select(*columns).order_by(Category.name)).all()
+        return rows_to_dicts(names, rows)
 
     @staticmethod
     def get(cid):
@@ -25,8 +36,9 @@ class CategoryService:
         return to_dict(cat)
 
     @staticmethod
-    def update(cid, data):
+    def update(cid, data, expected_version=None):
         cat = Category.query.get_or_404(cid)
+        check_version(cat, expected_version)
         if 'name' in data:
             name = (data.get('name') or '').strip()
             if not name:
@@ -34,11 +46,23 @@ class CategoryService:
             cat.name = name
         if 'description' in data:
             cat.description = data.get('description')
+        with unique_violation(f'Category {cat.name} already exists'):
+            db.session.flush()
+        bump_version('categories')
+        ChangeService.record('category', 'update', [(cid, cid)])
         db.session.commit()
+        get_registry().invalidate(cid)
         return to_dict(cat)
 
     @staticmethod
-    def delete(cid):
+    def delete(cid, expected_version=None):
         cat = Category.query.get_or_404(cid)
+        check_version(cat, expected_version)
+        if db.session.query(Product.query.filter_by(category_id=cid).exists()).scalar():
+            abort(409, 'Category still has products')
         db.session.delete(cat)
+        bump_version('categories')
+        bump_version('attribute_definitions')
+        ChangeService.record('category', 'delete', [(cid, cid)])
         db.session.commit()
+        get_registry().invalidate(cid)
@@ -0,0 +1,152 @@
+import time
+from datetime import datetime
+from flask import abort, current_app
+from sqlalchemy import delete, exists, func, insert, select
+from sqlalchemy.orm import aliased
+from database import db, bump_version, get_version, id_chunks, upsert
+from models import CacheVersion, ChangeLogEntry
+from utils import parse_int_arg
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Longest ?wait= of a long-poll, in seconds
+MAX_WAIT = 30
+COMPACT_CHUNK_SIZE = 1000
+# Counter locked by every writer of the log, and the highest id removed by retention
+LOG_COUNTER = 'change_log'
+WATERMARK = 'change_log_expired'
+
+class ChangeService:
+    @staticmethod
+    def record(entity, op, items):
+        # items: (entity id, category id) pairs. Call last before the commit: bumping the counter
+        # locks it until then, so concurrent writers get their ids in commit order and a consumer
+        # never misses an entry committed below a cursor it has already passed
+        rows = [{'entity': entity, 'entity_id': entity_id, 'op': op, 'category_id': category_id}
+                for entity_id, category_id in items]
+        if not rows:
+            return
+        bump_version(LOG_COUNTER)
+        db.session.execute(insert(ChangeLogEntry), rows)
+
+    @staticmethod
+    def list(args):
+        since = ChangeService.cursor_arg(args.get('since'))
+        limit = parse_int_arg(args, 'limit', DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+        wait = parse_int_arg(args, 'wait', 0, minimum=0, maximum=MAX_WAIT)
+        # Long-poll: hold an empty answer until something changes or wait seconds pass
+        deadline = time.monotonic() + wait
+        while True:
+            items, has_more = ChangeService.page(since, limit)
+            if items or time.monotonic() >= deadline:
+                break
+            ChangeService._next_poll()
+        return {
+            'items': items,
+            'next_cursor': items[-1]['id'] if items else since,
+            'has_more': has_more
+        }
+
+    @staticmethod
+    def stream(since):
+        # Server-Sent Events: every entry after since, then new ones as they are committed.
+        # The stream ends after CHANGES_STREAM_SECONDS; EventSource reconnects with Last-Event-ID
+        config = current_app.config
+        poll_interval = config.get('CHANGES_POLL_INTERVAL', 0.5)
+        keepalive = config.get('CHANGES_KEEPALIVE_SECONDS', 15)
+        ends = time.monotonic() + config.get('CHANGES_STREAM_SECONDS', 300)
+        dumps = current_app.json.dumps
+        cursor = since
+        sent_at = time.monotonic()
+        while time.monotonic() < ends:
+            items, has_more = ChangeService.page(cursor, MAX_LIMIT)
+            if items:
+                yield ''.join(f'id: {item["id"]}\nevent: change\ndata: {dumps(item)}\n\n' for item in items)
+                cursor = items[-1]['id']
+                sent_at = time.monotonic()
+                if has_more:
+                    continue
+            elif time.monotonic() - sent_at >= keepalive:
+                # Comment line: keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                sent_at = time.monotonic()
+            ChangeService._next_poll(poll_interval)
+
+    @staticmethod
+    def cursor_arg(raw):
+        # Cursor from ?since= or Last-Event-ID; 410 once entries after it have been expired
+        try:
+            since = int(raw or 0)
+        except ValueError:
+            abort(400, 'since must be a change id')
+        if since < 0:
+            abort(400, 'since must be a change id')
+        expired = get_version(WATERMARK)
+        if since < expired:
+            abort(410, f'Changes up to {expired} have expired; resync and continue from GET /api/changes/cursor')
+        return since
+
+    @staticmethod
+    def current_cursor():
+        # Cursor to continue from after a full resync: the latest change id
+        latest = db.session.scalar(select(func.max(ChangeLogEntry.id)))
+        return {'cursor': max(latest or 0, get_version(WATERMARK))}
+
+    @staticmethod
+    def page(since, limit):
+        # -> (entries after since in id order, whether more follow). A primary key range scan
+        rows = db.session.execute(
+            select(ChangeLogEntry.id, ChangeLogEntry.entity, ChangeLogEntry.entity_id, ChangeLogEntry.op,
+                   ChangeLogEntry.category_id, ChangeLogEntry.created_at)
+            .where(ChangeLogEntry.id > since)
+            .order_by(ChangeLogEntry.id)
+            .limit(limit + 1)
+        ).all()
+        return [row._asdict() for row in rows[:limit]], len(rows) > limit
+
+    @staticmethod
+    def _next_poll(interval=None):
+        # Ends the read transaction so the next query sees changes committed meanwhile
+        db.session.rollback()
+        time.sleep(interval if interval is not None else current_app.config.get('CHANGES_POLL_INTERVAL', 0.5))
+
+    @staticmethod
+    def compact(compact_after, retention, chunk_size=COMPACT_CHUNK_SIZE):
+        # Entries older than compact_after are dropped when a later entry exists for the same
+        # entity: every consumer still reaches that later one, so no cursor is affected.
+        # Entries older than retention are dropped outright and consumers behind them get 410
+        now = datetime.utcnow()
+        superseded = 0
+        boundary = ChangeService._last_id_before(now - compact_after)
+        if boundary:
+            newer = aliased(ChangeLogEntry)
+            for ids in id_chunks(ChangeLogEntry.id, chunk_size, ChangeLogEntry.id <= boundary, exists().where(
+                newer.entity == ChangeLogEntry.entity,
+                newer.entity_id == ChangeLogEntry.entity_id,
+                newer.id > ChangeLogEntry.id
+            )):
+                db.session.execute(delete(ChangeLogEntry).where(ChangeLogEntry.id.in_(ids)),
+                                   execution_options={'synchronize_session': False})
+                db.session.commit()
+                superseded += len(ids)
+
+        expired = 0
+        boundary = ChangeService._last_id_before(now - retention)
+        # The newest entry is kept, so the next id never falls back to one a consumer has seen
+        latest = db.session.scalar(select(func.max(ChangeLogEntry.id)))
+        if boundary and boundary == latest:
+            boundary -= 1
+        if boundary:
+            for ids in id_chunks(ChangeLogEntry.id, chunk_size, ChangeLogEntry.id <= boundary):
+                db.session.execute(delete(ChangeLogEntry).where(ChangeLogEntry.id.in_(ids)),
+                                   execution_options={'synchronize_session': False})
+                # Committed with the delete: a consumer either still finds the entries or gets 410
+                upsert(CacheVersion.__table__, [{'name': WATERMARK, 'version': ids[-1], 'updated_at': now}],
+                       ['name'], ['version', 'updated_at'])
+                db.session.commit()
+                expired += len(ids)
+        return {'superseded': superseded, 'expired': expired}
+
+    @staticmethod
+    def _last_id_before(cutoff):
+        return db.session.scalar(select(func.max(ChangeLogEntry.id)).where(ChangeLogEntry.created_at < cutoff))
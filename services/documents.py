@@ -0,0 +1,80 @@
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, select
+from database import db, id_chunks, upsert
+from models import Product, ProductDocument
+from serializers import projected_columns, rows_to_dicts
+
+DEFAULT_CHUNK_SIZE = 500
+
+class DocumentService:
+    @staticmethod
+    def enabled():
+        return current_app.config.get('PRODUCT_DOCUMENTS', False)
+
+    @staticmethod
+    def get(pid):
+        # Serialized product JSON, or None when no document exists
+        return db.session.scalar(select(ProductDocument.body).where(ProductDocument.product_id == pid))
+
+    @staticmethod
+    def attributes_for(product_ids):
+        # {product id: attributes} for the products that have a document
+        rows = db.session.execute(
+            select(ProductDocument.product_id, ProductDocument.body)
+            .where(ProductDocument.product_id.in_(product_ids))
+        )
+        return {pid: json.loads(body)['attributes'] for pid, body in rows}
+
+    @staticmethod
+    def refresh(product_ids):
+        # Rewrites the documents of product_ids inside the caller's transaction
+        if not DocumentService.enabled() or not product_ids:
+            return
+        DocumentService._write(list(set(product_ids)))
+
+    @staticmethod
+    def refresh_category(category_id, chunk_size=DEFAULT_CHUNK_SIZE):
+        if not DocumentService.enabled():
+            return
+        for ids in id_chunks(Product.id, chunk_size, Product.category_id == category_id):
+            DocumentService._write(ids)
+
+    @staticmethod
+    def remove(product_ids):
+        if not DocumentService.enabled() or not product_ids:
+            return
+        db.session.execute(delete(ProductDocument).where(ProductDocument.product_id.in_(product_ids)))
+
+    @staticmethod
+    def rebuild(chunk_size=DEFAULT_CHUNK_SIZE):
+        # Full rebuild, one commit per chunk; returns the number of documents written
+        total = 0
+        for ids in id_chunks(Product.id, chunk_size):
+            DocumentService._write(ids)
+            db.session.commit()
+            total += len(ids)
+        db.session.execute(delete(ProductDocument).where(
+            ProductDocument.product_id.not_in(select(Product.id))
+        ))
+        db.session.commit()
+        return total
+
+    @staticmethod
+    def _write(product_ids):
+        from services.products import ProductService
+        db.session.flush()
+        names, columns = projected_columns(Product)
+        products = rows_to_dicts(names, db.session.execute(select(*columns).where(Product.id.in_(product_ids))))
+        resolved = ProductService._attributes_for([p['id'] for p in products])
+        now = datetime.utcnow()
+        rows = []
+        for product in products:
+            product['attributes'] = resolved[product['id']]
+            # Encoded exactly as the API would encode it, so reads can return it verbatim
+            rows.append({'product_id': product['id'], 'body': current_app.json.dumps(product), 'updated_at': now})
+        upsert(ProductDocument.__table__, rows, ['product_id'], ['body', 'updated_at'])
+        missing = set(product_ids) - {p['id'] for p in products}
+        if missing:
+            db.session.execute(delete(ProductDocument).where(ProductDocument.product_id.in_(missing)))
@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from database import db
+from models import AttributeDefinition, Product, ProductAttributeValue, typed_value
+
+FORMATS = ('ndjson', 'csv')
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+PRODUCT_COLUMNS = ('id', 'sku', 'name', 'category_id', 'description', 'price', 'currency', 'created_at', 'updated_at')
+DEFAULT_BATCH_SIZE = 1000
+# Records buffered into one chunk of the streamed response
+RECORDS_PER_CHUNK = 200
+
+class ExportService:
+    @staticmethod
+    def iter_records(category_id=None, batch_size=DEFAULT_BATCH_SIZE):
+        # One ordered pass over products LEFT JOIN values, pivoted one product at a time
+        pav = ProductAttributeValue
+        stmt = (
+            select(
+                *(getattr(Product, c) for c in PRODUCT_COLUMNS),
+                AttributeDefinition.name.label('attr_name'),
+                AttributeDefinition.data_type,
+                pav.string_value, pav.int_value, pav.decimal_value,
+                pav.bool_value, pav.date_value, pav.json_value
+            )
+            .outerjoin(pav, pav.product_id == Product.id)
+            .outerjoin(AttributeDefinition, AttributeDefinition.id == pav.attribute_definition_id)
+            .order_by(Product.id)
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        if category_id is not None:
+            stmt = stmt.where(Product.category_id == category_id)
+        current = None
+        for row in db.session.execute(stmt):
+            if current is None or current['id'] != row.id:
+                if current is not None:
+                    yield current
+                current = {c: getattr(row, c) for c in PRODUCT_COLUMNS}
+                current['created_at'] = row.created_at.isoformat() if row.created_at else None
+                current['updated_at'] = row.updated_at.isoformat() if row.updated_at else None
+                current['attributes'] = {}
+            if row.attr_name is not None:
+                current['attributes'][row.attr_name] = typed_value(row.data_type, row)
+        if current is not None:
+            yield current
+
+    @staticmethod
+    def stream(fmt='ndjson', category_id=None):
+        if fmt not in FORMATS:
+            raise ValueError(f'Unsupported format. Allowed: {list(FORMATS)}')
+        records = ExportService.iter_records(category_id)
+        if fmt == 'csv':
+            return ExportService._stream_csv(records, category_id)
+        return ExportService._stream_ndjson(records)
+
+    @staticmethod
+    def _stream_ndjson(records):
+        buf = []
+        for record in records:
+            buf.append(json.dumps(record))
+            if len(buf) >= RECORDS_PER_CHUNK:
+                yield '\n'.join(buf) + '\n'
+                buf = []
+        if buf:
+            yield '\n'.join(buf) + '\n'
+
+    @staticmethod
+    def _stream_csv(records, category_id=None):
+        # Columns match the bulk import CSV layout so an export can be re-imported
+        names = select(AttributeDefinition.name).distinct().order_by(AttributeDefinition.name)
+        if category_id is not None:
+            names = names.where(AttributeDefinition.category_id == category_id)
+        attr_names = list(db.session.scalars(names))
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(list(PRODUCT_COLUMNS) + [f'attr.{n}' for n in attr_names])
+        count = 0
+        for record in records:
+            attrs = record['attributes']
+            writer.writerow(
+                [record[c] for c in PRODUCT_COLUMNS] +
+                [ExportService._csv_value(attrs.get(n)) for n in attr_names]
+            )
+            count += 1
+            if count % RECORDS_PER_CHUNK == 0:
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+        if out.tell():
+            yield out.getvalue()
+
+    @staticmethod
+    def _csv_value(value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return value
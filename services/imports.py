@@ -0,0 +1,244 @@
+import csv
+import json
+from datetime import datetime
+from sqlalchemy import delete, select
+from database import db, upsert, bump_category_versions, bump_version
+from models import AttributeDefinition, Product, ProductAttributeValue, TYPED_VALUE_COLUMNS
+from schema_registry import get_registry
+from services.changes import ChangeService
+from services.documents import DocumentService
+from services.search_index import SearchIndexService
+from services.stats import StatsService
+from utils import coerce_value
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ('ndjson', 'csv')
+PRODUCT_FIELDS = ('name', 'sku', 'category_id', 'description', 'price', 'currency')
+# Left unchanged on existing products when a row does not have them
+OPTIONAL_FIELDS = ('description', 'price', 'currency')
+
+class RowError(Exception):
+    pass
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_no, sku, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_no, 'sku': sku, 'error': message})
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+class ImportService:
+    @staticmethod
+    def run(lines, fmt='ndjson', chunk_size=DEFAULT_CHUNK_SIZE):
+        # lines: any iterable of text lines (file object, request stream wrapper)
+        if fmt not in FORMATS:
+            raise ValueError(f'Unsupported format. Allowed: {list(FORMATS)}')
+        report = ImportReport()
+        schemas = {}
+        chunk = []
+        for row_no, record in ImportService._records(lines, fmt):
+            report.processed += 1
+            if isinstance(record, RowError):
+                report.add_error(row_no, None, str(record))
+                continue
+            chunk.append((row_no, record))
+            if len(chunk) >= chunk_size:
+                ImportService._import_chunk(chunk, schemas, report)
+                chunk = []
+        if chunk:
+            ImportService._import_chunk(chunk, schemas, report)
+        return report.to_dict()
+
+    @staticmethod
+    def _records(lines, fmt):
+        if fmt == 'csv':
+            for row_no, row in enumerate(csv.DictReader(lines), start=1):
+                record = {k: (v if v != '' else None) for k, v in row.items() if k in PRODUCT_FIELDS}
+                record['attributes'] = {
+                    k[len('attr.'):]: v for k, v in row.items()
+                    if k and k.startswith('attr.') and v not in (None, '')
+                }
+                yield row_no, record
+            return
+        row_no = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            row_no += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_no, RowError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(record, dict):
+                yield row_no, RowError('Each line must be a JSON object')
+                continue
+            yield row_no, record
+
+    @staticmethod
+    def _load_schemas(category_ids, schemas):
+        # category_id -> {attribute name: AttributeSchema}, None for unknown categories
+        registry = get_registry()
+        registry.sync()
+        for cid in category_ids:
+            if cid not in schemas:
+                schema = registry.get(cid)
+                schemas[cid] = schema.attributes if schema else None
+
+    @staticmethod
+    def _validate(record, schemas):
+        name = str(record.get('name') or '').strip()
+        sku = str(record.get('sku') or '').strip()
+        if not name or not sku or not record.get('category_id'):
+            raise RowError('name, sku, category_id are required')
+        try:
+            category_id = int(record['category_id'])
+            price = float(record['price']) if record.get('price') not in (None, '') else None
+        except (TypeError, ValueError):
+            raise RowError('category_id must be an integer and price a number')
+        schema = schemas.get(category_id)
+        if schema is None:
+            raise RowError(f'Unknown category_id: {category_id}')
+        attributes = record.get('attributes') or {}
+        if not isinstance(attributes, dict):
+            raise RowError('attributes must be an object')
+        values = []
+        for attr_name, raw in attributes.items():
+            attr = schema.get(attr_name)
+            if not attr:
+                raise RowError(f'Unknown attribute for this category: {attr_name}')
+            try:
+                values.append((attr, coerce_value(attr, raw)))
+            except Exception as e:
+                raise RowError(f'Invalid value for attribute {attr.name} ({attr.data_type}): {e}')
+        product = {'name': name, 'sku': sku, 'category_id': category_id}
+        for field in OPTIONAL_FIELDS:
+            if field in record:
+                product[field] = price if field == 'price' else record[field]
+        return product, values
+
+    @staticmethod
+    def _import_chunk(chunk, schemas, report):
+        category_ids = set()
+        for _, record in chunk:
+            try:
+                category_ids.add(int(record.get('category_id')))
+            except (TypeError, ValueError):
+                pass
+        ImportService._load_schemas(category_ids, schemas)
+
+        # Validate the whole chunk first; the last occurrence of a SKU wins and earlier ones
+        # are reported, as they are not written
+        valid = {}
+        for row_no, record in chunk:
+            try:
+                product, values = ImportService._validate(record, schemas)
+            except RowError as e:
+                report.add_error(row_no, record.get('sku'), str(e))
+                continue
+            earlier = valid.pop(product['sku'], None)
+            if earlier is not None:
+                report.add_error(earlier[0], product['sku'], f'Superseded by row {row_no} with the same sku')
+            valid[product['sku']] = (row_no, product, values)
+        if not valid:
+            return
+        try:
+            ImportService._write(list(valid.values()))
+            db.session.commit()
+            report.imported += len(valid)
+        except Exception as e:
+            db.session.rollback()
+            if len(valid) == 1:
+                row_no, product, _ = next(iter(valid.values()))
+                report.add_error(row_no, product['sku'], f'Database error: {e.__class__.__name__}')
+                return
+            # Isolate the offending rows instead of failing the whole chunk
+            for entry in valid.values():
+                ImportService._import_chunk_entry(entry, report)
+
+    @staticmethod
+    def _import_chunk_entry(entry, report):
+        row_no, product, _ = entry
+        try:
+            ImportService._write([entry])
+            db.session.commit()
+            report.imported += 1
+        except Exception as e:
+            db.session.rollback()
+            report.add_error(row_no, product['sku'], f'Database error: {e.__class__.__name__}')
+
+    @staticmethod
+    def _write(entries):
+        now = datetime.utcnow()
+        product_rows = [dict(product, created_at=now, updated_at=now) for _, product, _ in entries]
+        skus = [row['sku'] for row in product_rows]
+        # Category by sku of the products that exist already. They may move to another category,
+        # and then both categories change
+        existing = dict(db.session.execute(select(Product.sku, Product.category_id).where(Product.sku.in_(skus))).all())
+        categories = {row['category_id'] for row in product_rows}.union(existing.values())
+        # One upsert per set of columns present, so existing products keep the fields a row leaves out
+        groups = {}
+        for row in product_rows:
+            groups.setdefault(tuple(f for f in OPTIONAL_FIELDS if f in row), []).append(row)
+        for fields, rows in groups.items():
+            upsert(
+                Product.__table__, rows, ['sku'],
+                ['name', 'category_id', *fields, 'updated_at'],
+                increment_columns=['version']
+            )
+        ids = dict(db.session.execute(select(Product.sku, Product.id).where(Product.sku.in_(skus))).all())
+        # Products moved to another category drop the values of the old category's attributes
+        moved = {}
+        for row in product_rows:
+            if row['sku'] in existing and existing[row['sku']] != row['category_id']:
+                moved.setdefault(row['category_id'], []).append(ids[row['sku']])
+        for category_id, product_ids in moved.items():
+            db.session.execute(
+                delete(ProductAttributeValue).where(
+                    ProductAttributeValue.product_id.in_(product_ids),
+                    ProductAttributeValue.attribute_definition_id.not_in(
+                        select(AttributeDefinition.id).where(AttributeDefinition.category_id == category_id)
+                    )
+                ),
+                execution_options={'synchronize_session': False}
+            )
+        value_rows = []
+        for _, product, values in entries:
+            for attr, value in values:
+                row = ProductAttributeValue.typed_columns(attr.data_type, value)
+                row.update(
+                    product_id=ids[product['sku']],
+                    attribute_definition_id=attr.id,
+                    created_at=now,
+                    updated_at=now
+                )
+                value_rows.append(row)
+        upsert(
+            ProductAttributeValue.__table__, value_rows, ['product_id', 'attribute_definition_id'],
+            list(TYPED_VALUE_COLUMNS) + ['updated_at']
+        )
+        DocumentService.refresh(list(ids.values()))
+        SearchIndexService.refresh(list(ids.values()))
+        # Recomputed once on the next read rather than row by row here
+        StatsService.invalidate(categories)
+        bump_version('products')
+        bump_category_versions(categories)
+        for op, rows in (('create', [r for r in product_rows if r['sku'] not in existing]),
+                         ('update', [r for r in product_rows if r['sku'] in existing])):
+            ChangeService.record('product', op, [(ids[r['sku']], r['category_id']) for r in rows])
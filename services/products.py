@@ -1,8 +1,27 @@
 
+from datetime import datetime
+from types import SimpleNamespace
 from flask import abort
-from database import db
-from models import Category, Product, AttributeDefinition, ProductAttributeValue
-from utils import to_dict, normalize_value_by_type
+from sqlalchemy import and_, delete, func, or_, select
+from concurrency import check_version
+from database import db, id_chunks, unique_violation, upsert, bump_category_versions, bump_version
+from jobs import job_handler
+from models import AttributeDefinition, Category, Product, ProductAttributeValue, TYPED_VALUE_COLUMNS, typed_value
+from schema_registry import get_registry
+from serializers import parse_fields, projected_columns, rows_to_dicts
+from services.changes import ChangeService
+from services.documents import DocumentService
+from services.search_index import SearchIndexService, SEARCHABLE_TYPES
+from services.stats import StatsDelta
+from utils import (to_dict, normalize_value_by_type, encode_cursor, decode_cursor, encode_score_cursor,
+                   decode_score_cursor, escape_like, parse_int_arg, parse_float_arg)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+DELETE_CHUNK_SIZE = 1000
+# Product fields covered by the full-text index
+SEARCHABLE_FIELDS = {'name', 'sku', 'description'}
 
 class ProductService:
     @staticmethod
@@ -22,58 +41,325 @@ class ProductService:
             currency=data.get('currency')
         )
         db.session.add(prod)
+        with unique_violation(f'SKU {sku} already exists'):
+            db.session.flush()
+        DocumentService.refresh([prod.id])
+        SearchIndexService.refresh([prod.id])
+        stats = StatsDelta()
+        stats.product(category_id, prod.price, 1)
+        stats.apply()
+        bump_version('products')
+        bump_category_versions([category_id])
+        ChangeService.record('product', 'create', [(prod.id, category_id)])
         db.session.commit()
         return to_dict(prod)
 
     @staticmethod
-    def list():
-        prods = Product.query.order_by(Product.created_at.desc()).all()
-        return [to_dict(p) for p in prods]
+    def list(args):
+        return ProductService.paginate(ProductService.filtered_statement(args), args)
+
+    @staticmethod
+    def paginate(stmt, args, rank=None):
+        names, limit, stmt = ProductService.page_statement(stmt, args, rank)
+        page, rows = ProductService.page_result(names, limit, db.session.execute(stmt).all(), rank)
+        if ProductService.expands_attributes(args):
+            resolved = ProductService._expanded_attributes([row.id for row in rows])
+            for item, row in zip(page['items'], rows):
+                item['attributes'] = resolved[row.id]
+        return page
+
+    # Statement builders and row folding below are shared with the async service
+
+    @staticmethod
+    def filtered_statement(args):
+        stmt = select(Product)
+        category_id = parse_int_arg(args, 'category_id')
+        if category_id is not None:
+            stmt = stmt.where(Product.category_id == category_id)
+        min_price = parse_float_arg(args, 'min_price')
+        if min_price is not None:
+            stmt = stmt.where(Product.price >= min_price)
+        max_price = parse_float_arg(args, 'max_price')
+        if max_price is not None:
+            stmt = stmt.where(Product.price <= max_price)
+        sku_prefix = (args.get('sku_prefix') or '').strip()
+        if sku_prefix:
+            stmt = stmt.where(Product.sku.like(escape_like(sku_prefix) + '%', escape='\\'))
+        return stmt
+
+    @staticmethod
+    def page_statement(stmt, args, rank=None):
+        # -> (field names, limit, statement fetching limit + 1 rows)
+        limit = parse_int_arg(args, 'limit', DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+        # Keyset pagination on (created_at, id): every page is an index range scan.
+        # Relevance-ranked results (rank given) page on (rank, id) instead
+        cursor = args.get('cursor')
+        if rank is None:
+            order_key = Product.created_at
+            if cursor:
+                created_at, pk = decode_cursor(cursor)
+                stmt = stmt.where(or_(
+                    Product.created_at < created_at,
+                    and_(Product.created_at == created_at, Product.id < pk)
+                ))
+        else:
+            order_key = rank
+            if cursor:
+                score, pk = decode_score_cursor(cursor)
+                stmt = stmt.where(or_(rank < score, and_(rank == score, Product.id < pk)))
+        # Column-only rows: no ORM objects are built for listings
+        names, columns = projected_columns(Product, parse_fields(args, Product), required=('id', 'created_at'))
+        if rank is not None:
+            columns.append(rank.label('search_score'))
+        stmt = (stmt.with_only_columns(*columns)
+                .order_by(order_key.desc(), Product.id.desc())
+                .limit(limit + 1))
+        return names, limit, stmt
+
+    @staticmethod
+    def page_result(names, limit, rows, rank=None):
+        # -> (page, rows on the page)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        last = rows[-1] if has_more else None
+        page = {
+            'items': rows_to_dicts(names, rows),
+            'next_cursor': (None if last is None
+                            else encode_cursor(last.created_at, last.id) if rank is None
+                            else encode_score_cursor(last.search_score, last.id))
+        }
+        return page, rows
+
+    @staticmethod
+    def expands_attributes(args):
+        return 'attributes' in (args.get('expand') or '').split(',')
+
+    @staticmethod
+    def attributes_statement(product_ids):
+        # One query for a whole page of products instead of one per product
+        return (select(ProductAttributeValue.product_id, AttributeDefinition.name, AttributeDefinition.data_type,
+                       *[getattr(ProductAttributeValue, c) for c in TYPED_VALUE_COLUMNS])
+                .join(AttributeDefinition, AttributeDefinition.id == ProductAttributeValue.attribute_definition_id)
+                .where(ProductAttributeValue.product_id.in_(product_ids)))
+
+    @staticmethod
+    def fold_attributes(product_ids, rows):
+        resolved = {pid: {} for pid in product_ids}
+        for row in rows:
+            resolved[row.product_id][row.name] = typed_value(row.data_type, row)
+        return resolved
+
+    @staticmethod
+    def _expanded_attributes(product_ids):
+        if not DocumentService.enabled():
+            return ProductService._attributes_for(product_ids)
+        resolved = DocumentService.attributes_for(product_ids)
+        missing = [pid for pid in product_ids if pid not in resolved]
+        if missing:
+            resolved.update(ProductService._attributes_for(missing))
+        return resolved
+
+    @staticmethod
+    def _attributes_for(product_ids):
+        if not product_ids:
+            return {}
+        rows = db.session.execute(ProductService.attributes_statement(product_ids))
+        return ProductService.fold_attributes(product_ids, rows)
 
     @staticmethod
     def get(pid):
         prod = Product.query.get_or_404(pid)
         data = to_dict(prod)
-        # expand attributes
-        attrs = ProductAttributeValue.query.filter_by(product_id=pid).all()
-        resolved = {}
-        for pav in attrs:
-            resolved[pav.attribute.name] = pav.best_value()
-        data['attributes'] = resolved
+        data['attributes'] = ProductService._attributes_for([pid])[pid]
         return data
 
     @staticmethod
-    def update(pid, data):
+    def update(pid, data, expected_version=None):
         prod = Product.query.get_or_404(pid)
+        check_version(prod, expected_version)
+        stats = StatsDelta()
+        if 'price' in data and data.get('price') != prod.price:
+            stats.price(prod.category_id, prod.price, -1)
+            stats.price(prod.category_id, data.get('price'), 1)
         for field in ['name','sku','description','price','currency']:
             if field in data:
                 setattr(prod, field, data.get(field))
+        with unique_violation(f'SKU {prod.sku} already exists'):
+            db.session.flush()
+        DocumentService.refresh([pid])
+        if SEARCHABLE_FIELDS.intersection(data):
+            SearchIndexService.refresh([pid])
+        stats.apply()
+        bump_version('products')
+        bump_category_versions([prod.category_id])
+        ChangeService.record('product', 'update', [(pid, prod.category_id)])
         db.session.commit()
         return to_dict(prod)
 
     @staticmethod
-    def set_attributes(product_id, values_map):
+    def set_attributes(product_id, values_map, expected_version=None):
         prod = Product.query.get_or_404(product_id)
-        # Ensure attributes belong to the product's category
-        attr_defs = AttributeDefinition.query.filter_by(category_id=prod.category_id).all()
-        name_to_attr = {a.name: a for a in attr_defs}
-        for name, raw in values_map.items():
-            attr = name_to_attr.get(name)
-            if not attr:
-                abort(400, f'Unknown attribute for this category: {name}')
-            normalized = normalize_value_by_type(attr, raw)
-            pav = ProductAttributeValue.query.filter_by(
-                product_id=product_id, attribute_definition_id=attr.id
-            ).first()
-            if not pav:
-                pav = ProductAttributeValue(product_id=product_id, attribute_definition_id=attr.id)
-                db.session.add(pav)
-            pav.set_typed_value(attr.data_type, normalized)
+        check_version(prod, expected_version)
+        return ProductService._set_attributes_many({prod.id: (prod, values_map)})[0]
+
+    @staticmethod
+    def set_attributes_batch(items):
+        if not isinstance(items, list) or not items:
+            abort(400, '"items" must be a non-empty list')
+        if len(items) > MAX_BATCH_SIZE:
+            abort(400, f'At most {MAX_BATCH_SIZE} items per request')
+        requested = {}
+        # Optional per item, like If-Match for the single-product route
+        versions = {}
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('attributes'), dict):
+                abort(400, 'Each item needs a product_id and an "attributes" object')
+            try:
+                pid = int(item.get('product_id'))
+            except (TypeError, ValueError):
+                abort(400, 'product_id must be an integer')
+            # Several items for the same product are merged, later values win
+            requested.setdefault(pid, {}).update(item['attributes'])
+            if item.get('version') is not None:
+                try:
+                    versions[pid] = int(item['version'])
+                except (TypeError, ValueError):
+                    abort(400, 'version must be an integer')
+        prods = {p.id: p for p in Product.query.filter(Product.id.in_(list(requested))).all()}
+        missing = sorted(set(requested) - set(prods))
+        if missing:
+            abort(404, f'Unknown product ids: {missing}')
+        stale = sorted(pid for pid, version in versions.items() if prods[pid].version != version)
+        if stale:
+            abort(412, f'Products changed since the given versions: {stale}')
+        return ProductService._set_attributes_many(
+            {pid: (prods[pid], values_map) for pid, values_map in requested.items()}
+        )
+
+    @staticmethod
+    def _set_attributes_many(pending):
+        # pending: {product id: (Product, {attribute name: raw value})}
+        registry = get_registry()
+        registry.sync()
+        now = datetime.utcnow()
+        rows = []
+        written = {}
+        reindex = []
+        stats = StatsDelta()
+        attrs = {}
+        for pid, (prod, values_map) in pending.items():
+            # Ensure attributes belong to the product's category
+            name_to_attr = registry.require(prod.category_id).attributes
+            for name, raw in values_map.items():
+                attr = name_to_attr.get(name)
+                if not attr:
+                    abort(400, f'Unknown attribute for this category: {name}')
+                normalized = normalize_value_by_type(attr, raw)
+                row = ProductAttributeValue.typed_columns(attr.data_type, normalized)
+                stats.value(prod.category_id, attr.id, attr.data_type, SimpleNamespace(**row), 1)
+                attrs[attr.id] = attr
+                written.setdefault(pid, {})[name] = typed_value(attr.data_type, SimpleNamespace(**row))
+                row.update(product_id=pid, attribute_definition_id=attr.id, created_at=now, updated_at=now)
+                rows.append(row)
+                if attr.data_type in SEARCHABLE_TYPES:
+                    reindex.append(pid)
+
+        # Attribute values are part of the product: bump each version, checked against the
+        # version read above (StaleDataError when another request got there first)
+        for prod, _ in pending.values():
+            prod.updated_at = now
+        db.session.flush()
+
+        # One read of the current values, before the upsert: it gives the response attributes
+        # and the values being replaced, which leave the stats. Built before committing, as
+        # commit expires the loaded products
+        current = db.session.execute(
+            ProductService.attributes_statement(list(pending))
+            .add_columns(ProductAttributeValue.attribute_definition_id)
+        ).all()
+        resolved = ProductService.fold_attributes(list(pending), current)
+        results = []
+        for pid, (prod, _) in pending.items():
+            data = to_dict(prod)
+            data['attributes'] = {**resolved[pid], **written.get(pid, {})}
+            results.append(data)
+        keys = {(row['product_id'], row['attribute_definition_id']) for row in rows}
+        for old in current:
+            if (old.product_id, old.attribute_definition_id) in keys:
+                attr = attrs[old.attribute_definition_id]
+                stats.value(attr.category_id, attr.id, attr.data_type, old, -1)
+        upsert(
+            ProductAttributeValue.__table__, rows, ['product_id', 'attribute_definition_id'],
+            list(TYPED_VALUE_COLUMNS) + ['updated_at']
+        )
+        DocumentService.refresh(list(pending))
+        SearchIndexService.refresh(reindex)
+        stats.apply()
+        bump_version('products')
+        bump_category_versions(prod.category_id for prod, _ in pending.values())
+        ChangeService.record('product', 'update', [(pid, prod.category_id) for pid, (prod, _) in pending.items()])
         db.session.commit()
-        return ProductService.get(product_id)
+        return results
+
+    @staticmethod
+    def delete_many(ids):
+        # Bounded batch (see MAX_BATCH_SIZE): one transaction of bulk DELETEs
+        existing = db.session.execute(select(Product.id, Product.category_id).where(Product.id.in_(ids))).all()
+        ProductService._delete_ids([row.id for row in existing])
+        bump_version('products')
+        bump_category_versions(row.category_id for row in existing)
+        ChangeService.record('product', 'delete', existing)
+        db.session.commit()
+        return {'deleted': len(existing)}
+
+    @staticmethod
+    @job_handler('purge_category_products')
+    def purge_category(category_id, chunk_size=DELETE_CHUNK_SIZE, job=None):
+        # Deletes every product of a category, committing after each chunk so that locks and
+        # undo logs stay small. Products deleted before a failure stay deleted
+        Category.query.get_or_404(category_id)
+        criteria = Product.category_id == category_id
+        if job is not None:
+            job.total = db.session.scalar(select(func.count(Product.id)).where(criteria))
+        deleted = 0
+        for ids in id_chunks(Product.id, chunk_size, criteria):
+            ProductService._delete_ids(ids)
+            bump_version('products')
+            bump_category_versions([category_id])
+            ChangeService.record('product', 'delete', [(pid, category_id) for pid in ids])
+            if job is not None:
+                job.advance(len(ids))
+            db.session.commit()
+            deleted += len(ids)
+        return {'deleted': deleted}
+
+    @staticmethod
+    def _delete_ids(ids):
+        if not ids:
+            return
+        DocumentService.remove(ids)
+        SearchIndexService.remove(ids)
+        stats = StatsDelta()
+        stats.remove_products(ids)
+        stats.apply()
+        # Explicit instead of ON DELETE CASCADE, so each statement's size is bounded by ids
+        db.session.execute(
+            delete(ProductAttributeValue).where(ProductAttributeValue.product_id.in_(ids)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.execute(delete(Product).where(Product.id.in_(ids)), execution_options={'synchronize_session': False})
 
     @staticmethod
-    def delete(pid):
+    def delete(pid, expected_version=None):
         prod = Product.query.get_or_404(pid)
+        check_version(prod, expected_version)
+        DocumentService.remove([pid])
+        SearchIndexService.remove([pid])
+        stats = StatsDelta()
+        stats.remove_products([pid])
+        stats.apply()
         db.session.delete(prod)
+        bump_version('products')
+        bump_category_versions([prod.category_id])
+        ChangeService.record('product', 'delete', [(pid, prod.category_id)])
         db.session.commit()
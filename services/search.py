@@ -0,0 +1,110 @@
+import re
+from flask import abort
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import aliased
+from models import AttributeDefinition, Product, ProductAttributeValue, VALUE_COLUMNS
+from schema_registry import get_registry
+from services.products import ProductService
+from services.search_index import SearchIndexService
+from utils import coerce_value, parse_int_arg
+
+# attr.<name> or attr.<name>[<op>]
+ATTR_PARAM = re.compile(r'^attr\.(?P<name>[^\[\]]+)(?:\[(?P<op>[a-z]+)\])?$')
+
+OPERATORS = {
+    'eq': lambda col, v: col == v,
+    'ne': lambda col, v: col != v,
+    'gt': lambda col, v: col > v,
+    'gte': lambda col, v: col >= v,
+    'lt': lambda col, v: col < v,
+    'lte': lambda col, v: col <= v,
+    'in': lambda col, v: col.in_(v),
+}
+RANGE_OPERATORS = {'gt', 'gte', 'lt', 'lte'}
+
+class SearchService:
+    @staticmethod
+    def search(args):
+        predicates = SearchService.parse_attribute_filters(args)
+        attrs = SearchService.resolve_attributes(predicates, parse_int_arg(args, 'category_id')) if predicates else {}
+        q = (args.get('q') or '').strip()
+        matches = SearchIndexService.match(q) if q else None
+        stmt, rank = SearchService.statement(args, predicates, attrs, matches)
+        return ProductService.paginate(stmt, args, rank)
+
+    @staticmethod
+    def statement(args, predicates, attrs, matches=None):
+        # -> (filtered statement, relevance column or None); shared with the async service
+        stmt = ProductService.filtered_statement(args)
+        if predicates:
+            stmt = SearchService.apply_attribute_filters(stmt, predicates, attrs)
+        if matches is None:
+            return stmt, None
+        # Full-text matches are ordered by relevance instead of recency
+        return stmt.join(matches, matches.c.product_id == Product.id), matches.c.score
+
+    @staticmethod
+    def parse_attribute_filters(args):
+        # {attribute name: [(op, [raw values])]}
+        predicates = {}
+        for key in args:
+            m = ATTR_PARAM.match(key)
+            if not m:
+                continue
+            op = m.group('op') or 'eq'
+            if op not in OPERATORS:
+                abort(400, f'Unsupported operator "{op}". Allowed: {sorted(OPERATORS)}')
+            for raw in args.getlist(key):
+                values = [v for v in raw.split(',') if v != ''] if op == 'in' else [raw]
+                if not values:
+                    abort(400, f'{key} requires at least one value')
+                predicates.setdefault(m.group('name'), []).append((op, values))
+        return predicates
+
+    @staticmethod
+    def resolve_attributes(predicates, category_id=None):
+        # {attribute name: [attribute definitions]} for the filtered names
+        if category_id is not None:
+            schema = get_registry().require(category_id)
+            return {name: [schema.attributes[name]] for name in predicates if name in schema.attributes}
+        by_name = {}
+        defs = AttributeDefinition.query.filter(AttributeDefinition.name.in_(list(predicates)))
+        for attr in defs.all():
+            by_name.setdefault(attr.name, []).append(attr)
+        return by_name
+
+    @staticmethod
+    def apply_attribute_filters(stmt, predicates, by_name):
+        for name, preds in predicates.items():
+            attrs = by_name.get(name)
+            if not attrs:
+                abort(400, f'Unknown attribute: {name}')
+            # Without a category the same name may exist in several categories,
+            # each with its own data type and enum options
+            pav = aliased(ProductAttributeValue)
+            branches = []
+            error = None
+            for attr in attrs:
+                try:
+                    conditions = SearchService._conditions(pav, attr, preds)
+                except ValueError as e:
+                    error = f'Invalid filter for attribute {name} ({attr.data_type}): {e}'
+                    continue
+                branches.append(and_(pav.attribute_definition_id == attr.id, *conditions))
+            if not branches:
+                abort(400, error)
+            stmt = stmt.join(pav, and_(pav.product_id == Product.id, or_(*branches)))
+        return stmt
+
+    @staticmethod
+    def _conditions(pav, attr, preds):
+        if attr.data_type == 'json':
+            raise ValueError('json attributes cannot be filtered')
+        col = getattr(pav, VALUE_COLUMNS[attr.data_type])
+        conditions = []
+        for op, values in preds:
+            if op in RANGE_OPERATORS and attr.data_type == 'bool':
+                raise ValueError(f'operator {op} is not supported')
+            normalized = [coerce_value(attr, v) for v in values]
+            conditions.append(OPERATORS[op](col, normalized if op == 'in' else normalized[0]))
+        return conditions
@@ -0,0 +1,190 @@
+import re
+import unicodedata
+from collections import Counter
+from functools import reduce
+from operator import add
+from flask import abort, current_app
+from sqlalchemy import Float, and_, case, column, delete, func, insert, literal_column, select, table, text
+from database import db, id_chunks, upsert
+from models import (AttributeDefinition, Product, ProductAttributeValue, ProductSearchTerm,
+                    ProductSearchText, FTS5_TABLE, fts5_available)
+from utils import escape_like
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_QUERY_TOKENS = 8
+MAX_TERM_LENGTH = 64
+SEARCHABLE_TYPES = ('string', 'enum')
+# Relevance weight of a match in each field
+FIELD_WEIGHTS = {'name': 10, 'sku': 10, 'attributes': 3, 'description': 1}
+
+TOKEN = re.compile(r'\w+')
+
+fts = table(FTS5_TABLE, column('rowid'), column('name'), column('description'), column('sku'), column('attributes'))
+
+def tokenize(value):
+    # Lowercased words with diacritics removed, like FTS5's unicode61 tokenizer
+    if not value:
+        return []
+    folded = ''.join(c for c in unicodedata.normalize('NFKD', value) if not unicodedata.combining(c))
+    return TOKEN.findall(folded.lower())
+
+class SearchIndexService:
+    @staticmethod
+    def backend():
+        # 'fts5', 'fulltext', 'terms', or None when search is disabled; resolved once per app
+        extensions = current_app.extensions
+        if 'search_index' not in extensions:
+            extensions['search_index'] = SearchIndexService.resolve_backend(
+                current_app.config.get('SEARCH_INDEX', 'auto'), db.session.connection()
+            )
+        return extensions['search_index']
+
+    @staticmethod
+    def resolve_backend(configured, connection):
+        if configured == 'off':
+            return None
+        if configured == 'terms':
+            return 'terms'
+        if connection.dialect.name == 'mysql':
+            return 'fulltext'
+        return 'fts5' if fts5_available(connection) else 'terms'
+
+    @staticmethod
+    def refresh(product_ids):
+        # Reindexes product_ids inside the caller's transaction
+        backend = SearchIndexService.backend()
+        if backend is None or not product_ids:
+            return
+        ids = list(set(product_ids))
+        db.session.flush()
+        WRITERS[backend](ids, SearchIndexService._documents(ids))
+
+    @staticmethod
+    def refresh_category(category_id, chunk_size=DEFAULT_CHUNK_SIZE):
+        if SearchIndexService.backend() is None:
+            return
+        for ids in id_chunks(Product.id, chunk_size, Product.category_id == category_id):
+            SearchIndexService.refresh(ids)
+
+    @staticmethod
+    def remove(product_ids):
+        backend = SearchIndexService.backend()
+        if backend is None or not product_ids:
+            return
+        WRITERS[backend](list(product_ids), {})
+
+    @staticmethod
+    def rebuild(chunk_size=DEFAULT_CHUNK_SIZE):
+        # Full rebuild, one commit per chunk; returns the number of products indexed
+        backend = SearchIndexService.backend()
+        if backend is None:
+            return 0
+        total = 0
+        for ids in id_chunks(Product.id, chunk_size):
+            SearchIndexService.refresh(ids)
+            db.session.commit()
+            total += len(ids)
+        live = select(Product.id)
+        if backend == 'fts5':
+            db.session.execute(delete(fts).where(fts.c.rowid.not_in(live)))
+        elif backend == 'fulltext':
+            db.session.execute(delete(ProductSearchText).where(ProductSearchText.product_id.not_in(live)))
+        else:
+            db.session.execute(delete(ProductSearchTerm).where(ProductSearchTerm.product_id.not_in(live)))
+        db.session.commit()
+        return total
+
+    @staticmethod
+    def match(q, backend=False):
+        # Subquery of (product_id, score) for products matching every word of q as a prefix.
+        # backend defaults to this app's; the async service passes its own
+        if backend is False:
+            backend = SearchIndexService.backend()
+        if backend is None:
+            abort(400, 'Full-text search is disabled')
+        tokens = list(dict.fromkeys(tokenize(q)))[:MAX_QUERY_TOKENS]
+        if not tokens:
+            abort(400, 'q must contain at least one word')
+        return MATCHERS[backend](tokens)
+
+    @staticmethod
+    def _documents(product_ids):
+        # {product id: {field: text}} for the products that still exist, in one query
+        pav = ProductAttributeValue
+        searchable = select(AttributeDefinition.id).where(AttributeDefinition.data_type.in_(SEARCHABLE_TYPES))
+        rows = db.session.execute(
+            select(Product.id, Product.name, Product.description, Product.sku, pav.string_value)
+            .outerjoin(pav, and_(pav.product_id == Product.id,
+                                 pav.attribute_definition_id.in_(searchable),
+                                 pav.string_value.is_not(None)))
+            .where(Product.id.in_(product_ids))
+        )
+        docs = {}
+        for pid, name, description, sku, value in rows:
+            doc = docs.setdefault(pid, {'name': name, 'description': description, 'sku': sku, 'attributes': []})
+            if value is not None:
+                doc['attributes'].append(value)
+        for doc in docs.values():
+            doc['attributes'] = ' '.join(doc['attributes']) or None
+        return docs
+
+def _write_fts5(product_ids, docs):
+    db.session.execute(delete(fts).where(fts.c.rowid.in_(product_ids)))
+    if docs:
+        db.session.execute(insert(fts), [dict(doc, rowid=pid) for pid, doc in docs.items()])
+
+def _write_fulltext(product_ids, docs):
+    upsert(ProductSearchText.__table__, [dict(doc, product_id=pid) for pid, doc in docs.items()],
+           ['product_id'], ['name', 'description', 'sku', 'attributes'])
+    missing = set(product_ids) - set(docs)
+    if missing:
+        db.session.execute(delete(ProductSearchText).where(ProductSearchText.product_id.in_(missing)))
+
+def _write_terms(product_ids, docs):
+    db.session.execute(delete(ProductSearchTerm).where(ProductSearchTerm.product_id.in_(product_ids)))
+    rows = []
+    for pid, doc in docs.items():
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in set(tokenize(doc[field])):
+                weights[token[:MAX_TERM_LENGTH]] += weight
+        rows.extend({'term': term, 'product_id': pid, 'weight': weight} for term, weight in weights.items())
+    if rows:
+        db.session.execute(insert(ProductSearchTerm), rows)
+
+def _match_fts5(tokens):
+    # Every token quoted and prefix-matched: "abc"* "12"*; bm25 is lower for better matches
+    expression = ' '.join('"%s"*' % token.replace('"', '""') for token in tokens)
+    weights = ', '.join(str(FIELD_WEIGHTS[c.name]) for c in list(fts.c)[1:])
+    return (select(fts.c.rowid.label('product_id'),
+                   literal_column(f'-bm25({FTS5_TABLE}, {weights})', Float).label('score'))
+            .where(text(f'{FTS5_TABLE} MATCH :expression').bindparams(expression=expression))
+            .subquery())
+
+def _match_fulltext(tokens):
+    # Boolean mode: every word required, prefix matched. InnoDB ignores words shorter than
+    # innodb_ft_min_token_size and stopwords
+    from sqlalchemy.dialects.mysql import match
+    t = ProductSearchText
+    relevance = match(t.name, t.description, t.sku, t.attributes,
+                      against=' '.join(f'+{token}*' for token in tokens)).in_boolean_mode()
+    return select(t.product_id, relevance.label('score')).where(relevance).subquery()
+
+def _match_terms(tokens):
+    # One grouped prefix scan per token, joined on product_id; exact terms count double
+    t = ProductSearchTerm
+    parts = [
+        select(t.product_id, func.max(case((t.term == token, t.weight * 2), else_=t.weight)).label('weight'))
+        .where(t.term.like(escape_like(token) + '%', escape='\\'))
+        .group_by(t.product_id)
+        .subquery()
+        for token in tokens
+    ]
+    first = parts[0]
+    stmt = select(first.c.product_id, reduce(add, [p.c.weight for p in parts]).label('score')).select_from(first)
+    for part in parts[1:]:
+        stmt = stmt.join(part, part.c.product_id == first.c.product_id)
+    return stmt.subquery()
+
+WRITERS = {'fts5': _write_fts5, 'fulltext': _write_fulltext, 'terms': _write_terms}
+MATCHERS = {'fts5': _match_fts5, 'fulltext': _match_fulltext, 'terms': _match_terms}
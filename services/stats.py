@@ -0,0 +1,574 @@
+import json
+import math
+import threading
+from collections import Counter, OrderedDict
+from flask import abort, current_app
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from database import db, category_key, get_version, primary_reads, upsert
+from models import (AttributeDefinition, AttributeStats, AttributeValueCount, CategoryStats, Product,
+                    ProductAttributeValue, VALUE_COLUMNS)
+from schema_registry import get_registry
+from utils import parse_int_arg
+
+HISTOGRAM_BUCKETS = 10
+# Most frequent values listed for string attributes; enum values are always listed in full
+TOP_VALUES = 20
+# Data types whose values are counted one by one in attribute_value_counts
+COUNTED_TYPES = ('string', 'enum')
+
+class StatsCache:
+    # Aggregates by category id, each valid for one version of the category's change counter.
+    # A write to a category invalidates only that category's entry
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, category_id, version):
+        with self._lock:
+            entry = self._entries.get(category_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(category_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, category_id, version, data):
+        with self._lock:
+            self._entries[category_id] = (version, data)
+            self._entries.move_to_end(category_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+def init_stats_cache(app):
+    app.extensions['stats_cache'] = StatsCache(app.config.get('STATS_CACHE_SIZE', 256))
+
+def get_stats_cache():
+    return current_app.extensions['stats_cache']
+
+class StatsDelta:
+    # What one write changes in the stored aggregates, added by apply() in the write's own
+    # transaction. Removing a value that may be a current minimum or maximum flags those
+    # for recomputation on the next read; sums and counts never need one
+    def __init__(self):
+        self.categories = {}
+        self.attributes = {}
+        self.value_counts = Counter()
+
+    def product(self, category_id, price, sign):
+        self._category(category_id)['products'] += sign
+        self.price(category_id, price, sign)
+
+    def price(self, category_id, price, sign):
+        entry = self._category(category_id)
+        if price is None:
+            return
+        price = float(price)
+        entry['price_count'] += sign
+        entry['price_sum'] += sign * price
+        _extend(entry, sign, price)
+
+    def value(self, category_id, attr_id, data_type, row, sign):
+        # row: the typed value columns of a product_attribute_values row; values of another
+        # data_type (awaiting migration) are not counted, as in compute()
+        self._category(category_id)
+        value = getattr(row, VALUE_COLUMNS[data_type])
+        if value is None:
+            return
+        entry = self.attributes.setdefault(attr_id, {'data_type': data_type, 'count': 0, 'true_count': 0,
+                                                     'total': 0, 'added': None, 'removed': None})
+        entry['count'] += sign
+        if data_type == 'bool':
+            entry['true_count'] += sign * bool(value)
+        elif data_type in ('int', 'decimal'):
+            entry['total'] += sign * value
+            _extend(entry, sign, value)
+        elif data_type == 'date':
+            _extend(entry, sign, value)
+        elif data_type in COUNTED_TYPES:
+            self.value_counts[(attr_id, value)] += sign
+
+    def remove_products(self, product_ids):
+        # Everything the products contribute, read before they are deleted
+        if not product_ids:
+            return
+        for category_id, price in db.session.execute(
+            select(Product.category_id, Product.price).where(Product.id.in_(product_ids))
+        ):
+            self.product(category_id, price, -1)
+        pav = ProductAttributeValue
+        for row in db.session.execute(
+            select(AttributeDefinition.category_id, AttributeDefinition.data_type, pav.attribute_definition_id,
+                   *[getattr(pav, c) for c in sorted(set(VALUE_COLUMNS.values()))])
+            .join(AttributeDefinition, AttributeDefinition.id == pav.attribute_definition_id)
+            .where(pav.product_id.in_(product_ids))
+        ):
+            self.value(row.category_id, row.attribute_definition_id, row.data_type, row, -1)
+
+    def apply(self):
+        # Keys in sorted order, so concurrent writers lock the rows in the same order
+        categories = [dict(entry, category_id=cid) for cid, entry in sorted(self.categories.items())]
+        attributes = [dict(entry, attribute_definition_id=aid) for aid, entry in sorted(self.attributes.items())]
+        self._flag_removed_extremes(categories, attributes)
+        # A category without a row gets a stale one: the next read computes it from the values
+        upsert(CategoryStats.__table__, [{
+            'category_id': e['category_id'], 'products': e['products'], 'price_count': e['price_count'],
+            'price_sum': e['price_sum'], 'price_min': _low(e['added']), 'price_max': _high(e['added']),
+            'stale': True, 'minmax_stale': False, 'generation': 1
+        } for e in categories], ['category_id'], [], increment_columns=['generation'], merge_columns={
+            'products': _add, 'price_count': _add, 'price_sum': _add, 'price_min': _least, 'price_max': _greatest
+        })
+        numbers = [e for e in attributes if e['data_type'] != 'date']
+        dates = [e for e in attributes if e['data_type'] == 'date']
+        for rows, low, high in ((numbers, 'min_number', 'max_number'), (dates, 'min_date', 'max_date')):
+            upsert(AttributeStats.__table__, [{
+                'attribute_definition_id': e['attribute_definition_id'], 'count': e['count'],
+                'true_count': e['true_count'], 'total': e['total'], low: _low(e['added']), high: _high(e['added']),
+                'minmax_stale': False
+            } for e in rows], ['attribute_definition_id'], [], merge_columns={
+                'count': _add, 'true_count': _add, 'total': _add, low: _least, high: _greatest
+            })
+        upsert(AttributeValueCount.__table__, [
+            {'attribute_definition_id': aid, 'value': value, 'count': n}
+            for (aid, value), n in sorted(self.value_counts.items()) if n
+        ], ['attribute_definition_id', 'value'], [], merge_columns={'count': _add})
+
+    def _category(self, category_id):
+        return self.categories.setdefault(category_id, {'products': 0, 'price_count': 0, 'price_sum': 0,
+                                                        'added': None, 'removed': None})
+
+    @staticmethod
+    def _flag_removed_extremes(categories, attributes):
+        stats = CategoryStats.__table__
+        rows = [{'b_id': e['category_id'], 'b_low': e['removed'][0], 'b_high': e['removed'][1]}
+                for e in categories if e['removed']]
+        if rows:
+            db.session.execute(
+                update(stats).where(stats.c.category_id == bindparam('b_id'),
+                                    or_(stats.c.price_min >= bindparam('b_low'), stats.c.price_max <= bindparam('b_high')))
+                .values(minmax_stale=True), rows)
+        stats = AttributeStats.__table__
+        for date in (False, True):
+            low, high = (stats.c.min_date, stats.c.max_date) if date else (stats.c.min_number, stats.c.max_number)
+            rows = [{'b_id': e['attribute_definition_id'], 'b_low': e['removed'][0], 'b_high': e['removed'][1]}
+                    for e in attributes if e['removed'] and (e['data_type'] == 'date') == date]
+            if rows:
+                db.session.execute(
+                    update(stats).where(stats.c.attribute_definition_id == bindparam('b_id'),
+                                        or_(low >= bindparam('b_low'), high <= bindparam('b_high')))
+                    .values(minmax_stale=True), rows)
+
+class StatsService:
+    @staticmethod
+    def category_stats(category_id):
+        registry = get_registry()
+        registry.sync()
+        schema = registry.require(category_id)
+        # Read before computing: a write landing meanwhile leaves the entry at the old version
+        version = get_version(category_key(category_id))
+        cache = get_stats_cache()
+        data = cache.get(category_id, version)
+        if data is None:
+            # The stored aggregates are written by the primary's transactions, so read them there
+            with primary_reads():
+                if StatsService.refresh(schema):
+                    data = StatsService.stored(schema)
+                else:
+                    data = StatsService.compute(schema)
+            cache.put(category_id, version, data)
+        return data
+
+    @staticmethod
+    def invalidate(category_ids):
+        # For writes not counted by StatsDelta (imports, type changes): the next read recomputes
+        ids = sorted(set(category_ids))
+        if ids:
+            db.session.execute(
+                update(CategoryStats).where(CategoryStats.category_id.in_(ids))
+                .values(stale=True, generation=CategoryStats.generation + 1),
+                execution_options={'synchronize_session': False}
+            )
+
+    @staticmethod
+    def refresh(schema):
+        # Brings the stored aggregates of the category up to date: all of them when the row is
+        # missing or stale, only minimums and maximums after deletes. Each result is stored only
+        # if no write changed the category meanwhile; False then, and the caller computes instead
+        row = db.session.execute(
+            select(CategoryStats.generation, CategoryStats.stale, CategoryStats.minmax_stale)
+            .where(CategoryStats.category_id == schema.id)
+        ).one_or_none()
+        attr_ids = [a.id for a in schema.attributes.values()]
+        stale_attrs = db.session.scalars(
+            select(AttributeStats.attribute_definition_id)
+            .where(AttributeStats.attribute_definition_id.in_(attr_ids), AttributeStats.minmax_stale)
+        ).all() if attr_ids else []
+        if row is not None and not row.stale and not row.minmax_stale and not stale_attrs:
+            return True
+        try:
+            if row is None or row.stale:
+                stored = StatsService._store_all(schema, row.generation if row is not None else None)
+            else:
+                stored = StatsService._store_extremes(schema, row, stale_attrs)
+            if stored:
+                db.session.commit()
+                return True
+        except (IntegrityError, OperationalError):
+            # Another writer created the row first, or (SQLite) committed since this snapshot
+            pass
+        db.session.rollback()
+        return False
+
+    @staticmethod
+    def _store_all(schema, generation):
+        summary = db.session.execute(
+            select(func.count(Product.id), func.count(Product.price), func.sum(Product.price),
+                   func.min(Product.price), func.max(Product.price))
+            .where(Product.category_id == schema.id)
+        ).one()
+        values = {'products': summary[0], 'price_count': summary[1], 'price_sum': summary[2] or 0,
+                  'price_min': summary[3], 'price_max': summary[4], 'stale': False, 'minmax_stale': False}
+        if generation is None:
+            db.session.execute(insert(CategoryStats).values(category_id=schema.id, generation=0, **values))
+        elif not StatsService._claim(schema.id, generation, values):
+            return False
+
+        attrs = list(schema.attributes.values())
+        attr_ids = [a.id for a in attrs]
+        if not attr_ids:
+            return True
+        for model in (AttributeStats, AttributeValueCount):
+            db.session.execute(delete(model).where(model.attribute_definition_id.in_(attr_ids)),
+                               execution_options={'synchronize_session': False})
+        pav = ProductAttributeValue
+        rows = {row.attribute_definition_id: row for row in db.session.execute(
+            select(pav.attribute_definition_id,
+                   *[func.count(getattr(pav, c)).label(c) for c in sorted(set(VALUE_COLUMNS.values()))],
+                   func.count(case((pav.bool_value.is_(True), 1))).label('true_count'),
+                   func.sum(pav.int_value).label('sum_int'), func.sum(pav.decimal_value).label('sum_decimal'),
+                   *StatsService._extremes_columns())
+            .where(pav.attribute_definition_id.in_(attr_ids))
+            .group_by(pav.attribute_definition_id)
+        )}
+        stats = []
+        for attr in attrs:
+            row = rows.get(attr.id)
+            entry = {'attribute_definition_id': attr.id, 'count': 0, 'true_count': 0, 'total': 0,
+                     'min_number': None, 'max_number': None, 'min_date': None, 'max_date': None,
+                     'minmax_stale': False}
+            if row is not None:
+                entry['count'] = getattr(row, VALUE_COLUMNS[attr.data_type])
+                entry['true_count'] = row.true_count if attr.data_type == 'bool' else 0
+                entry.update(_extremes_of(attr.data_type, row))
+                if attr.data_type in ('int', 'decimal'):
+                    entry['total'] = (row.sum_int if attr.data_type == 'int' else row.sum_decimal) or 0
+            stats.append(entry)
+        db.session.execute(insert(AttributeStats), stats)
+        counted = [a.id for a in attrs if a.data_type in COUNTED_TYPES]
+        if counted:
+            counts = [{'attribute_definition_id': aid, 'value': value, 'count': n} for aid, value, n in db.session.execute(
+                select(pav.attribute_definition_id, pav.string_value, func.count())
+                .where(pav.attribute_definition_id.in_(counted), pav.string_value.is_not(None))
+                .group_by(pav.attribute_definition_id, pav.string_value)
+            )]
+            if counts:
+                db.session.execute(insert(AttributeValueCount), counts)
+        return True
+
+    @staticmethod
+    def _store_extremes(schema, row, stale_attrs):
+        values = {'minmax_stale': False}
+        if row.minmax_stale:
+            low, high = db.session.execute(
+                select(func.min(Product.price), func.max(Product.price)).where(Product.category_id == schema.id)
+            ).one()
+            values.update(price_min=low, price_max=high)
+        if not StatsService._claim(schema.id, row.generation, values):
+            return False
+        if stale_attrs:
+            # One index seek per end of each attribute's range
+            pav = ProductAttributeValue
+            for extremes in db.session.execute(
+                select(pav.attribute_definition_id, *StatsService._extremes_columns())
+                .where(pav.attribute_definition_id.in_(stale_attrs))
+                .group_by(pav.attribute_definition_id)
+            ):
+                attr = schema.by_id[extremes.attribute_definition_id]
+                db.session.execute(
+                    update(AttributeStats).where(AttributeStats.attribute_definition_id == attr.id)
+                    .values(minmax_stale=False, **_extremes_of(attr.data_type, extremes)),
+                    execution_options={'synchronize_session': False}
+                )
+            # Attributes left without values
+            db.session.execute(
+                update(AttributeStats)
+                .where(AttributeStats.attribute_definition_id.in_(stale_attrs), AttributeStats.minmax_stale)
+                .values(minmax_stale=False, min_number=None, max_number=None, min_date=None, max_date=None),
+                execution_options={'synchronize_session': False}
+            )
+        return True
+
+    @staticmethod
+    def _claim(category_id, generation, values):
+        # Stores values if the category is still at generation; the row stays locked until commit
+        return db.session.execute(
+            update(CategoryStats)
+            .where(CategoryStats.category_id == category_id, CategoryStats.generation == generation)
+            .values(**values),
+            execution_options={'synchronize_session': False}
+        ).rowcount == 1
+
+    @staticmethod
+    def _extremes_columns():
+        pav = ProductAttributeValue
+        return (func.min(pav.int_value).label('min_int'), func.max(pav.int_value).label('max_int'),
+                func.min(pav.decimal_value).label('min_decimal'), func.max(pav.decimal_value).label('max_decimal'),
+                func.min(pav.date_value).label('min_date'), func.max(pav.date_value).label('max_date'))
+
+    @staticmethod
+    def stored(schema):
+        # The same result as compute(), from the stored aggregates; only histograms read values
+        row = db.session.execute(select(CategoryStats).where(CategoryStats.category_id == schema.id)).scalar_one()
+        attrs = list(schema.attributes.values())
+        stats = {s.attribute_definition_id: s for s in db.session.scalars(
+            select(AttributeStats).where(AttributeStats.attribute_definition_id.in_([a.id for a in attrs]))
+        )} if attrs else {}
+        counts = {}
+        enums = [a.id for a in attrs if a.data_type == 'enum']
+        if enums:
+            for aid, value, n in db.session.execute(
+                select(AttributeValueCount.attribute_definition_id, AttributeValueCount.value, AttributeValueCount.count)
+                .where(AttributeValueCount.attribute_definition_id.in_(enums), AttributeValueCount.count > 0)
+            ):
+                counts.setdefault(aid, {})[value] = n
+
+        facets = {}
+        for attr in attrs:
+            stat = stats.get(attr.id)
+            facet = {'data_type': attr.data_type, 'count': stat.count if stat is not None else 0}
+            if attr.data_type == 'enum':
+                facet['values'] = _enum_values(attr, counts.get(attr.id, {}))
+            elif attr.data_type == 'bool':
+                true_count = stat.true_count if stat is not None else 0
+                facet['values'] = [{'value': True, 'count': true_count},
+                                   {'value': False, 'count': facet['count'] - true_count}]
+            elif attr.data_type == 'string':
+                facet['distinct'] = db.session.scalar(
+                    select(func.count()).where(AttributeValueCount.attribute_definition_id == attr.id,
+                                               AttributeValueCount.count > 0)
+                )
+                facet['values'] = [{'value': value, 'count': n} for value, n in db.session.execute(
+                    select(AttributeValueCount.value, AttributeValueCount.count)
+                    .where(AttributeValueCount.attribute_definition_id == attr.id, AttributeValueCount.count > 0)
+                    .order_by(AttributeValueCount.count.desc(), AttributeValueCount.value)
+                    .limit(TOP_VALUES)
+                )]
+            elif attr.data_type in ('int', 'decimal') and facet['count']:
+                cast = int if attr.data_type == 'int' else float
+                low, high = cast(stat.min_number), cast(stat.max_number)
+                facet['min'] = low
+                facet['max'] = high
+                facet['avg'] = stat.total / stat.count
+                facet['histogram'] = StatsService._histogram(attr, low, high)
+            elif attr.data_type == 'date' and facet['count']:
+                facet['min'] = stat.min_date
+                facet['max'] = stat.max_date
+            facets[attr.name] = facet
+        return {
+            'category_id': schema.id,
+            'products': row.products,
+            'price': {
+                'count': row.price_count,
+                'min': _number(row.price_min),
+                'max': _number(row.price_max),
+                'avg': row.price_sum / row.price_count if row.price_count else None
+            },
+            'attributes': facets
+        }
+
+    @staticmethod
+    def facets(args):
+        category_id = parse_int_arg(args, 'category_id')
+        if category_id is None:
+            abort(400, 'category_id is required')
+        stats = StatsService.category_stats(category_id)
+        facets = stats['attributes']
+        raw = args.get('attributes')
+        if raw:
+            names = [n.strip() for n in raw.split(',') if n.strip()]
+            unknown = [n for n in names if n not in facets]
+            if unknown:
+                abort(400, f'Unknown attributes for this category: {unknown}')
+            facets = {n: facets[n] for n in names}
+        return {'category_id': category_id, 'products': stats['products'], 'facets': facets}
+
+    @staticmethod
+    def compute(schema):
+        # Grouped aggregates over products and the typed value columns; each query reads one
+        # category (or its attributes) through the (category_id, ...) and (attribute_definition_id, value) indexes
+        summary = db.session.execute(
+            select(func.count(Product.id), func.count(Product.price), func.min(Product.price),
+                   func.max(Product.price), func.avg(Product.price))
+            .where(Product.category_id == schema.id)
+        ).one()
+        attrs = list(schema.attributes.values())
+        return {
+            'category_id': schema.id,
+            'products': summary[0],
+            'price': {
+                'count': summary[1],
+                'min': _number(summary[2]),
+                'max': _number(summary[3]),
+                'avg': _number(summary[4])
+            },
+            'attributes': StatsService._facets(attrs)
+        }
+
+    @staticmethod
+    def _facets(attrs):
+        if not attrs:
+            return {}
+        pav = ProductAttributeValue
+        # Counts and ranges of every attribute in one grouped query. Only the column of the
+        # current data_type counts: values awaiting a type migration read as null
+        rows = {row.attribute_definition_id: row for row in db.session.execute(
+            select(pav.attribute_definition_id,
+                   *[func.count(getattr(pav, c)).label(c) for c in sorted(set(VALUE_COLUMNS.values()))],
+                   func.count(pav.string_value.distinct()).label('distinct_strings'),
+                   func.min(pav.int_value).label('min_int'), func.max(pav.int_value).label('max_int'),
+                   func.avg(pav.int_value).label('avg_int'),
+                   func.min(pav.decimal_value).label('min_decimal'), func.max(pav.decimal_value).label('max_decimal'),
+                   func.avg(pav.decimal_value).label('avg_decimal'),
+                   func.min(pav.date_value).label('min_date'), func.max(pav.date_value).label('max_date'))
+            .where(pav.attribute_definition_id.in_([a.id for a in attrs]))
+            .group_by(pav.attribute_definition_id)
+        )}
+        value_counts = StatsService._value_counts([a for a in attrs if a.data_type in ('enum', 'bool')])
+
+        facets = {}
+        for attr in attrs:
+            row = rows.get(attr.id)
+            facet = {'data_type': attr.data_type,
+                     'count': getattr(row, VALUE_COLUMNS[attr.data_type]) if row is not None else 0}
+            if attr.data_type == 'enum':
+                facet['values'] = _enum_values(attr, value_counts.get(attr.id, {}))
+            elif attr.data_type == 'bool':
+                counts = value_counts.get(attr.id, {})
+                facet['values'] = [{'value': v, 'count': counts.get(v, 0)} for v in (True, False)]
+            elif attr.data_type == 'string':
+                facet['distinct'] = row.distinct_strings if row is not None else 0
+                facet['values'] = StatsService._top_strings(attr) if facet['count'] else []
+            elif attr.data_type in ('int', 'decimal') and facet['count']:
+                low, high = (row.min_int, row.max_int) if attr.data_type == 'int' else (row.min_decimal, row.max_decimal)
+                facet['min'] = _number(low)
+                facet['max'] = _number(high)
+                facet['avg'] = _number(row.avg_int if attr.data_type == 'int' else row.avg_decimal)
+                facet['histogram'] = StatsService._histogram(attr, _number(low), _number(high))
+            elif attr.data_type == 'date' and facet['count']:
+                facet['min'] = row.min_date
+                facet['max'] = row.max_date
+            facets[attr.name] = facet
+        return facets
+
+    @staticmethod
+    def _value_counts(attrs):
+        # {attribute id: {value: count}} for enum and bool attributes, one grouped query
+        if not attrs:
+            return {}
+        pav = ProductAttributeValue
+        counts = {}
+        for attr_id, string_value, bool_value, n in db.session.execute(
+            select(pav.attribute_definition_id, pav.string_value, pav.bool_value, func.count())
+            .where(pav.attribute_definition_id.in_([a.id for a in attrs]))
+            .group_by(pav.attribute_definition_id, pav.string_value, pav.bool_value)
+        ):
+            value = string_value if string_value is not None else bool_value
+            if value is not None:
+                counts.setdefault(attr_id, {})[value] = n
+        return counts
+
+    @staticmethod
+    def _top_strings(attr):
+        pav = ProductAttributeValue
+        n = func.count()
+        rows = db.session.execute(
+            select(pav.string_value, n)
+            .where(pav.attribute_definition_id == attr.id, pav.string_value.is_not(None))
+            .group_by(pav.string_value)
+            .order_by(n.desc(), pav.string_value)
+            .limit(TOP_VALUES)
+        )
+        return [{'value': value, 'count': count} for value, count in rows]
+
+    @staticmethod
+    def _histogram(attr, low, high):
+        # Equal-width buckets between min and max: [from, to), the last one includes max.
+        # One query of conditional counts, no per-bucket round trips
+        column = getattr(ProductAttributeValue, VALUE_COLUMNS[attr.data_type])
+        if attr.data_type == 'int':
+            width = max(1, math.ceil((high - low + 1) / HISTOGRAM_BUCKETS))
+            edges = list(range(low, high + 1, width)) + [low + width * math.ceil((high - low + 1) / width)]
+        elif high > low:
+            width = (high - low) / HISTOGRAM_BUCKETS
+            edges = [round(low + width * i, 6) for i in range(HISTOGRAM_BUCKETS)] + [high]
+        else:
+            edges = [low, high]
+        buckets = list(zip(edges, edges[1:]))
+        counts = db.session.execute(
+            select(*[
+                func.count(case((and_(column >= lo, column < hi) if i < len(buckets) - 1 else column >= lo, 1)))
+                for i, (lo, hi) in enumerate(buckets)
+            ]).where(ProductAttributeValue.attribute_definition_id == attr.id)
+        ).one()
+        return [{'from': lo, 'to': hi, 'count': count} for (lo, hi), count in zip(buckets, counts)]
+
+def _enum_values(attr, counts):
+    # Every option, including unused ones, then stored values no longer among the options
+    options = json.loads(attr.row['options_json'] or '[]')
+    extra = sorted(v for v in counts if v not in options)
+    return [{'value': v, 'count': counts.get(v, 0)} for v in options + extra]
+
+def _extremes_of(data_type, row):
+    # AttributeStats range columns from a row of _extremes_columns()
+    if data_type == 'int':
+        return {'min_number': row.min_int, 'max_number': row.max_int}
+    if data_type == 'decimal':
+        return {'min_number': row.min_decimal, 'max_number': row.max_decimal}
+    if data_type == 'date':
+        return {'min_date': row.min_date, 'max_date': row.max_date}
+    return {}
+
+def _extend(entry, sign, value):
+    # Widens the added or removed (low, high) range of a delta entry
+    key = 'added' if sign > 0 else 'removed'
+    current = entry[key]
+    entry[key] = (value, value) if current is None else (min(current[0], value), max(current[1], value))
+
+def _low(extent):
+    return extent[0] if extent else None
+
+def _high(extent):
+    return extent[1] if extent else None
+
+def _add(stored, new):
+    return stored + new
+
+def _least(stored, new):
+    # NULL on either side keeps the other
+    return case((stored.is_(None), new), (new < stored, new), else_=stored)
+
+def _greatest(stored, new):
+    return case((stored.is_(None), new), (new > stored, new), else_=stored)
+
+def _number(value):
+    # NUMERIC columns come back as Decimal on some drivers
+    if value is None or isinstance(value, int):
+        return value
+    return float(value)
@@ -62,18 +62,27 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   });
 
-  // Load Products with optional category filter
-  async function loadProducts() {
-    listContainer.innerHTML = "";
+  // Load Products with optional category filter, one page at a time
+  let nextCursor = null;
+
+  async function loadProducts(append = false) {
+    if (!append) {
+      listContainer.innerHTML = "";
+      nextCursor = null;
+    }
+    const params = new URLSearchParams({ expand: "attributes" });
     const filterVal = document.getElementById("filterCategory").value;
-    let url = "/api/products";
     if (filterVal) {
-      url += `?category_id=${filterVal}`;
+      params.set("category_id", filterVal);
+    }
+    if (append && nextCursor) {
+      params.set("cursor", nextCursor);
     }
-    const res = await fetch(url);
-    const prods = await res.json();
+    const res = await fetch(`/api/products?${params}`);
+    const page = await res.json();
+    nextCursor = page.next_cursor;
 
-    prods.forEach((p) => {
+    page.items.forEach((p) => {
       const li = document.createElement("li");
       li.innerHTML = `${p.name} (${p.sku}) - ${p.price || ""} ${p.currency || ""}`;
       // Add button to set attributes
@@ -83,32 +92,36 @@ document.addEventListener("DOMContentLoaded", () => {
       attrBtn.addEventListener("click", () => showProductAttributes(p));
       li.appendChild(attrBtn);
 
-      // Fetch and display attributes for this product
+      // Attributes come inline with the page (expand=attributes)
       const attrDiv = document.createElement("div");
       attrDiv.className = "product-attributes";
       attrDiv.style.marginLeft = "2em";
-      fetch(`/api/products/${p.id}`)
-        .then(r => r.json())
-        .then(prodDetail => {
-          if (prodDetail.attributes && Object.keys(prodDetail.attributes).length > 0) {
-            let html = '<ul>';
-            for (const [k, v] of Object.entries(prodDetail.attributes)) {
-              html += `<li><b>${k}</b>: ${v}</li>`;
-            }
-            html += '</ul>';
-            attrDiv.innerHTML = html;
-          } else {
-            attrDiv.innerHTML = '<i>No attributes set</i>';
-          }
-        });
+      if (p.attributes && Object.keys(p.attributes).length > 0) {
+        let html = '<ul>';
+        for (const [k, v] of Object.entries(p.attributes)) {
+          html += `<li><b>${k}</b>: ${v}</li>`;
+        }
+        html += '</ul>';
+        attrDiv.innerHTML = html;
+      } else {
+        attrDiv.innerHTML = '<i>No attributes set</i>';
+      }
       li.appendChild(attrDiv);
 
       listContainer.appendChild(li);
     });
+
+    loadMoreBtn.style.display = nextCursor ? "inline-block" : "none";
   }
 
+  const loadMoreBtn = document.createElement("button");
+  loadMoreBtn.textContent = "Load more";
+  loadMoreBtn.style.display = "none";
+  loadMoreBtn.addEventListener("click", () => loadProducts(true));
+  listContainer.after(loadMoreBtn);
+
   // Reload products when filter changes
-  document.getElementById("filterCategory").addEventListener("change", loadProducts);
+  document.getElementById("filterCategory").addEventListener("change", () => loadProducts());
 
   // Show product attribute fields for selected product
   async function showProductAttributes(product) {
@@ -0,0 +1,69 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    # create_app() against a fresh SQLite file, seeded; extra env vars override the defaults.
+    # Several apps made in one test share the database, like worker processes
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('JOB_WORKERS', '0')
+    monkeypatch.delenv('DATABASE_REPLICA_URL', raising=False)
+    monkeypatch.delenv('WARMUP', raising=False)
+    created = []
+
+    def make(**env):
+        from app import create_app
+        from database import db, init_db, seed_data
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        app = create_app()
+        app.config['TESTING'] = True
+        with app.app_context():
+            init_db()
+            seed_data()
+        created.append((app, db))
+        return app
+
+    yield make
+    for app, db in created:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def run_jobs(app):
+    # Runs queued jobs in the test thread until none is left; returns how many ran
+    def run():
+        from jobs import get_jobs
+        ran = 0
+        with app.app_context():
+            while get_jobs().run_next('test'):
+                ran += 1
+        return ran
+    return run
+
+@pytest.fixture
+def statements(app):
+    # SQL sent to the database while the test runs, in order
+    from sqlalchemy import event
+    from database import db
+    sent = []
+    listener = lambda conn, cursor, statement, parameters, context, executemany: sent.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', listener)
+    yield sent
+    event.remove(engine, 'before_cursor_execute', listener)
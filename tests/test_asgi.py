@@ -0,0 +1,44 @@
+import asyncio
+import json
+import pytest
+
+pytest.importorskip('asgiref')
+pytest.importorskip('aiosqlite')
+
+from asgi import CatalogASGI
+
+async def call(asgi_app, method, path, query=b'', body=None):
+    # -> (status, body) of one request through the ASGI app
+    messages = []
+    data = json.dumps(body).encode() if body is not None else b''
+
+    async def receive():
+        return {'type': 'http.request', 'body': data, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'root_path': '', 'query_string': query,
+             'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode())],
+             'server': ('test', 80),
+             'scheme': 'http', 'http_version': '1.1'}
+    await asgi_app(scope, receive, send)
+    return messages[0]['status'], b''.join(m.get('body', b'') for m in messages[1:])
+
+def test_writes_do_not_wait_for_a_long_poll(make_app):
+    app = make_app(ASGI_WSGI_THREADS=4, CHANGES_POLL_INTERVAL=0.05)
+    asgi_app = CatalogASGI(app)
+    since = app.test_client().get('/api/changes/cursor').get_json()['cursor']
+
+    async def scenario():
+        poll = asyncio.ensure_future(call(asgi_app, 'GET', '/api/changes', f'since={since}&wait=5'.encode()))
+        await asyncio.sleep(0.2)
+        # Passed to Flask while the long-poll holds its thread; it also ends the long-poll
+        status, _ = await asyncio.wait_for(
+            call(asgi_app, 'POST', '/api/products', body={'name': 'New', 'sku': 'NEW-1', 'category_id': 1}), 2)
+        assert status == 201
+        status, body = await asyncio.wait_for(poll, 2)
+        assert status == 200
+        assert [item['op'] for item in json.loads(body)['items']] == ['create']
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+import pytest
+
+@pytest.fixture
+def catalog(client):
+    # Phones (category 1) and watches (category 2); "Size" is an int for phones and a string for watches
+    for attr in ({'name': 'Weight', 'data_type': 'decimal'}, {'name': 'Released', 'data_type': 'date'},
+                 {'name': 'NFC', 'data_type': 'bool'}, {'name': 'Extra', 'data_type': 'json'},
+                 {'name': 'Size', 'data_type': 'int'}):
+        assert client.post('/api/categories/1/attributes', json=attr).status_code == 201
+    assert client.post('/api/categories/2/attributes', json={'name': 'Size', 'data_type': 'string'}).status_code == 201
+    phones = {}
+    for sku, os_name, ram, weight, released, nfc, size in (
+            ('F-1', 'Android', 4, 150.5, '2023-01-10', True, 6),
+            ('F-2', 'iOS', 8, 170.0, '2024-05-01', False, 10),
+            ('F-3', 'Android', 12, 190.25, '2024-09-15', True, 7)):
+        pid = client.post('/api/products', json={'name': sku, 'sku': sku, 'category_id': 1}).get_json()['id']
+        client.post(f'/api/products/{pid}/attributes', json={'attributes': {
+            'OS': os_name, 'RAM_GB': ram, 'Weight': weight, 'Released': released, 'NFC': nfc, 'Size': size}})
+        phones[sku] = pid
+    client.post('/api/products/2/attributes', json={'attributes': {'Size': 'large'}})
+    return phones
+
+def skus(client, query):
+    response = client.get(f'/api/products/search?{query}')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return {item['sku'] for item in response.get_json()['items']}
+
+def test_operators(client, catalog):
+    assert skus(client, 'attr.RAM_GB=8') == {'F-2'}
+    assert skus(client, 'attr.RAM_GB[eq]=8') == {'F-2'}
+    assert skus(client, 'attr.RAM_GB[ne]=8') == {'F-1', 'F-3'}
+    assert skus(client, 'attr.RAM_GB[gt]=8') == {'F-3'}
+    assert skus(client, 'attr.RAM_GB[gte]=8') == {'F-2', 'F-3'}
+    assert skus(client, 'attr.RAM_GB[lt]=8') == {'F-1'}
+    assert skus(client, 'attr.RAM_GB[lte]=8') == {'F-1', 'F-2'}
+    assert skus(client, 'attr.RAM_GB[in]=4,12') == {'F-1', 'F-3'}
+    # Predicates on several attributes, and on one attribute twice, are combined
+    assert skus(client, 'attr.RAM_GB[gte]=4&attr.RAM_GB[lt]=12&attr.OS=Android') == {'F-1'}
+
+def test_typed_columns(client, catalog):
+    assert skus(client, 'attr.Weight[gt]=160.5') == {'F-2', 'F-3'}
+    assert skus(client, 'attr.Released[gte]=2024-01-01') == {'F-2', 'F-3'}
+    assert skus(client, 'attr.NFC=false') == {'F-2'}
+    assert skus(client, 'category_id=1&attr.OS[in]=iOS') == {'F-2'}
+
+def test_invalid_filters_are_400(client, catalog):
+    for query, message in (
+            ('attr.RAM_GB=many', 'RAM_GB (int)'),
+            ('attr.Released=yesterday', 'Released (date)'),
+            ('attr.OS=Symbian', 'OS (enum)'),
+            ('attr.Extra=1', 'json attributes cannot be filtered'),
+            ('attr.NFC[gt]=true', 'operator gt is not supported'),
+            ('attr.RAM_GB[like]=4', 'Unsupported operator'),
+            ('attr.RAM_GB[in]=,', 'requires at least one value'),
+            ('attr.Nope=1', 'Unknown attribute: Nope'),
+            ('category_id=2&attr.RAM_GB=4', 'Unknown attribute: RAM_GB')):
+        response = client.get(f'/api/products/search?{query}')
+        assert response.status_code == 400, query
+        assert message in response.get_data(as_text=True), query
+
+def test_name_shared_by_categories_with_different_types(client, catalog):
+    # Each category's definition is matched with its own type; values that do not coerce skip it
+    assert skus(client, 'attr.Size=large') == {'CW-001'}
+    assert skus(client, 'attr.Size=10') == {'F-2'}
+    assert skus(client, 'category_id=1&attr.Size[gte]=7') == {'F-2', 'F-3'}
+    assert client.get('/api/products/search?category_id=1&attr.Size=large').status_code == 400
@@ -0,0 +1,79 @@
+import json
+from services import attributes
+from jobs import get_jobs
+from models import Job
+
+def set_os(client, pid=1, value='Android'):
+    return client.post(f'/api/products/{pid}/attributes', json={'attributes': {'OS': value, 'RAM_GB': 8}})
+
+def queued_kinds(app):
+    with app.app_context():
+        return [job.kind for job in Job.query.filter_by(status='queued')]
+
+def test_metadata_edit_queues_no_refresh(make_app):
+    app = make_app(PRODUCT_DOCUMENTS=1)
+    client = app.test_client()
+    assert set_os(client).status_code == 200
+    response = client.put('/api/categories/1/attributes/3', json={'unit': 'mAh', 'is_required': True})
+    assert response.status_code == 200
+    assert 'refresh_job' not in response.get_json()
+    assert queued_kinds(app) == []
+
+def test_rename_refreshes_documents_in_a_job(make_app):
+    app = make_app(PRODUCT_DOCUMENTS=1)
+    client = app.test_client()
+    set_os(client)
+    response = client.put('/api/categories/1/attributes/1', json={'name': 'Platform'})
+    assert response.status_code == 200
+    job_id = response.get_json()['refresh_job']
+    # The document keeps the old name until the job has run
+    assert 'OS' in client.get('/api/products/1').get_json()['attributes']
+
+    with app.app_context():
+        assert get_jobs().run_next('test')
+    assert client.get(f'/api/jobs/{job_id}').get_json()['result'] == {'refreshed': 1}
+    attributes = client.get('/api/products/1').get_json()['attributes']
+    assert attributes == {'Platform': 'Android', 'RAM_GB': 8}
+
+def test_deleting_searchable_attribute_reindexes(app, client, run_jobs):
+    set_os(client, value='iOS')
+    assert [p['sku'] for p in client.get('/api/products/search?q=ios').get_json()['items']] == ['PX-001']
+    assert client.delete('/api/categories/1/attributes/1').status_code == 204
+    assert run_jobs() == 1
+    assert client.get('/api/products/search?q=ios').get_json()['items'] == []
+
+def test_deleting_other_attribute_without_documents_queues_nothing(app, client):
+    assert client.delete('/api/categories/1/attributes/3').status_code == 204
+    assert queued_kinds(app) == []
+
+def import_phones(client, n):
+    rows = [{'sku': f'P-{i}', 'name': f'Phone {i}', 'category_id': 1, 'attributes': {'OS': 'iOS', 'RAM_GB': i}}
+            for i in range(n)]
+    body = '\n'.join(json.dumps(r) for r in rows)
+    assert client.post('/api/products/bulk', data=body).get_json()['imported'] == n
+
+def job_result(client, job_id):
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'succeeded'
+    return job['result']
+
+def test_revalidate_reports_a_bounded_list(client, run_jobs, monkeypatch):
+    monkeypatch.setattr(attributes, 'MAX_REPORTED_INVALID', 2)
+    import_phones(client, 3)
+    assert client.put('/api/categories/1/attributes/1', json={'options': ['Android']}).status_code == 200
+    response = client.post('/api/categories/1/revalidate')
+    assert response.status_code == 202
+    run_jobs()
+    result = job_result(client, response.get_json()['id'])
+    assert result['checked'] == 6 and result['invalid'] == 3
+    assert [v['value'] for v in result['invalid_values']] == ['iOS', 'iOS']
+    assert result['missing_required'] == {'OS': 1, 'RAM_GB': 1}
+
+def test_migration_reports_a_bounded_list(client, run_jobs, monkeypatch):
+    monkeypatch.setattr(attributes, 'MAX_REPORTED_INVALID', 2)
+    import_phones(client, 3)
+    response = client.put('/api/categories/1/attributes/2', json={'data_type': 'date'})
+    run_jobs()
+    result = job_result(client, response.get_json()['migration_job'])
+    assert result['migrated'] == 0 and result['invalid'] == 3
+    assert len(result['invalid_values']) == 2
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from database import db
+from models import ChangeLogEntry
+from services.changes import ChangeService
+
+def create_products(client, count):
+    for i in range(count):
+        assert client.post('/api/products', json={'name': f'P{i}', 'sku': f'CH-{i}', 'category_id': 1}).status_code == 201
+
+def test_feed_pages_by_cursor(client):
+    start = client.get('/api/changes/cursor').get_json()['cursor']
+    create_products(client, 3)
+
+    first = client.get(f'/api/changes?since={start}&limit=2').get_json()
+    assert [(c['entity'], c['op']) for c in first['items']] == [('product', 'create')] * 2
+    assert first['has_more'] is True
+    rest = client.get(f"/api/changes?since={first['next_cursor']}&limit=2").get_json()
+    assert len(rest['items']) == 1 and rest['has_more'] is False
+
+    empty = client.get(f"/api/changes?since={rest['next_cursor']}").get_json()
+    assert empty == {'items': [], 'next_cursor': rest['next_cursor'], 'has_more': False}
+    assert client.get('/api/changes/cursor').get_json()['cursor'] == rest['next_cursor']
+
+def test_bad_cursor_is_400(client):
+    assert client.get('/api/changes?since=abc').status_code == 400
+    assert client.get('/api/changes?since=-1').status_code == 400
+
+def test_compaction_keeps_latest_entry_and_expires_old_ones(app, client):
+    create_products(client, 1)
+    pid = client.get('/api/products?limit=1').get_json()['items'][0]['id']
+    client.put(f'/api/products/{pid}', json={'price': 10})
+    with app.app_context():
+        old = datetime.utcnow() - timedelta(hours=2)
+        db.session.execute(update(ChangeLogEntry).values(created_at=old))
+        db.session.commit()
+        result = ChangeService.compact(timedelta(hours=1), timedelta(days=30))
+        assert result['superseded'] >= 1 and result['expired'] == 0
+    ops = [(c['entity_id'], c['op']) for c in client.get('/api/changes').get_json()['items'] if c['entity'] == 'product']
+    assert (pid, 'update') in ops and (pid, 'create') not in ops
+
+    client.post('/api/products', json={'name': 'Later', 'sku': 'CH-LATER', 'category_id': 1})
+    with app.app_context():
+        result = ChangeService.compact(timedelta(hours=1), timedelta(hours=1))
+        assert result['expired'] >= 1
+    gone = client.get('/api/changes?since=0')
+    assert gone.status_code == 410
+    # The newest entry survives, and the cursor endpoint gives a place to resume from
+    cursor = client.get('/api/changes/cursor').get_json()['cursor']
+    assert client.get(f'/api/changes?since={cursor}').status_code == 200
+
+def test_event_stream_sends_changes_then_keepalives(make_app):
+    app = make_app(CHANGES_STREAM_SECONDS=1, CHANGES_POLL_INTERVAL=0.05, CHANGES_KEEPALIVE_SECONDS=0)
+    assert app.config['CHANGES_KEEPALIVE_SECONDS'] == 0
+    client = app.test_client()
+    start = client.get('/api/changes/cursor').get_json()['cursor']
+    create_products(client, 2)
+
+    response = client.get('/api/changes', headers={'Accept': 'text/event-stream', 'Last-Event-ID': str(start)})
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert body.count('event: change\n') == 2
+    assert f'id: {start + 1}\n' in body
+    assert ': keepalive\n\n' in body
+
+def test_keepalive_interval_is_configurable(make_app):
+    assert make_app().config['CHANGES_KEEPALIVE_SECONDS'] == 15
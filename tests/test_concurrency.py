@@ -0,0 +1,38 @@
+def test_write_returns_version_and_stale_if_match_is_412(client):
+    created = client.post('/api/products', json={'name': 'Lock', 'sku': 'LOCK-1', 'category_id': 1, 'price': 5})
+    assert created.status_code == 201
+    pid, version = created.get_json()['id'], created.get_json()['version']
+    assert created.headers['ETag'] == f'"{version}"'
+
+    updated = client.put(f'/api/products/{pid}', json={'price': 6}, headers={'If-Match': f'"{version}"'})
+    assert updated.status_code == 200
+    assert updated.headers['ETag'] == f'"{version + 1}"'
+
+    stale = client.put(f'/api/products/{pid}', json={'price': 7}, headers={'If-Match': f'"{version}"'})
+    assert stale.status_code == 412
+    assert client.get(f'/api/products/{pid}').get_json()['price'] == 6
+    assert client.delete(f'/api/products/{pid}', headers={'If-Match': f'"{version}"'}).status_code == 412
+    assert client.delete(f'/api/products/{pid}', headers={'If-Match': '*'}).status_code == 204
+
+def test_stale_attribute_write_is_412(client):
+    version = client.get('/api/products/1').get_json()['version']
+    body = {'attributes': {'RAM_GB': 8}}
+    assert client.post('/api/products/1/attributes', json=body, headers={'If-Match': f'"{version}"'}).status_code == 200
+    assert client.post('/api/products/1/attributes', json=body, headers={'If-Match': f'"{version}"'}).status_code == 412
+
+    batch = {'items': [{'product_id': 1, 'version': version, 'attributes': {'RAM_GB': 12}}]}
+    assert client.post('/api/products/attributes', json=batch).status_code == 412
+
+def test_malformed_if_match_is_400(client):
+    assert client.put('/api/products/1', json={'price': 1}, headers={'If-Match': '"abc"'}).status_code == 400
+
+def test_if_match_required_when_configured(make_app):
+    client = make_app(REQUIRE_IF_MATCH='1').test_client()
+    assert client.put('/api/products/1', json={'price': 1}).status_code == 428
+    version = client.get('/api/products/1').get_json()['version']
+    assert client.put('/api/products/1', json={'price': 1}, headers={'If-Match': f'"{version}"'}).status_code == 200
+
+def test_duplicates_are_409(client):
+    assert client.post('/api/products', json={'name': 'Copy', 'sku': 'PX-001', 'category_id': 1}).status_code == 409
+    assert client.post('/api/categories/1/attributes', json={'name': 'OS', 'data_type': 'string'}).status_code == 409
+    assert client.delete('/api/categories/1').status_code == 409
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import func, select
+from database import db
+from jobs import get_jobs
+from models import Product, ProductAttributeValue, ProductDocument, ProductSearchTerm
+
+@pytest.fixture
+def app(make_app):
+    return make_app(PRODUCT_DOCUMENTS='1', SEARCH_INDEX='terms')
+
+@pytest.fixture
+def phones(client):
+    ids = [1]
+    for i in range(4):
+        ids.append(client.post('/api/products', json={'name': f'Phone {i}', 'sku': f'DEL-{i}', 'category_id': 1}).get_json()['id'])
+    for pid in ids:
+        client.post(f'/api/products/{pid}/attributes', json={'attributes': {'OS': 'Android', 'RAM_GB': 4}})
+    return ids
+
+def rows_for(app, ids):
+    # Rows left per table for the given products
+    with app.app_context():
+        count = lambda model: db.session.scalar(select(func.count()).select_from(model).where(model.product_id.in_(ids)))
+        return {
+            'products': db.session.scalar(select(func.count()).select_from(Product).where(Product.id.in_(ids))),
+            'values': count(ProductAttributeValue),
+            'documents': count(ProductDocument),
+            'search': count(ProductSearchTerm)
+        }
+
+def test_delete_many_skips_unknown_ids_and_removes_dependent_rows(app, client, phones):
+    before = rows_for(app, phones[:2])
+    assert (before['products'], before['values'], before['documents']) == (2, 4, 2) and before['search'] > 0
+    response = client.delete(f'/api/products?ids={phones[0]},{phones[1]},999999')
+    assert response.status_code == 200
+    assert response.get_json() == {'deleted': 2}
+    assert rows_for(app, phones[:2]) == {'products': 0, 'values': 0, 'documents': 0, 'search': 0}
+    assert rows_for(app, phones[2:])['products'] == 3
+    assert client.get(f'/api/products/{phones[0]}').status_code == 404
+    assert client.get('/api/products/search?q=phone').get_json()['items'][0]['id'] in phones[2:]
+
+def test_delete_many_validates_ids(client, monkeypatch):
+    assert client.delete('/api/products?ids=').status_code == 400
+    assert client.delete('/api/products?ids=1,x').status_code == 400
+    monkeypatch.setattr('routes.products.MAX_BATCH_SIZE', 1)
+    assert client.delete('/api/products?ids=1,2').status_code == 400
+
+def test_purge_job_deletes_in_chunks_and_reports_progress(app, client, phones, statements, run_jobs):
+    with app.app_context():
+        job_id = get_jobs().submit('purge_category_products', category_id=1, chunk_size=2).id
+    statements.clear()
+    assert run_jobs() == 1
+    assert sum(s.startswith('DELETE FROM products') for s in statements) == 3
+
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert (job['status'], job['total'], job['done'], job['progress']) == ('succeeded', 5, 5, 1.0)
+    assert job['result'] == {'deleted': 5}
+    assert rows_for(app, phones) == {'products': 0, 'values': 0, 'documents': 0, 'search': 0}
+    assert client.get('/api/products/2').status_code == 200
+
+def test_purge_route_sync_and_async(app, client, phones, run_jobs):
+    accepted = client.delete('/api/categories/2/products?async=1')
+    assert accepted.status_code == 202
+    assert client.get(accepted.headers['Location']).get_json()['status'] == 'queued'
+    run_jobs()
+    assert client.get(accepted.headers['Location']).get_json()['result'] == {'deleted': 1}
+    assert client.delete('/api/categories/1/products').get_json() == {'deleted': 5}
+    assert client.delete('/api/categories/99/products').status_code == 404
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import pytest
+from services.exports import ExportService
+
+@pytest.fixture
+def catalog(client):
+    client.post('/api/categories/2/attributes', json={'name': 'Specs', 'data_type': 'json'})
+    client.post('/api/categories/2/attributes', json={'name': 'Waterproof', 'data_type': 'bool'})
+    client.post('/api/products/1/attributes', json={'attributes': {'OS': 'iOS', 'RAM_GB': 6}})
+    client.post('/api/products/2/attributes', json={'attributes': {
+        'Dial_Color': 'black', 'Specs': {'lugs': 20}, 'Waterproof': True}})
+    # A product without attribute values still gets a record
+    return client.post('/api/products', json={'name': 'Bare', 'sku': 'BARE-1', 'category_id': 1, 'price': 5}).get_json()['id']
+
+def ndjson(response):
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_ndjson_records(client, catalog):
+    response = client.get('/api/products/export')
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=products.ndjson'
+    records = ndjson(response)
+    assert [r['id'] for r in records] == [1, 2, catalog]
+    assert records[0]['attributes'] == {'OS': 'iOS', 'RAM_GB': 6}
+    assert records[1]['attributes'] == {'Dial_Color': 'black', 'Specs': {'lugs': 20}, 'Waterproof': True}
+    assert records[2]['attributes'] == {}
+    assert (records[2]['sku'], records[2]['price'], records[2]['category_id']) == ('BARE-1', 5, 1)
+
+def test_csv_pivots_attributes_of_every_category(client, catalog):
+    response = client.get('/api/products/export?format=csv')
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [int(r['id']) for r in rows] == [1, 2, catalog]
+    attr_columns = [c for c in rows[0] if c.startswith('attr.')]
+    assert attr_columns == sorted(['attr.OS', 'attr.RAM_GB', 'attr.Battery_mAh', 'attr.Dial_Color', 'attr.Dial_Size_mm',
+                                   'attr.Strap_Type', 'attr.Specs', 'attr.Waterproof'])
+    assert (rows[0]['attr.OS'], rows[0]['attr.RAM_GB'], rows[0]['attr.Dial_Color']) == ('iOS', '6', '')
+    assert json.loads(rows[1]['attr.Specs']) == {'lugs': 20}
+    assert all(rows[2][c] == '' for c in attr_columns)
+
+def test_category_filter(client, catalog):
+    assert [r['id'] for r in ndjson(client.get('/api/products/export?category_id=2'))] == [2]
+    header = client.get('/api/products/export?format=csv&category_id=1').get_data(as_text=True).splitlines()[0]
+    assert header.endswith('attr.Battery_mAh,attr.OS,attr.RAM_GB')
+    assert ndjson(client.get('/api/products/export?category_id=99')) == []
+    assert client.get('/api/products/export?format=xml').status_code == 400
+    assert client.get('/api/products/export?category_id=x').status_code == 400
+
+def test_csv_export_imports_back(client, catalog):
+    exported = client.get('/api/products/export?format=csv&category_id=1').get_data()
+    report = client.post('/api/products/bulk', data=exported, content_type='text/csv').get_json()
+    assert (report['imported'], report['failed']) == (2, 0)
+    assert ndjson(client.get('/api/products/export?category_id=1'))[0]['attributes'] == {'OS': 'iOS', 'RAM_GB': 6}
+
+def test_output_is_streamed_in_chunks(app, catalog, monkeypatch):
+    monkeypatch.setattr('services.exports.RECORDS_PER_CHUNK', 2)
+    with app.app_context():
+        for fmt in ('ndjson', 'csv'):
+            chunks = list(ExportService.stream(fmt))
+            assert len(chunks) == 2
+        lines = ''.join(ExportService.stream('ndjson')).splitlines()
+        assert len(lines) == 3
@@ -0,0 +1,43 @@
+from database import bump_version, db, get_version
+
+def test_list_revalidates_with_304_until_a_write(client):
+    first = client.get('/api/products')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get('/api/products', headers={'If-None-Match': etag}).status_code == 304
+
+    client.post('/api/products', json={'name': 'New', 'sku': 'NEW-1', 'category_id': 1})
+    after = client.get('/api/products', headers={'If-None-Match': etag})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != etag
+
+def test_if_modified_since(client):
+    first = client.get('/api/categories')
+    assert client.get('/api/categories', headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+
+def test_bump_version_creates_then_increments(app):
+    with app.app_context():
+        assert get_version('new-counter') == 0
+        bump_version('new-counter')
+        db.session.commit()
+        bump_version('new-counter')
+        bump_version('new-counter')
+        db.session.commit()
+        assert get_version('new-counter') == 3
+
+def test_response_cache_is_invalidated_by_writes_in_any_process(make_app):
+    first = make_app(RESPONSE_CACHE_SIZE=16)
+    other = make_app(RESPONSE_CACHE_SIZE=16)
+    client = first.test_client()
+    stats = lambda: client.get('/api/_stats/response-cache').get_json()
+
+    assert client.get('/api/products/1').get_json()['price'] == 699
+    assert client.get('/api/products/1').get_json()['price'] == 699
+    assert stats()['hits'] == 1
+
+    # A write in this process drops the entry; one in another process changes the ETag
+    client.put('/api/products/1', json={'price': 650})
+    assert stats()['entries'] == 0
+    assert client.get('/api/products/1').get_json()['price'] == 650
+    other.test_client().put('/api/products/1', json={'price': 600})
+    assert client.get('/api/products/1').get_json()['price'] == 600
@@ -0,0 +1,53 @@
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from database import db
+from models import IdempotencyKey, Product
+
+def product_count(app):
+    with app.app_context():
+        return db.session.scalar(select(func.count()).select_from(Product))
+
+def test_retry_replays_the_stored_response(app, client):
+    body = {'name': 'Once', 'sku': 'IDEM-1', 'category_id': 1}
+    first = client.post('/api/products', json=body, headers={'Idempotency-Key': 'k1'})
+    assert first.status_code == 201
+    count = product_count(app)
+
+    retry = client.post('/api/products', json=body, headers={'Idempotency-Key': 'k1'})
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.headers['ETag'] == first.headers['ETag']
+    assert retry.get_json() == first.get_json()
+    assert product_count(app) == count
+
+def test_key_reused_with_a_different_body_is_422(client):
+    client.post('/api/products', json={'name': 'A', 'sku': 'IDEM-A', 'category_id': 1}, headers={'Idempotency-Key': 'k2'})
+    other = client.post('/api/products', json={'name': 'B', 'sku': 'IDEM-B', 'category_id': 1}, headers={'Idempotency-Key': 'k2'})
+    assert other.status_code == 422
+
+def test_failed_request_releases_its_key(client):
+    body = {'name': 'Dup', 'sku': 'PX-001', 'category_id': 1}
+    assert client.post('/api/products', json=body, headers={'Idempotency-Key': 'k3'}).status_code == 409
+    body['sku'] = 'IDEM-3'
+    retry = client.post('/api/products', json=body, headers={'Idempotency-Key': 'k3'})
+    assert retry.status_code == 201
+    assert 'Idempotent-Replayed' not in retry.headers
+
+def test_request_in_progress_is_409_until_it_times_out(app, client):
+    body = {'name': 'Slow', 'sku': 'IDEM-4', 'category_id': 1}
+    # Claim the key the way a concurrent request would, then retry while it is pending
+    with app.test_request_context():
+        key_hash = hashlib.sha256(b'POST /api/products\nk4').hexdigest()
+        assert app.extensions['idempotency'].claim(key_hash) is None
+    assert client.post('/api/products', json=body, headers={'Idempotency-Key': 'k4'}).status_code == 409
+
+    with app.app_context():
+        entry = db.session.get(IdempotencyKey, key_hash)
+        entry.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+    assert client.post('/api/products', json=body, headers={'Idempotency-Key': 'k4'}).status_code == 201
+
+def test_invalid_key_is_400(client):
+    body = {'name': 'X', 'sku': 'IDEM-5', 'category_id': 1}
+    assert client.post('/api/products', json=body, headers={'Idempotency-Key': 'x' * 256}).status_code == 400
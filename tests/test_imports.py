@@ -0,0 +1,82 @@
+import json
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import ProductAttributeValue
+from services.imports import ImportService
+
+def bulk(client, rows, **query):
+    body = '\n'.join(json.dumps(r) for r in rows)
+    return client.post('/api/products/bulk', data=body, query_string=query, content_type='application/x-ndjson')
+
+def product_by_sku(client, sku):
+    items = client.get('/api/products?expand=attributes&limit=100').get_json()['items']
+    return next(p for p in items if p['sku'] == sku)
+
+def test_reports_invalid_rows_and_imports_the_rest(client):
+    response = bulk(client, [
+        {'sku': 'A-1', 'name': 'Phone A', 'category_id': 1, 'attributes': {'OS': 'iOS', 'RAM_GB': 4}},
+        {'sku': 'A-2', 'name': 'Phone B', 'category_id': 99},
+        {'sku': 'A-3', 'name': 'Phone C', 'category_id': 1, 'attributes': {'OS': 'Symbian'}},
+        {'sku': 'A-4', 'category_id': 1},
+        {'sku': 'A-5', 'name': 'Phone D', 'category_id': 1, 'attributes': {'Dial_Color': 'red'}}
+    ])
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report['processed'], report['imported'], report['failed']) == (5, 1, 4)
+    assert [(e['row'], e['sku']) for e in report['errors']] == [(2, 'A-2'), (3, 'A-3'), (4, 'A-4'), (5, 'A-5')]
+    assert 'Unknown category_id' in report['errors'][0]['error']
+    assert product_by_sku(client, 'A-1')['attributes'] == {'OS': 'iOS', 'RAM_GB': 4}
+
+def test_invalid_json_line_and_csv(client):
+    report = client.post('/api/products/bulk', data='{"sku": \nnot json', content_type='application/x-ndjson').get_json()
+    assert report['failed'] == 2 and report['imported'] == 0
+    csv = 'sku,name,category_id,price,attr.Dial_Color\nCW-9,Watch,2,10.5,blue\n'
+    report = client.post('/api/products/bulk', data=csv, content_type='text/csv').get_json()
+    assert report['imported'] == 1
+    watch = product_by_sku(client, 'CW-9')
+    assert watch['price'] == 10.5 and watch['attributes'] == {'Dial_Color': 'blue'}
+
+def test_duplicate_sku_in_a_chunk_is_reported(client):
+    report = bulk(client, [
+        {'sku': 'D-1', 'name': 'First', 'category_id': 1},
+        {'sku': 'D-1', 'name': 'Second', 'category_id': 1}
+    ]).get_json()
+    assert (report['processed'], report['imported'], report['failed']) == (2, 1, 1)
+    assert report['errors'] == [{'row': 1, 'sku': 'D-1', 'error': 'Superseded by row 2 with the same sku'}]
+    assert product_by_sku(client, 'D-1')['name'] == 'Second'
+
+def test_update_keeps_columns_missing_from_the_row(client):
+    bulk(client, [{'sku': 'PX-001', 'name': 'Pixel X2', 'category_id': 1}])
+    product = product_by_sku(client, 'PX-001')
+    assert (product['name'], product['price'], product['currency']) == ('Pixel X2', 699, 'USD')
+    bulk(client, [{'sku': 'PX-001', 'name': 'Pixel X2', 'category_id': 1, 'price': None}])
+    assert product_by_sku(client, 'PX-001')['price'] is None
+
+def test_category_change_drops_old_attribute_values(app, client):
+    client.post('/api/products/1/attributes', json={'attributes': {'OS': 'iOS', 'RAM_GB': 6}})
+    report = bulk(client, [{'sku': 'PX-001', 'name': 'Pixel Watch', 'category_id': 2,
+                            'attributes': {'Dial_Color': 'black'}}]).get_json()
+    assert report['imported'] == 1
+    assert product_by_sku(client, 'PX-001')['attributes'] == {'Dial_Color': 'black'}
+    with app.app_context():
+        assert db.session.query(ProductAttributeValue).filter_by(product_id=1).count() == 1
+
+def test_database_error_fails_only_the_offending_row(client, monkeypatch):
+    write = ImportService._write
+
+    def failing_write(entries):
+        if any(product['sku'] == 'BAD-2' for _, product, _ in entries):
+            raise IntegrityError('INSERT', {}, Exception('constraint'))
+        write(entries)
+
+    monkeypatch.setattr(ImportService, '_write', staticmethod(failing_write))
+    report = bulk(client, [{'sku': f'BAD-{i}', 'name': 'Row', 'category_id': 1} for i in range(1, 4)]).get_json()
+    assert (report['imported'], report['failed']) == (2, 1)
+    assert report['errors'] == [{'row': 2, 'sku': 'BAD-2', 'error': 'Database error: IntegrityError'}]
+    assert product_by_sku(client, 'BAD-3')['name'] == 'Row'
+
+def test_reported_errors_are_capped(client, monkeypatch):
+    monkeypatch.setattr('services.imports.MAX_REPORTED_ERRORS', 2)
+    report = bulk(client, [{'sku': f'E-{i}', 'category_id': 1} for i in range(5)]).get_json()
+    assert report['failed'] == 5
+    assert len(report['errors']) == 2 and report['errors_truncated'] is True
@@ -0,0 +1,59 @@
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from database import db
+
+def test_sql_count_and_timing_headers(client, statements):
+    response = client.get('/api/products/1')
+    assert int(response.headers['X-SQL-Count']) == len(statements) > 0
+    assert response.headers['Server-Timing'].startswith('app;dur=')
+    assert 'X-N-Plus-One' not in response.headers
+
+def test_repeated_statement_is_flagged(make_app, caplog):
+    client = make_app(N_PLUS_ONE_THRESHOLD=1).test_client()
+    # Creating a product bumps three change counters with the same statement
+    response = client.post('/api/products', json={'name': 'N', 'sku': 'NP-1', 'category_id': 1})
+    assert response.status_code == 201
+    assert int(response.headers['X-N-Plus-One']) >= 2
+    assert 'Possible N+1 on POST /api/products' in caplog.text
+    assert 'X-N-Plus-One' not in client.get('/api/products/1').headers
+
+def test_metrics_text(client):
+    client.get('/api/products/1')
+    client.get('/api/products/999999')
+    response = client.get('/api/_metrics')
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'pm_requests_total{route="/api/products/<int:pid>",method="GET",status="200"} 1' in body
+    assert 'pm_requests_total{route="/api/products/<int:pid>",method="GET",status="404"} 1' in body
+    assert 'pm_request_sql_statements_bucket{route="/api/products/<int:pid>",le="+Inf"} 2' in body
+    assert '# TYPE pm_request_duration_seconds histogram' in body
+    assert 'pm_schema_cache_hits ' in body
+
+def test_profile_only_when_enabled(make_app, client):
+    assert client.get('/api/products?_profile=1').mimetype == 'application/json'
+    profiled = make_app(PROFILING_ENABLED='1').test_client().get('/api/products?_profile=1')
+    assert profiled.mimetype == 'text/plain'
+    body = profiled.get_data(as_text=True)
+    assert body.startswith('GET /api/products?_profile=1: ') and 'SQL statements' in body
+    assert 'cumulative' in body
+
+def test_failed_statements_leave_no_state_on_the_connection(make_app):
+    app = make_app()
+
+    @app.get('/probe')
+    def probe():
+        connection = db.session.connection()
+        db.session.execute(text('select 1'))
+        before = {key: repr(value) for key, value in connection.info.items()}
+        for _ in range(3):
+            try:
+                db.session.execute(text('select * from nope'))
+            except OperationalError:
+                pass
+        db.session.execute(text('select 1'))
+        assert {key: repr(value) for key, value in connection.info.items()} == before
+        return 'ok'
+
+    response = app.test_client().get('/probe')
+    assert response.status_code == 200
+    assert response.headers['X-SQL-Count'] == '2'
@@ -0,0 +1,47 @@
+from datetime import datetime
+from sqlalchemy import update
+from database import db
+from models import Product
+
+def walk(client, query, limit):
+    ids, cursor = [], None
+    while True:
+        page = client.get(f'/api/products?{query}&limit={limit}' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        ids += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+def test_cursor_walk_visits_each_product_once_when_created_at_ties(app, client):
+    for i in range(7):
+        client.post('/api/products', json={'name': f'P{i}', 'sku': f'TIE-{i}', 'category_id': 1 + i % 2})
+    with app.app_context():
+        db.session.execute(update(Product).values(created_at=datetime(2024, 1, 1)))
+        db.session.commit()
+    ids = walk(client, 'fields=id', 2)
+    assert ids == sorted(ids, reverse=True) and len(ids) == 9
+    category_2 = walk(client, 'category_id=2', 3)
+    assert category_2 == sorted(category_2, reverse=True) and len(category_2) == 4
+
+def test_newest_first_and_bad_cursor(client):
+    created = client.post('/api/products', json={'name': 'New', 'sku': 'NEW-1', 'category_id': 1}).get_json()
+    assert client.get('/api/products?limit=1').get_json()['items'][0]['id'] == created['id']
+    assert client.get('/api/products?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/products?limit=0').status_code == 400
+
+def test_price_and_sku_prefix_filters(client):
+    for sku, price in (('AB_1', 10), ('AB%2', 20), ('ABX3', 30)):
+        client.post('/api/products', json={'name': sku, 'sku': sku, 'category_id': 1, 'price': price})
+    skus = lambda query: {item['sku'] for item in client.get(f'/api/products?{query}').get_json()['items']}
+    assert skus('min_price=15&max_price=30&sku_prefix=AB') == {'AB%2', 'ABX3'}
+    # LIKE wildcards in the prefix match themselves only
+    assert skus('sku_prefix=AB_') == {'AB_1'}
+    assert skus('sku_prefix=AB%25') == {'AB%2'}
+    assert client.get('/api/products?min_price=cheap').status_code == 400
+
+def test_expand_attributes(client):
+    client.post('/api/products/1/attributes', json={'attributes': {'OS': 'iOS', 'RAM_GB': 6}})
+    items = {item['id']: item for item in client.get('/api/products?expand=attributes').get_json()['items']}
+    assert items[1]['attributes'] == {'OS': 'iOS', 'RAM_GB': 6}
+    assert items[2]['attributes'] == {}
+    assert 'attributes' not in client.get('/api/products').get_json()['items'][0]
@@ -0,0 +1,21 @@
+def test_rename_in_one_process_reaches_another(make_app):
+    first, second = make_app(), make_app()
+    a, b = first.test_client(), second.test_client()
+    # Both processes have the schema cached
+    assert [r['name'] for r in b.get('/api/categories/1/attributes').get_json()][0] == 'Battery_mAh'
+    assert b.post('/api/products/1/attributes', json={'attributes': {'OS': 'iOS'}}).status_code == 200
+
+    assert a.put('/api/categories/1/attributes/1', json={'name': 'Platform'}).status_code == 200
+
+    names = [r['name'] for r in b.get('/api/categories/1/attributes').get_json()]
+    assert 'Platform' in names and 'OS' not in names
+    stale_write = b.post('/api/products/1/attributes', json={'attributes': {'OS': 'Android'}})
+    assert stale_write.status_code == 400
+    assert b.post('/api/products/1/attributes', json={'attributes': {'Platform': 'Android'}}).status_code == 200
+
+def test_local_registry_when_not_shared(make_app):
+    app = make_app(SCHEMA_CACHE_SHARED=0)
+    client = app.test_client()
+    assert client.get('/api/_stats/schema-cache').get_json()['shared'] is False
+    assert client.put('/api/categories/1/attributes/1', json={'name': 'Platform'}).status_code == 200
+    assert 'Platform' in [r['name'] for r in client.get('/api/categories/1/attributes').get_json()]
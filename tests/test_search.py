@@ -0,0 +1,85 @@
+import pytest
+from database import db
+from models import fts5_available
+
+@pytest.fixture(params=['fts5', 'terms'])
+def client(request, make_app):
+    app = make_app(SEARCH_INDEX='auto' if request.param == 'fts5' else 'terms')
+    with app.app_context():
+        if request.param == 'fts5' and not fts5_available(db.session.connection()):
+            pytest.skip('SQLite is built without FTS5')
+    client = app.test_client()
+    client.get('/api/products/search?q=warmup')
+    assert app.extensions['search_index'] == request.param
+    return client
+
+def create(client, sku, name, category_id=1, **fields):
+    response = client.post('/api/products', json=dict(fields, name=name, sku=sku, category_id=category_id))
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+def search(client, q, **query):
+    response = client.get('/api/products/search', query_string=dict(query, q=q))
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+def found(client, q, **query):
+    return [item['sku'] for item in search(client, q, **query)['items']]
+
+def test_every_word_matches_as_a_prefix(client):
+    create(client, 'S-1', 'Pixel 128GB')
+    create(client, 'S-2', 'Pixel Fold')
+    create(client, 'S-3', 'Café Racer', description='Limited édition')
+    assert found(client, 'pix 12') == ['S-1']
+    assert sorted(found(client, 'PIXEL')) == ['S-1', 'S-2']
+    assert found(client, 'cafe EDITION') == ['S-3']
+    assert found(client, 'pixel racer') == []
+
+def test_name_and_sku_rank_above_attributes_and_description(client):
+    create(client, 'S-DESC', 'Plain one', description='amber finish')
+    attr = create(client, 'S-ATTR', 'Plain two', category_id=2)
+    client.post(f'/api/products/{attr}/attributes', json={'attributes': {'Dial_Color': 'amber'}})
+    create(client, 'S-NAME', 'Amber watch')
+    create(client, 'AMBER-9', 'Plain three')
+    ranked = found(client, 'amber')
+    assert sorted(ranked[:2]) == ['AMBER-9', 'S-NAME']
+    assert ranked[2:] == ['S-ATTR', 'S-DESC']
+
+def test_cursor_pages_in_relevance_order(client):
+    for i in range(5):
+        create(client, f'P-{i}', 'Lamp ' + 'lamp ' * i, description='lamp')
+    everything = found(client, 'lamp', limit=50)
+    assert len(everything) == 5
+    walked, cursor = [], None
+    while True:
+        page = search(client, 'lamp', limit=2, **({'cursor': cursor} if cursor else {}))
+        walked += [item['sku'] for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert walked == everything
+    assert client.get('/api/products/search?q=lamp&cursor=bad').status_code == 400
+
+def test_index_follows_product_and_attribute_writes(client):
+    pid = create(client, 'W-1', 'Orion phone')
+    client.put(f'/api/products/{pid}', json={'name': 'Vega phone'})
+    assert found(client, 'orion') == [] and found(client, 'vega') == ['W-1']
+
+    client.post(f'/api/products/{pid}/attributes', json={'attributes': {'OS': 'Android'}})
+    assert found(client, 'android') == ['W-1']
+    client.post(f'/api/products/{pid}/attributes', json={'attributes': {'OS': 'iOS'}})
+    assert found(client, 'android') == [] and found(client, 'ios') == ['W-1']
+    # Non-searchable types are not indexed
+    client.post(f'/api/products/{pid}/attributes', json={'attributes': {'RAM_GB': 3072}})
+    assert found(client, '3072') == []
+
+    assert found(client, 'vega', category_id=2) == []
+    client.delete(f'/api/products/{pid}')
+    assert found(client, 'vega') == []
+
+def test_query_without_words_is_400(client):
+    assert client.get('/api/products/search?q=%20-%20').status_code == 400
+
+def test_disabled_search_is_400(make_app):
+    client = make_app(SEARCH_INDEX='off').test_client()
+    assert client.get('/api/products/search?q=pixel').status_code == 400
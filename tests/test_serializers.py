@@ -0,0 +1,24 @@
+import json
+import pytest
+from flask.json.provider import DefaultJSONProvider
+from serializers import OrjsonProvider, orjson
+
+PAYLOAD = {'name': 'Montre «Été»', 'id': 2 ** 70}
+
+def test_default_encoder_escapes_non_ascii_and_keeps_big_ints(app):
+    assert type(app.json) is DefaultJSONProvider
+    body = app.json.dumps(PAYLOAD)
+    assert '\\u00c9t\\u00e9' in body
+    assert json.loads(body) == PAYLOAD
+
+    with app.app_context():
+        response = app.json.response(PAYLOAD)
+    assert response.get_data().isascii()
+
+@pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+def test_orjson_differences(make_app):
+    app = make_app(USE_ORJSON='1')
+    assert isinstance(app.json, OrjsonProvider)
+    assert 'Été' in app.json.dumps({'name': PAYLOAD['name']})
+    with pytest.raises(TypeError):
+        app.json.dumps(PAYLOAD)
@@ -0,0 +1,88 @@
+from database import db
+from models import ProductAttributeValue
+
+def values_of(app, pid):
+    with app.app_context():
+        return {row.attribute_definition_id: row.int_value if row.int_value is not None else row.string_value
+                for row in db.session.query(ProductAttributeValue).filter_by(product_id=pid)}
+
+def create_phones(client, count):
+    return [client.post('/api/products', json={'name': f'Phone {i}', 'sku': f'SA-{i}', 'category_id': 1}).get_json()['id']
+            for i in range(count)]
+
+def test_write_inserts_then_updates_in_place(app, client):
+    first = client.post('/api/products/1/attributes', json={'attributes': {'OS': 'iOS', 'RAM_GB': 4}})
+    assert first.status_code == 200
+    assert first.get_json()['attributes'] == {'OS': 'iOS', 'RAM_GB': 4}
+    assert values_of(app, 1) == {1: 'iOS', 2: 4}
+
+    second = client.post('/api/products/1/attributes', json={'attributes': {'RAM_GB': '8'}})
+    assert second.get_json()['attributes'] == {'OS': 'iOS', 'RAM_GB': 8}
+    assert second.get_json()['version'] == first.get_json()['version'] + 1
+    assert values_of(app, 1) == {1: 'iOS', 2: 8}
+
+def test_batch_merges_items_for_the_same_product(app, client):
+    response = client.post('/api/products/attributes', json={'items': [
+        {'product_id': 1, 'attributes': {'OS': 'iOS', 'RAM_GB': 4}},
+        {'product_id': 2, 'attributes': {'Dial_Color': 'red'}},
+        {'product_id': 1, 'attributes': {'OS': 'Android'}}
+    ]})
+    assert response.status_code == 200
+    items = response.get_json()['items']
+    assert [item['id'] for item in items] == [1, 2]
+    assert items[0]['attributes'] == {'OS': 'Android', 'RAM_GB': 4}
+    assert items[1]['attributes'] == {'Dial_Color': 'red'}
+
+def test_batch_is_all_or_nothing(app, client):
+    response = client.post('/api/products/attributes', json={'items': [
+        {'product_id': 1, 'attributes': {'RAM_GB': 4}},
+        {'product_id': 2, 'attributes': {'Dial_Size_mm': 'large'}}
+    ]})
+    assert response.status_code == 400
+    assert 'Dial_Size_mm' in response.get_data(as_text=True)
+    assert values_of(app, 1) == {}
+
+    unknown = client.post('/api/products/attributes', json={'items': [
+        {'product_id': 1, 'attributes': {'RAM_GB': 4}}, {'product_id': 2, 'attributes': {'OS': 'iOS'}}
+    ]})
+    assert unknown.status_code == 400
+    assert values_of(app, 1) == {}
+
+def test_batch_rejects_unknown_ids_and_bad_items(client):
+    response = client.post('/api/products/attributes', json={'items': [
+        {'product_id': 1, 'attributes': {}}, {'product_id': 999, 'attributes': {}}, {'product_id': 998, 'attributes': {}}
+    ]})
+    assert response.status_code == 404
+    assert '[998, 999]' in response.get_data(as_text=True)
+    assert client.post('/api/products/attributes', json={'items': []}).status_code == 400
+    assert client.post('/api/products/attributes', json={'items': [{'product_id': 'x', 'attributes': {}}]}).status_code == 400
+    assert client.post('/api/products/attributes', json={'items': [{'product_id': 1}]}).status_code == 400
+
+def test_batch_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr('services.products.MAX_BATCH_SIZE', 2)
+    items = [{'product_id': 1, 'attributes': {}}] * 3
+    response = client.post('/api/products/attributes', json={'items': items})
+    assert response.status_code == 400
+    assert 'At most 2 items' in response.get_data(as_text=True)
+    assert client.post('/api/products/attributes', json={'items': items[:2]}).status_code == 200
+
+def test_statements_do_not_grow_with_the_batch(client, statements):
+    ids = create_phones(client, 6)
+    batch = lambda pids: client.post('/api/products/attributes', json={'items': [
+        {'product_id': pid, 'attributes': {'OS': 'iOS', 'RAM_GB': 6}} for pid in pids]})
+    # Loads the category schema, so both measured batches start from the same state
+    client.post('/api/products/1/attributes', json={'attributes': {'OS': 'iOS'}})
+
+    statements.clear()
+    one = batch(ids[:1])
+    # Products, schema check, version UPDATE, value prefetch, value upsert, search index (3),
+    # stats (3), change counters (3), change log
+    assert one.headers['X-SQL-Count'] == '15'
+    assert sum(s.startswith('INSERT INTO product_attribute_values') for s in statements) == 1
+    assert sum(s.lstrip().startswith('SELECT') and 'FROM product_attribute_values' in s for s in statements) == 1
+
+    statements.clear()
+    five = batch(ids[1:])
+    assert sum(s.startswith('INSERT INTO product_attribute_values') for s in statements) == 1
+    # Each product's version is bumped with its own UPDATE; everything else is one statement per batch
+    assert int(five.headers['X-SQL-Count']) == int(one.headers['X-SQL-Count']) + 4
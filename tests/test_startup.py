@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+from conftest import ROOT
+
+# Wall-clock limit for `import app` in a fresh interpreter, best of three. About 450 ms on a
+# developer machine, mostly Flask and SQLAlchemy; override on slow CI runners
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 1000))
+# Only needed by CLI commands, which import them when they run
+CLI_ONLY_MODULES = ('services.imports', 'services.exports', 'services.documents', 'services.search_index',
+                    'services.changes', 'warmup')
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+print(json.dumps({'ms': (time.perf_counter() - started) * 1000, 'modules': sorted(sys.modules)}))
+'''
+
+def probe():
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def test_import_app_stays_within_budget():
+    runs = [probe() for _ in range(3)]
+    assert not set(CLI_ONLY_MODULES).intersection(runs[0]['modules'])
+    best = min(run['ms'] for run in runs)
+    assert best < IMPORT_BUDGET_MS, f'import app took {best:.0f} ms, budget {IMPORT_BUDGET_MS:.0f} ms'
+
+def test_cli_commands_import_their_services(app, tmp_path):
+    feed = tmp_path / 'feed.ndjson'
+    feed.write_text(json.dumps({'sku': 'CLI-1', 'name': 'From CLI', 'category_id': 1}) + '\n')
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['import-products', str(feed)])
+    assert result.exit_code == 0, result.output
+    assert 'imported 1, failed 0' in result.output
+    result = runner.invoke(args=['export-products', '--format', 'csv'])
+    assert result.exit_code == 0 and 'CLI-1' in result.output
+    assert runner.invoke(args=['rebuild-search-index']).exit_code == 0
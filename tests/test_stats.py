@@ -0,0 +1,120 @@
+import pytest
+from database import db
+from models import AttributeStats, CategoryStats
+from schema_registry import get_registry
+from services.stats import StatsService
+
+@pytest.fixture
+def phones(client):
+    # Category 1 gets integer and string attributes next to the seeded OS enum and RAM_GB int
+    client.post('/api/categories/1/attributes', json={'name': 'Color', 'data_type': 'string'})
+    client.post('/api/categories/1/attributes', json={'name': 'Released', 'data_type': 'date'})
+    client.post('/api/categories/1/attributes', json={'name': 'NFC', 'data_type': 'bool'})
+    ids = [1]
+    for i, price in enumerate((100, 250.5, 400)):
+        ids.append(client.post('/api/products', json={'name': f'Phone {i}', 'sku': f'PH-{i}',
+                                                      'category_id': 1, 'price': price}).get_json()['id'])
+    values = [('Android', 4, 'black', '2023-01-10', True), ('iOS', 6, 'white', '2024-05-01', False),
+              ('Android', 8, 'black', '2022-11-30', True), ('Android', 12, 'blue', '2024-09-15', True)]
+    for pid, (os_name, ram, color, released, nfc) in zip(ids, values):
+        client.post(f'/api/products/{pid}/attributes', json={'attributes': {
+            'OS': os_name, 'RAM_GB': ram, 'Color': color, 'Released': released, 'NFC': nfc}})
+    return ids
+
+def stats(client):
+    response = client.get('/api/categories/1/stats')
+    assert response.status_code == 200
+    return response.get_json()
+
+def from_values(app):
+    with app.app_context():
+        return StatsService.compute(get_registry().require(1))
+
+def stored_row(app):
+    with app.app_context():
+        return db.session.get(CategoryStats, 1)
+
+def test_first_read_computes_and_stores(app, client, phones):
+    assert stored_row(app).stale
+    data = stats(client)
+    assert data == from_values(app)
+    assert data['products'] == 4
+    assert data['price'] == {'count': 4, 'min': 100, 'max': 699, 'avg': (100 + 250.5 + 400 + 699) / 4}
+    facets = data['attributes']
+    assert facets['OS']['values'] == [{'value': 'Android', 'count': 3}, {'value': 'iOS', 'count': 1}]
+    assert facets['Color']['values'][0] == {'value': 'black', 'count': 2} and facets['Color']['distinct'] == 3
+    assert (facets['RAM_GB']['min'], facets['RAM_GB']['max'], facets['RAM_GB']['avg']) == (4, 12, 7.5)
+    assert (facets['Released']['min'], facets['Released']['max']) == ('2022-11-30', '2024-09-15')
+    assert facets['NFC']['values'] == [{'value': True, 'count': 3}, {'value': False, 'count': 1}]
+    assert not stored_row(app).stale
+
+def test_product_writes_keep_stored_stats_current(app, client, phones):
+    stats(client)
+    client.put(f'/api/products/{phones[2]}', json={'price': 50})
+    client.post(f'/api/products/{phones[2]}/attributes', json={'attributes': {'OS': 'iOS', 'RAM_GB': 16, 'Color': 'red'}})
+    client.post(f'/api/products/{phones[2]}/attributes', json={'attributes': {'NFC': False}})
+    new = client.post('/api/products', json={'name': 'Phone X', 'sku': 'PH-X', 'category_id': 1}).get_json()
+    client.post(f'/api/products/{new["id"]}/attributes', json={'attributes': {'OS': 'iOS', 'RAM_GB': 2}})
+    row = stored_row(app)
+    # Added and replaced values only widen the ranges: nothing to recompute
+    assert not row.stale and not row.minmax_stale
+    data = stats(client)
+    assert data == from_values(app)
+    assert data['products'] == 5 and data['price']['min'] == 50
+    assert data['attributes']['RAM_GB']['min'] == 2 and data['attributes']['RAM_GB']['max'] == 16
+
+def test_deleting_an_extreme_recomputes_only_min_and_max(app, client, phones):
+    stats(client)
+    generation = stored_row(app).generation
+    # Product 1 has the highest price and the least RAM
+    assert client.delete('/api/products/1').status_code == 204
+    row = stored_row(app)
+    assert row.minmax_stale and not row.stale and row.generation == generation + 1
+    with app.app_context():
+        assert db.session.get(AttributeStats, 2).minmax_stale
+    data = stats(client)
+    assert data == from_values(app)
+    assert data['price']['max'] == 400 and data['attributes']['RAM_GB']['min'] == 6
+    assert not stored_row(app).minmax_stale
+
+def test_deleting_inside_the_range_keeps_extremes(app, client, phones):
+    stats(client)
+    # PH-1: price 250.5, RAM 6 are neither minimum nor maximum
+    assert client.delete(f'/api/products?ids={phones[2]}').status_code == 200
+    row = stored_row(app)
+    assert not row.minmax_stale
+    assert stats(client) == from_values(app)
+
+def test_stats_are_shared_between_processes(make_app):
+    first, second = make_app(), make_app()
+    a, b = first.test_client(), second.test_client()
+    assert b.get('/api/categories/1/stats').get_json()['products'] == 1
+    a.post('/api/products', json={'name': 'Other', 'sku': 'OT-1', 'category_id': 1, 'price': 10})
+    assert b.get('/api/categories/1/stats').get_json()['price']['min'] == 10
+
+def test_import_and_type_change_mark_stats_stale(app, client, phones):
+    stats(client)
+    client.post('/api/products/bulk', data='{"sku": "IM-1", "name": "Imported", "category_id": 1, "price": 1}')
+    assert stored_row(app).stale
+    assert stats(client) == from_values(app)
+    client.put('/api/categories/1/attributes/2', json={'data_type': 'decimal'})
+    assert stored_row(app).stale
+    assert stats(client) == from_values(app)
+
+def test_facets_filter_attributes(client, phones):
+    response = client.get('/api/products/facets?category_id=1&attributes=OS,NFC')
+    assert response.status_code == 200
+    assert set(response.get_json()['facets']) == {'OS', 'NFC'}
+    assert client.get('/api/products/facets?category_id=1&attributes=Nope').status_code == 400
+    assert client.get('/api/products/facets').status_code == 400
+
+def test_attribute_write_reads_current_values_once(client, statements):
+    client.post('/api/products/1/attributes', json={'attributes': {'OS': 'iOS', 'RAM_GB': 6}})
+    statements.clear()
+    response = client.post('/api/products/1/attributes', json={'attributes': {'OS': 'Android', 'RAM_GB': 8}})
+    assert response.get_json()['attributes'] == {'OS': 'Android', 'RAM_GB': 8}
+    reads = [s for s in statements if s.lstrip().startswith('SELECT') and 'FROM product_attribute_values' in s]
+    assert len(reads) == 1
+    attributes = stats(client)['attributes']
+    assert attributes['RAM_GB']['min'] == attributes['RAM_GB']['max'] == 8
+    assert attributes['OS']['values'] == [{'value': 'Android', 'count': 1}, {'value': 'iOS', 'count': 0}]
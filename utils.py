@@ -1,47 +1,150 @@
 
 import json
+import base64
+from datetime import datetime
 from flask import abort
+from serializers import serializer_for
 
 DATATYPES = {'string','int','decimal','bool','date','enum','json'}
 
 def to_dict(model):
     if model is None:
         return None
-    data = {}
-    for col in model.__table__.columns:
-        data[col.name] = getattr(model, col.name)
-    return data
+    return serializer_for(type(model))(model)
 
-def normalize_value_by_type(attr, value):
-    dtype = attr.data_type
+def encode_cursor(created_at, pk):
+    return _encode_cursor([created_at.isoformat(), pk])
+
+def decode_cursor(cursor):
     try:
-        if dtype == 'string':
-            if value is None: raise ValueError('string cannot be null')
-            return str(value)
-        if dtype == 'int':
-            return int(value)
-        if dtype == 'decimal':
-            return float(value)
-        if dtype == 'bool':
-            if isinstance(value, bool):
-                return value
-            if str(value).lower() in ('true','1','yes','y'): return True
-            if str(value).lower() in ('false','0','no','n'): return False
-            raise ValueError('invalid boolean')
-        if dtype == 'date':
-            # accept YYYY-MM-DD
-            s = str(value)
-            if len(s) != 10 or s[4] != '-' or s[7] != '-':
-                raise ValueError('date must be YYYY-MM-DD')
-            return s
-        if dtype == 'enum':
-            options = json.loads(attr.options_json or '[]')
-            if value not in options:
-                raise ValueError(f'value must be one of {options}')
+        created_at, pk = _decode_cursor(cursor)
+        return datetime.fromisoformat(created_at), int(pk)
+    except Exception:
+        abort(400, 'Invalid cursor')
+
+def encode_score_cursor(score, pk):
+    # Keyset cursor for relevance-ordered results: (score, id)
+    return _encode_cursor([score, pk])
+
+def decode_score_cursor(cursor):
+    try:
+        score, pk = _decode_cursor(cursor)
+        return float(score), int(pk)
+    except Exception:
+        abort(400, 'Invalid cursor')
+
+def _encode_cursor(payload):
+    raw = json.dumps(payload).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def parse_int_arg(args, name, default=None, minimum=None, maximum=None):
+    raw = args.get(name)
+    if raw in (None, ''):
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        abort(400, f'{name} must be an integer')
+    if minimum is not None and value < minimum:
+        abort(400, f'{name} must be >= {minimum}')
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+def parse_float_arg(args, name):
+    raw = args.get(name)
+    if raw in (None, ''):
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        abort(400, f'{name} must be a number')
+
+def parse_bool_arg(args, name, default=False):
+    raw = args.get(name)
+    if raw in (None, ''):
+        return default
+    return raw.lower() in ('1', 'true', 'yes')
+
+def parse_id_list(args, name, maximum):
+    # ?ids=1,2,3 -> list of distinct ints, in request order
+    raw = args.get(name) or ''
+    try:
+        ids = list(dict.fromkeys(int(v) for v in raw.split(',') if v.strip()))
+    except ValueError:
+        abort(400, f'{name} must be a comma-separated list of integers')
+    if not ids:
+        abort(400, f'{name} is required')
+    if len(ids) > maximum:
+        abort(400, f'At most {maximum} {name} per request')
+    return ids
+
+def _to_string(value):
+    if value is None: raise ValueError('string cannot be null')
+    return str(value)
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ('true','1','yes','y'): return True
+    if str(value).lower() in ('false','0','no','n'): return False
+    raise ValueError('invalid boolean')
+
+def _to_date(value):
+    # accept YYYY-MM-DD
+    s = str(value)
+    if len(s) != 10 or s[4] != '-' or s[7] != '-':
+        raise ValueError('date must be YYYY-MM-DD')
+    return s
+
+def _to_json(value):
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+VALIDATORS = {
+    'string': _to_string,
+    'int': int,
+    'decimal': float,
+    'bool': _to_bool,
+    'date': _to_date,
+    'json': _to_json,
+}
+
+def build_validator(data_type, options=None):
+    # Returns a callable converting a raw value for data_type, raising ValueError when invalid
+    if data_type == 'enum':
+        allowed = frozenset(options or ())
+        shown = list(options or ())
+        def validate(value):
+            try:
+                ok = value in allowed
+            except TypeError:
+                ok = False
+            if not ok:
+                raise ValueError(f'value must be one of {shown}')
             return str(value)
-        if dtype == 'json':
-            if isinstance(value, str):
-                return json.loads(value)
-            return value
+        return validate
+    if data_type not in VALIDATORS:
+        raise ValueError('unsupported data type')
+    return VALIDATORS[data_type]
+
+def coerce_value(attr, value):
+    # Compiled attributes (schema_registry) carry a prebuilt validator
+    validate = getattr(attr, 'validate', None)
+    if validate is None:
+        options = json.loads(attr.options_json or '[]') if attr.data_type == 'enum' else None
+        validate = build_validator(attr.data_type, options)
+    return validate(value)
+
+def normalize_value_by_type(attr, value):
+    try:
+        return coerce_value(attr, value)
     except Exception as e:
-        abort(400, f'Invalid value for attribute {attr.name} ({dtype}): {e}')
+        abort(400, f'Invalid value for attribute {attr.name} ({attr.data_type}): {e}')
@@ -0,0 +1,60 @@
+import logging
+import time
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers
+from werkzeug.datastructures import MultiDict
+from database import db, get_versions
+from models import Product
+from schema_registry import get_registry
+from services.categories import CategoryService
+from services.documents import DocumentService
+from services.products import ProductService
+from services.search import SearchService
+from services.search_index import SearchIndexService
+
+log = logging.getLogger(__name__)
+
+def warm_up(app):
+    # Pays the first-request costs before the process serves traffic: mapper configuration,
+    # pool connections, the schema cache, and SQL compilation of the default read shapes
+    # (SQLAlchemy caches compiled statements per shape). Returns milliseconds per step
+    timings = {}
+
+    def step(name, fn):
+        started = time.perf_counter()
+        fn()
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    with app.app_context():
+        try:
+            step('mappers', configure_mappers)
+            step('connections', _connect)
+            step('schema_cache', lambda: get_registry().preload())
+            step('search_backend', SearchIndexService.backend)
+            step('reads', _read)
+        except Exception as e:
+            # A database that is not initialized yet must not keep the app from starting
+            log.warning('Warm-up stopped after %s: %s', list(timings), e)
+        finally:
+            db.session.rollback()
+            db.session.remove()
+    log.info('Warm-up done: %s', timings)
+    return timings
+
+def _connect():
+    for engine in db.engines.values():
+        with engine.connect() as connection:
+            connection.execute(select(1))
+
+def _read():
+    get_versions(('products', 'attribute_definitions'))
+    CategoryService.list()
+    ProductService.list(MultiDict({'limit': '1'}))
+    ProductService.list(MultiDict({'limit': '1', 'expand': 'attributes'}))
+    if SearchIndexService.backend() is not None:
+        SearchService.search(MultiDict({'q': 'warmup', 'limit': '1'}))
+    pid = db.session.scalar(select(Product.id).limit(1))
+    if pid is not None:
+        ProductService.get(pid)
+        if DocumentService.enabled():
+            DocumentService.get(pid)